@@ -0,0 +1,97 @@
+"""
+说明：只读接口的响应缓存
+
+- 每个接口独立的 TTL，只缓存 code == 0 的成功响应
+- single-flight：同一 key 的并发请求只发出一次，其余线程等待并共享结果
+- 写接口成功后由 BilibiliApi 显式失效相关接口
+- 缓存中保存独立的副本，命中或合并等待的调用方各自拿到深拷贝，修改返回值不会影响其他调用方
+"""
+
+import copy
+import logging
+import threading
+import time
+
+logger = logging.getLogger("ApiCache")
+
+
+class _Flight:
+    __slots__ = ("event", "result")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class ResponseCache:
+    def __init__(self):
+        self._entries = {}  # key -> (result, expires_at)，key 的第一个元素为接口名
+        self._inflight = {}  # key -> _Flight
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0}
+
+    def get_or_fetch(self, key, ttl, fetch):
+        """
+        命中缓存直接返回，否则调用 fetch() 获取 (success, json_data)
+        返回值归调用方所有，可以修改
+        """
+        cached = flight = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > time.monotonic():
+                self.stats["hits"] += 1
+                cached = entry[0]
+            elif key in self._inflight:
+                self.stats["coalesced"] += 1
+                flight = self._inflight[key]
+                leader = False
+            else:
+                self.stats["misses"] += 1
+                flight = self._inflight[key] = _Flight()
+                leader = True
+        # 深拷贝放在锁外，避免大响应 (如分区列表) 阻塞其他线程
+        if cached is not None:
+            return copy.deepcopy(cached)
+
+        if not leader:
+            flight.event.wait()
+            return copy.deepcopy(flight.result)
+
+        result = (False, {"code": -1, "msg": "请求失败"})
+        try:
+            result = fetch()
+            return result
+        finally:
+            # 发起请求的线程直接返回原对象，缓存与等待的线程使用副本
+            snapshot = copy.deepcopy(result)
+            with self._lock:
+                # 期间被失效的 key 不再属于本次请求，不写入，避免写入旧数据
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+                    success, res = snapshot
+                    if success and isinstance(res, dict) and res.get("code") == 0:
+                        self._entries[key] = (snapshot, time.monotonic() + ttl)
+            flight.result = snapshot
+            flight.event.set()
+
+    def invalidate(self, *endpoints):
+        """失效指定接口的全部缓存；不传参数时清空"""
+        with self._lock:
+            self.stats["invalidations"] += 1
+            if not endpoints:
+                self._entries.clear()
+                self._inflight.clear()
+                return
+            for key in [k for k in self._entries if k[0] in endpoints]:
+                del self._entries[key]
+            # 进行中的请求完成后不再写入缓存
+            for key in [k for k in self._inflight if k[0] in endpoints]:
+                del self._inflight[key]
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        total = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = round((stats["hits"] + stats["coalesced"]) / total, 3) if total else 0
+        return stats
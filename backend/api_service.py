@@ -1,69 +1,143 @@
 import logging
 import asyncio
+import os
 import threading
 import sys
-from backend.bilibili_api import BilibiliApi
-from backend.config import Config
-from backend.state import SessionState
+import time
+from backend import log_pipeline
+from backend.config import Config, CONFIG_FILE
+from backend import get_wbi
+from backend.event_bus import EventBus
+from backend.session_registry import SessionRegistry
 from backend.services.window_service import WindowService
-from backend.services.user_service import UserService
-from backend.services.live_service import LiveService
 from backend.services.auth_service import AuthService
-from backend.services.danmu_service import DanmuService
+from backend.danmu_decoder import DECODE_MODES, DECODE_INLINE
 
 logger = logging.getLogger("ApiService")
 
 class FrontendLogHandler(logging.Handler):
-    """自定义日志处理器，将日志发送到前端"""
-    def __init__(self, window_service):
+    """
+    自定义日志处理器，将日志发送到前端
+    在日志管道的后台线程中执行；按 logger 限流，被抑制的条数在窗口结束后汇总为一行
+    (由事件总线定时调用 flush_suppressed，突发之后没有新日志时汇总也会输出)
+    """
+    RATE_WINDOW = 1.0  # 限流窗口（秒）
+    RATE_LIMIT = 20  # 每个 logger 每个窗口最多转发的条数
+    RATE_LIMITS = {"DanmuService": 10, "DanmuHub": 10}  # 高频 logger 单独限制
+
+    def __init__(self, event_bus):
         super().__init__()
-        self.window_service = window_service
+        self.event_bus = event_bus
+        self.windows = {}  # logger 名 -> [窗口开始时间, 已转发条数, 被抑制条数]
+        event_bus.add_flush_hook(self.flush_suppressed)
+
+    def flush_suppressed(self):
+        """事件总线线程中调用；windows 与 emit 共用处理器锁"""
+        with self.lock:
+            self._flush_suppressed(time.monotonic())
+
+    def _flush_suppressed(self, now):
+        """输出已结束窗口的抑制汇总"""
+        for name, window in self.windows.items():
+            if window[2] and now - window[0] >= self.RATE_WINDOW:
+                summary = logging.LogRecord(name, logging.INFO, "", 0, f"已抑制 {window[2]} 条日志", None, None)
+                self.event_bus.publish("log", self.format(summary))
+                window[2] = 0
 
     def emit(self, record):
         try:
+            now = time.monotonic()
+            self._flush_suppressed(now)
+            window = self.windows.get(record.name)
+            if window is None or now - window[0] >= self.RATE_WINDOW:
+                window = self.windows[record.name] = [now, 0, 0]
+            # WARNING 及以上不限流
+            if record.levelno < logging.WARNING and \
+                    window[1] >= self.RATE_LIMITS.get(record.name, self.RATE_LIMIT):
+                window[2] += 1
+                return
+            window[1] += 1
             msg = self.format(record)
-            # 避免在主线程阻塞或死循环，这里简单直接调用
-            # 注意：如果日志量巨大，可能需要缓冲或限流
-            self.window_service.send_to_frontend("onBackendLog", msg)
+            # 只入队，由事件总线合并推送
+            self.event_bus.publish("log", msg)
         except Exception:
             self.handleError(record)
 
 class ApiService:
     def __init__(self):
-        self.api_client = BilibiliApi()
         self.config_manager = Config()
-        self.session_state = SessionState()
-        
-        # Initialize services
+        # WBI 密钥、分区列表的缓存与配置文件放在同一目录
+        config_dir = os.path.dirname(CONFIG_FILE)
+        get_wbi.wbi_keys.set_cache_file(os.path.join(config_dir, "wbi_keys.json"))
         self.window_service = WindowService()
-        self.user_service = UserService(self.api_client, self.config_manager, self.session_state)
-        self.live_service = LiveService(self.api_client, self.config_manager, self.session_state)
-        self.auth_service = AuthService(self.api_client, self.user_service, self.live_service, self.session_state)
-        self.danmu_service = DanmuService(self.api_client, self.session_state)
-        
+
+        # 高频事件按通道排队，合并后批量推送到前端
+        self.event_bus = EventBus(self.window_service)
+        # 弹幕事件字段固定、用户名和头像重复多，使用列式编码
+        self.event_bus.register_channel("danmu", "onDanmuMessage", compact=True)
+        # 进场、关注等互动提示优先级低，积压时丢弃最旧的
+        self.event_bus.register_channel("danmu_low", "onDanmuMessage", max_size=200, compact=True)
+        self.event_bus.register_channel("log", "onBackendLog", max_size=500, snapshot_size=100)
+        # 刷新全部账户时逐个完成的结果
+        self.event_bus.register_channel("account", "onAccountRefreshed")
+        self.event_bus.start()
+
+        # Asyncio loop for danmu
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self._start_loop, args=(self.loop,), daemon=True)
+        self.loop_thread.start()
+
+        # 每个账户独立的会话 (API 客户端、会话状态、业务服务、弹幕连接)，以下服务属性均指向当前账户
+        self.sessions = SessionRegistry(self.config_manager, self.loop,
+                                        self.config_manager.data.get("danmu_decode_mode", DECODE_INLINE),
+                                        partition_cache_file=os.path.join(config_dir, "partitions.json"))
+        self.auth_service = AuthService(self.sessions)
+
         # 设置弹幕回调
-        self.danmu_service.set_callback(self._on_danmu_message)
+        self.sessions.set_callback(self._on_danmu_message)
         # self.danmu_service.set_log_callback(self._on_backend_log) # 不再需要单独的回调，统一走 logging
         
         # 配置日志转发到前端
         self._setup_logging()
 
         # Initial setup
-        self.user_service.init_current_user()
-        
-        # Asyncio loop for danmu
-        self.loop = asyncio.new_event_loop()
-        self.loop_thread = threading.Thread(target=self._start_loop, args=(self.loop,), daemon=True)
-        self.loop_thread.start()
+        self.sessions.activate(self.config_manager.data.get("current_uid"))
+        # 后台预热常用域名的连接
+        threading.Thread(target=self.api_client.warm_up, daemon=True).start()
+        # 分区列表使用磁盘缓存，过期时后台刷新
+        self.sessions.partitions.prefetch()
+
+    # --- 当前账户的会话 ---
+    @property
+    def api_client(self): return self.sessions.active.api
+    @property
+    def async_api_client(self): return self.sessions.active.async_api
+    @property
+    def session_state(self): return self.sessions.active.state
+    @property
+    def user_service(self): return self.sessions.active.user_service
+    @property
+    def live_service(self): return self.sessions.active.live_service
+    @property
+    def danmu_service(self): return self.sessions.active.danmu_service
+    @property
+    def danmu_hub(self): return self.sessions.active.danmu_hub
+
+    def stop_all_sessions(self):
+        """退出时调用：停止所有账户的直播与弹幕"""
+        for session in self.sessions.all():
+            if session.state.is_live:
+                session.live_service.stop_live()
+            asyncio.run_coroutine_threadsafe(session.stop_danmu(), self.loop)
 
     def _setup_logging(self):
         """配置日志处理器，将 INFO 及以上级别的日志转发到前端"""
-        root_logger = logging.getLogger()
-        frontend_handler = FrontendLogHandler(self.window_service)
+        frontend_handler = FrontendLogHandler(self.event_bus)
         frontend_handler.setLevel(logging.INFO) # 只转发 INFO 及以上
         formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         frontend_handler.setFormatter(formatter)
-        root_logger.addHandler(frontend_handler)
+        # 在日志管道的后台线程中转发，不阻塞记录日志的线程
+        log_pipeline.add_handler(frontend_handler)
 
     def _start_loop(self, loop):
         asyncio.set_event_loop(loop)
@@ -73,7 +147,7 @@ class ApiService:
         """处理弹幕消息回调，推送到前端"""
         # 注意：这里可能在子线程中被调用，webview 的 evaluate_js 应该是线程安全的
         # 前端挂载的函数名为 onDanmuMessage
-        self.window_service.send_to_frontend("onDanmuMessage", data)
+        self.event_bus.publish("danmu_low" if data.get("type") == "interact" else "danmu", data)
 
     # def _on_backend_log(self, msg):
     #     """处理后端日志回调，推送到前端"""
@@ -82,10 +156,18 @@ class ApiService:
     # --- Window Proxy Methods ---
     def window_min(self): return self.window_service.window_min()
     def window_max(self): return self.window_service.window_max()
+    def app_hidden(self):
+        """窗口隐藏到托盘：通知前端，之后的事件只在后端缓冲"""
+        self.window_service.send_to_frontend("onAppHidden", None)
+        self.event_bus.set_visible(False)
+    def app_shown(self):
+        """窗口恢复显示：先推送隐藏期间的快照，再通知前端"""
+        self.event_bus.set_visible(True)
+        self.window_service.send_to_frontend("onAppShown", None)
     def window_close(self):
         if self.config_manager.data.get("min_to_tray", True):
             self.config_manager.save()
-            self.window_service.send_to_frontend("onAppHidden", None)
+            self.app_hidden()
             if sys.platform == 'win32':
                 self.window_service.window_hide()
             else:
@@ -93,11 +175,10 @@ class ApiService:
             return True
 
         # 只有在直播状态下才尝试停止直播
-        if self.session_state.is_live:
-            self.live_service.stop_live()
-
-        asyncio.run_coroutine_threadsafe(self.danmu_service.stop(), self.loop)
-        return self.window_service.window_close(lambda: self.config_manager.save())
+        self.stop_all_sessions()
+        # 推送仍在排队的事件
+        self.event_bus.stop()
+        return self.window_service.window_close(self.config_manager.flush)
     def get_window_position(self): return self.window_service.get_window_position()
     def window_drag(self, target_x, target_y): return self.window_service.window_drag(target_x, target_y)
 
@@ -105,13 +186,26 @@ class ApiService:
     def load_saved_config(self): return self.user_service.load_saved_config()
     def refresh_current_user(self): return self.user_service.refresh_current_user()
     def get_account_list(self): return self.user_service.get_account_list()
+    def refresh_all_accounts(self):
+        # 每个账户完成时经事件总线推送到前端，全部完成后返回完整结果
+        items = self.user_service.refresh_all_accounts(lambda item: self.event_bus.publish("account", item))
+        # 资料已写入配置的账户 (成功或登录失效)，丢弃其会话中缓存的旧用户信息
+        self.sessions.invalidate_cache([item["uid"] for item in items if item["code"] == 0 or item["expired"]],
+                                       "user_info", "user_stat")
+        return {"code": 0, "data": items}
     def switch_account(self, uid):
-        # 切换账户前先停止弹幕，防止新连接使用旧账户
-        asyncio.run_coroutine_threadsafe(self.danmu_service.stop(), self.loop)
-        return self.user_service.switch_account(uid)
+        # 每个账户有独立的会话，切换只改变当前账户，其他账户的弹幕连接继续运行
+        res = self.user_service.switch_account(uid)
+        if res["code"] == 0:
+            self.sessions.activate(uid)
+        return res
     def logout(self, uid):
-        asyncio.run_coroutine_threadsafe(self.danmu_service.stop(), self.loop)
-        return self.user_service.logout(uid)
+        res = self.user_service.logout(uid)
+        if res["code"] == 0:
+            # 关闭该账户的会话 (停止其弹幕连接)
+            self.sessions.close(uid)
+        return res
+    def get_sessions(self): return {"code": 0, "data": self.sessions.get_sessions()}
 
     # --- Auth Proxy Methods ---
     def get_login_qrcode(self): return self.auth_service.get_login_qrcode()
@@ -119,10 +213,18 @@ class ApiService:
 
     # --- Live Proxy Methods ---
     def get_partitions(self): return self.live_service.get_partitions()
+    def search_partitions(self, keyword, limit=20): return self.live_service.search_partitions(keyword, limit)
     def sync_room_profile(self): return self.live_service.sync_room_profile()
     def update_title(self, title): return self.live_service.update_title(title)
     def update_announcement(self, announcement): return self.live_service.update_announcement(announcement)
     def update_area(self, p_name, s_name): return self.live_service.update_area(p_name, s_name)
+    def apply_room_profile(self, title=None, area=None, announcement=None):
+        return self.live_service.apply_room_profile(title, area, announcement)
+    def prepare_start_live(self):
+        # 在后台执行，不阻塞前端
+        threading.Thread(target=self.live_service.prepare_start_live, daemon=True).start()
+        return {"code": 0}
+    def get_start_live_timings(self): return {"code": 0, "data": self.live_service.last_start_timings}
     def start_live(self, p_name=None, s_name=None): 
         res = self.live_service.start_live(p_name, s_name)
         # if res['code'] == 0:
@@ -151,10 +253,36 @@ class ApiService:
         asyncio.run_coroutine_threadsafe(self.danmu_service.stop(), self.loop)
         return {"code": 0}
 
+    def watch_room(self, room_id):
+        """额外监听一个直播间的弹幕，消息中的 room_id 字段标明来源"""
+        if not str(room_id).isdigit():
+            return {"code": -1, "msg": "无效的房间ID"}
+        asyncio.run_coroutine_threadsafe(self.danmu_hub.watch_room(room_id), self.loop)
+        return {"code": 0}
+
+    def unwatch_room(self, room_id):
+        asyncio.run_coroutine_threadsafe(self.danmu_hub.unwatch_room(room_id), self.loop)
+        return {"code": 0}
+
+    def get_watched_rooms(self):
+        return {"code": 0, "data": self.danmu_hub.get_rooms()}
+
     def send_danmu(self, msg):
         """发送弹幕"""
         return self.danmu_service.send_danmu(msg)
 
+    def get_api_cache_stats(self):
+        """只读接口缓存的命中统计"""
+        return {"code": 0, "data": self.api_client.get_cache_stats()}
+
+    def get_event_bus_stats(self):
+        """前端事件推送统计 (每次推送的事件数、延迟、丢弃数)"""
+        return {"code": 0, "data": self.event_bus.get_stats()}
+
+    def get_danmu_stats(self):
+        """弹幕预过滤统计 (已解析 / 跳过的消息数与字节数)"""
+        return {"code": 0, "data": self.danmu_service.get_filter_stats()}
+
     # --- App Config Methods ---
     def get_app_config(self):
         import sys
@@ -162,6 +290,7 @@ class ApiService:
         has_tray = getattr(self, 'tray_active', False)
         config = {
             "min_to_tray": self.config_manager.data.get("min_to_tray", True),
+            "danmu_decode_mode": self.config_manager.data.get("danmu_decode_mode", DECODE_INLINE),
             "is_win32": sys.platform == 'win32',
             "has_tray": has_tray
         }
@@ -169,8 +298,14 @@ class ApiService:
 
     def set_app_config(self, key, value):
         if key == "min_to_tray":
-            self.config_manager.data["min_to_tray"] = bool(value)
-            self.config_manager.save()
+            self.config_manager.set("min_to_tray", bool(value))
+            return {"code": 0}
+        if key == "danmu_decode_mode":
+            if value not in DECODE_MODES:
+                return {"code": -1, "msg": "Unknown decode mode"}
+            self.config_manager.set("danmu_decode_mode", value)
+            # 下次连接弹幕时生效
+            self.sessions.set_decode_mode(value)
             return {"code": 0}
         return {"code": -1, "msg": "Unknown config key"}
 
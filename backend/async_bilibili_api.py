@@ -0,0 +1,255 @@
+import asyncio
+import json
+import logging
+import time
+
+import aiohttp
+
+from backend import data as dt
+from backend import get_wbi
+from backend import util
+from backend.bilibili_api import BilibiliApi
+
+logger = logging.getLogger("AsyncBiliAPI")
+
+
+class AsyncBilibiliApi:
+    """
+    BilibiliApi 的 asyncio 版本，供弹幕事件循环等协程内使用，避免阻塞事件循环
+
+    组合而非继承 BilibiliApi：cookies、请求头、签名和日志脱敏都复用同步客户端，
+    这里逐个提供同名的异步接口，同步客户端的多步接口不会被误当作协程调用。
+    所有方法必须在同一个事件循环中调用 (共享一个 aiohttp.ClientSession)。
+    """
+
+    def __init__(self, sync_api=None):
+        """
+        :param sync_api: 可选的 BilibiliApi，传入时与其共用 cookies (切换账户后自动生效)
+        """
+        self.sync_api = sync_api or BilibiliApi()
+        self.session = None
+
+    @property
+    def cookies(self):
+        return self.sync_api.cookies
+
+    @property
+    def headers(self):
+        return self.sync_api.headers
+
+    async def _write(self, url, data, invalidates):
+        """写接口：响应缓存只用于同步客户端 (多线程共享)，成功后失效其中相关接口的缓存"""
+        success, res = await self._req("POST", url, data=data)
+        if success and res.get('code') == 0:
+            self.sync_api.invalidate_cache(*invalidates)
+        return success, res
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            # 不使用 cookie jar，每次请求显式带上当前账户的 cookies，避免不同账户之间串号
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(ssl=util.get_ssl_context()),
+                headers=self.headers,
+                cookie_jar=aiohttp.DummyCookieJar(),
+                timeout=aiohttp.ClientTimeout(total=10),
+            )
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _req(self, method, url, params=None, data=None):
+        """通用请求封装"""
+        try:
+            masked_url = self.sync_api._log_request(method, url)
+
+            async with self._get_session().request(method, url, params=params, data=data,
+                                                   cookies=self.cookies) as resp:
+                text = await resp.text()
+                status = resp.status
+
+            # 尝试解析 JSON
+            try:
+                json_data = json.loads(text)
+                self.sync_api._log_response(masked_url, json_data)
+                return True, json_data
+            except ValueError:
+                logger.error(f"JSON Decode Error. Status: {status}, Content: {text[:100]}")
+                return False, {"code": -1, "msg": "API 返回格式错误"}
+
+        except Exception as e:
+            logger.error(f"Request Error: {url} -> {e!r}")
+            return False, {"code": -1, "msg": str(e)}
+
+    # --- 扫码登录 ---
+    async def get_passport_qrcode(self):
+        return await self._req("GET", "https://passport.bilibili.com/x/passport-login/web/qrcode/generate")
+
+    async def poll_passport_qrcode(self, qrcode_key):
+        url = "https://passport.bilibili.com/x/passport-login/web/qrcode/poll"
+        try:
+            masked_url = self.sync_api._log_request("GET", f"{url}?qrcode_key={qrcode_key}")
+
+            # 不带当前账户的 cookie；session 不保存 cookie，新账户的 cookie 只通过返回值交给调用方
+            async with self._get_session().get(url, params={"qrcode_key": qrcode_key}) as resp:
+                json_data = await resp.json(content_type=None)
+                cookies = {k: m.value for k, m in resp.cookies.items()}
+
+            if masked_url is not None:
+                code = json_data.get("data", {}).get("code", "N/A")
+                logger.debug("API Response: %s -> code=%s", masked_url, code)
+            return True, json_data, cookies
+        except Exception as e:
+            logger.error(f"Request Error: {url} -> {e!r}")
+            return False, {"code": -1, "msg": str(e)}, {}
+
+    # --- 用户信息 ---
+    async def get_user_info(self):
+        """获取基本信息 (昵称、等级、头像、硬币等)"""
+        return await self._req("GET", "https://api.bilibili.com/x/web-interface/nav")
+
+    async def get_user_stat(self):
+        """获取统计信息 (粉丝数、关注数、动态数)"""
+        return await self._req("GET", "https://api.bilibili.com/x/web-interface/nav/stat")
+
+    async def get_room_id_by_uid(self, uid):
+        """通过 UID 获取直播间 ID"""
+        return await self._req("GET", f"https://api.live.bilibili.com/room/v2/Room/room_id_by_uid?uid={uid}")
+
+    # --- 直播控制 ---
+    async def get_area_list(self):
+        return await self._req("GET", "https://api.live.bilibili.com/room/v1/Area/getList", params={"show_pinyin": 1})
+
+    async def get_room_info(self, room_id):
+        return await self._req("GET", "https://api.live.bilibili.com/room/v1/Room/get_info",
+                               params={"room_id": room_id})
+
+    async def get_room_news(self, room_id, uid):
+        params = {'room_id': room_id, 'uid': uid}
+        return await self._req("GET", "https://api.live.bilibili.com/xlive/app-blink/v1/index/getRoomNews",
+                               params=params)
+
+    async def update_title(self, room_id, title, csrf):
+        data = {'room_id': room_id, 'platform': 'pc_link', 'title': title, 'csrf_token': csrf, 'csrf': csrf}
+        return await self._write("https://api.live.bilibili.com/room/v1/Room/update", data, ("room_info",))
+
+    async def update_announcement(self, room_id, uid, content, csrf):
+        data = {'room_id': room_id, 'uid': uid, 'content': content, 'csrf_token': csrf, 'csrf': csrf}
+        return await self._write("https://api.live.bilibili.com/xlive/app-blink/v1/index/updateRoomNews", data,
+                                 ("room_news",))
+
+    async def update_area(self, room_id, area_id, csrf):
+        data = {'room_id': room_id, 'area_id': area_id, 'platform': 'pc_link', 'csrf_token': csrf, 'csrf': csrf}
+        return await self._write("https://api.live.bilibili.com/room/v1/Room/update", data, ("room_info",))
+
+    # --- 开播准备 (时间偏移记录在同步客户端中，两者共用) ---
+    async def sync_clock(self):
+        """请求 click/now 并记录服务器与本地的时间偏移 (按往返中点估算)，成功返回 True"""
+        start = time.time()
+        success, res = await self._req("GET", "https://api.bilibili.com/x/report/click/now")
+        end = time.time()
+        if not success or res.get('code') != 0:
+            logger.warning(f"Clock sync failed: {res}")
+            return False
+        self.sync_api.clock_offset = res["data"]["now"] - (start + end) / 2
+        self.sync_api.clock_synced_at = end
+        return True
+
+    async def server_time(self):
+        """根据记录的偏移计算服务器时间戳，偏移过期时重新同步；同步失败返回 None"""
+        if self.sync_api._clock_stale():
+            if not await self.sync_clock():
+                return None
+        return int(time.time() + self.sync_api.clock_offset)
+
+    async def get_live_version(self):
+        """直播姬版本信息，与同步客户端共用缓存 (缓存的 single-flight 基于线程，放到线程中执行)"""
+        return await asyncio.to_thread(self.sync_api.get_live_version)
+
+    async def prepare_start_live(self):
+        """预热时间偏移和版本信息，之后开播只需一次请求"""
+        if self.sync_api._clock_stale():
+            await self.sync_clock()
+        await self.get_live_version()
+
+    async def start_live(self, room_id, area_id, csrf, timings=None):
+        """
+        :param timings: 可选 dict，写入各阶段耗时 (毫秒)：clock / version / start
+        """
+        timings = {} if timings is None else timings
+
+        # 1. 获取时间戳 (偏移有效时无需请求)
+        t0 = time.perf_counter()
+        ts = await self.server_time()
+        timings["clock"] = round((time.perf_counter() - t0) * 1000, 1)
+        if ts is None: return False, {"code": -1, "msg": "获取服务器时间失败"}
+
+        # 2. 获取版本 (缓存)
+        t0 = time.perf_counter()
+        s2, v_resp = await self.get_live_version()
+        timings["version"] = round((time.perf_counter() - t0) * 1000, 1)
+        if not s2 or v_resp['code'] != 0: return False, v_resp
+
+        # 3. 开始直播
+        data = {
+            'room_id': room_id, 'platform': 'pc_link', 'area_v2': area_id, 'backup_stream': '0',
+            'csrf_token': csrf, 'csrf': csrf, 'build': v_resp['data']['build'],
+            'version': v_resp['data']['curr_version'], 'ts': ts
+        }
+        t0 = time.perf_counter()
+        success, res = await self._write("https://api.live.bilibili.com/room/v1/Room/startLive",
+                                         self.sync_api._appsign(data), ("room_info",))
+        timings["start"] = round((time.perf_counter() - t0) * 1000, 1)
+        if not success or res.get('code') not in (0, 60024, 60043):
+            # 失败时下次重新获取版本和时间
+            self.sync_api.invalidate_cache("live_version")
+            self.sync_api.clock_offset = None
+        return success, res
+
+    async def stop_live(self, room_id, csrf):
+        data = {'room_id': room_id, 'platform': 'pc_link', 'csrf_token': csrf, 'csrf': csrf}
+        return await self._write("https://api.live.bilibili.com/room/v1/Room/stopLive", data, ("room_info",))
+
+    # --- 弹幕 ---
+    async def _sign_wbi(self, params):
+        # Wbi 密钥未缓存时会同步请求 nav，放到线程中执行
+        return await asyncio.to_thread(get_wbi.get_w_rid_and_wts, params, self.sync_api.session)
+
+    async def send_danmu(self, room_id, msg, csrf):
+        """发送弹幕"""
+        # 1. 获取 Wbi 签名参数
+        _, query = await self._sign_wbi({"web_location": 444.8})
+
+        # 2. 准备数据
+        data = dt.bullet_data.copy()
+        data["msg"] = msg
+        data["csrf_token"] = csrf
+        data["csrf"] = csrf
+        data["roomid"] = int(room_id)
+        data["rnd"] = int(time.time())
+
+        url = f"https://api.live.bilibili.com/msg/send?{query}"
+
+        success, res = await self._req("POST", url, data=data)
+        if success and get_wbi.is_sign_error(res):
+            logger.warning("Wbi sign rejected, keys invalidated")
+        return success, res
+
+    async def get_danmu_info(self, room_id):
+        """获取弹幕服务器 token 与 host 列表"""
+        signed_params, _ = await self._sign_wbi({"id": room_id, "type": 0})
+        success, res = await self._req("GET", "https://api.live.bilibili.com/xlive/web-room/v1/index/getDanmuInfo",
+                                       params=signed_params)
+        if success and get_wbi.is_sign_error(res):
+            logger.warning("Wbi sign rejected, keys invalidated")
+        return success, res
+
+    # --- buvid3 获取 ---
+    async def get_buvid3(self):
+        """获取 buvid3"""
+        success, res = await self._req("GET", "https://api.bilibili.com/x/frontend/finger/spi")
+        if success and res['code'] == 0:
+            return res['data']['b_3']
+        return None
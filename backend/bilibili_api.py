@@ -1,28 +1,133 @@
 import hashlib
+import http.cookiejar
 import urllib.parse
 import requests
+from requests.adapters import HTTPAdapter
 import logging
 import json
+import threading
 import time
 from backend import data as dt
 from backend import util
-from backend.get_wbi import get_w_rid_and_wts
+from backend.api_cache import ResponseCache
+from backend.get_wbi import get_w_rid_and_wts, is_sign_error
 
 # 配置模块日志
 logger = logging.getLogger("BiliAPI")
 
 
+# 需要脱敏的响应字段 / URL 参数
+MASK_DATA_KEYS = frozenset(['rtmp', 'addr', 'code', 'key', 'token', 'csrf', 'csrf_token', 'access_key', 'live_key',
+                            'sub_session_key', 'url', 'qrcode_key', 'refresh_token', 'b_3', 'b_4', 'room_id', 'uid'])
+MASK_URL_KEYS = ('uid', 'room_id', 'key', 'token', 'csrf', 'csrf_token', 'access_key', 'qrcode_key')
+LOG_DATA_LIMIT = 200
+
+
+class _LazyLogArg:
+    """日志参数的延迟求值：只有在处理器真正输出该记录时才计算，且只计算一次"""
+    __slots__ = ('func', 'args', 'value')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+        self.value = None
+
+    def __str__(self):
+        if self.value is None:
+            self.value = self.func(*self.args)
+        return self.value
+
+
 class BilibiliApi:
     # B站直播姬 App Key
     APP_KEY = "aae92bc66f3edfab"
     APP_SEC = "af125a0d5279fd576c1b4418a3e8276d"
 
+    # 常用域名，每个域名独立的连接池
+    KNOWN_HOSTS = (
+        "https://api.bilibili.com",
+        "https://api.live.bilibili.com",
+        "https://passport.bilibili.com",
+    )
+    POOL_MAXSIZE = 8
+
+    # 只读接口的缓存时间（秒）
+    CACHE_TTL = {
+        "user_info": 60,
+        "user_stat": 60,
+        "room_id_by_uid": 24 * 60 * 60,
+        "area_list": 60 * 60,
+        "room_info": 30,
+        "room_news": 30,
+        "live_version": 6 * 60 * 60,  # 直播姬版本信息很少变化
+    }
+    CLOCK_SYNC_TTL = 30 * 60  # 本地记录的服务器时间偏移有效期（秒）
+
     def __init__(self):
         self.cookies = {}
         self.headers = dt.header.copy()
+        self.session = self._create_session()
+        self.passport_session = None  # 扫码登录轮询专用，不保存 cookie
+        self.cache = ResponseCache()
+        self.log_sampling = {}  # URL 路径 -> 每 N 次记录 1 次
+        self.log_counters = {}
+        self.log_lock = threading.Lock()  # 同步请求可能来自多个线程
+        self.clock_offset = None  # 服务器时间 - 本地时间（秒）
+        self.clock_synced_at = 0
+
+    def _create_session(self):
+        """创建带连接池的 Session，复用 TCP/TLS 连接 (keep-alive)"""
+        session = requests.Session()
+        session.headers.update(self.headers)
+        for host in self.KNOWN_HOSTS:
+            session.mount(host, HTTPAdapter(pool_connections=1, pool_maxsize=self.POOL_MAXSIZE))
+        return session
+
+    def close(self):
+        """释放连接池"""
+        self.session.close()
+        if self.passport_session is not None:
+            self.passport_session.close()
+
+    def _get_passport_session(self):
+        """
+        扫码登录轮询使用独立的 Session：cookie jar 拒绝所有 cookie，
+        新账户的 Set-Cookie 只出现在响应中，不会写入当前账户的 cookie jar
+        """
+        if self.passport_session is None:
+            session = requests.Session()
+            session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+            session.mount("https://passport.bilibili.com", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+            self.passport_session = session
+        return self.passport_session
 
     def update_cookies(self, cookies: dict):
         self.cookies = cookies
+        # 切换账户时重置 cookie jar，避免服务端下发的旧账户 cookie 残留
+        self.session.cookies.clear()
+        requests.utils.add_dict_to_cookiejar(self.session.cookies, cookies)
+        self.cache.invalidate("user_info", "user_stat")
+
+    def _cached_get(self, endpoint, url, params=None):
+        """带 TTL 缓存和并发合并的 GET，缓存按账户区分"""
+        key = (endpoint, self.cookies.get("DedeUserID", ""), url,
+               tuple(sorted(params.items())) if params else ())
+        return self.cache.get_or_fetch(key, self.CACHE_TTL[endpoint],
+                                       lambda: self._req("GET", url, params=params))
+
+    def invalidate_cache(self, *endpoints):
+        self.cache.invalidate(*endpoints)
+
+    def get_cache_stats(self):
+        return self.cache.get_stats()
+
+    def warm_up(self):
+        """预热常用域名的连接，启动时在后台线程调用"""
+        for host in self.KNOWN_HOSTS:
+            try:
+                self.session.head(host, timeout=5)
+            except Exception as e:
+                logger.debug(f"Warm up {host} failed: {e}")
 
     def _appsign(self, params: dict) -> dict:
         """为请求参数进行 APP 签名"""
@@ -33,29 +138,52 @@ class BilibiliApi:
         params.update({'sign': sign})
         return params
 
-    def _mask_data(self, data):
-        """递归脱敏数据"""
+    def _iter_masked_json(self, data, sensitive=False):
+        """
+        边脱敏边序列化，逐段产出 JSON 文本，调用方拿够需要的长度即可停止，无需复制和序列化整棵数据树
+        敏感字段 (MASK_DATA_KEYS) 的值：字符串保留首尾 4 位，数值 (含 bool) 转为字符串后保留首尾 2 位，
+        dict 递归处理，其他类型 (list、None) 原样输出
+        :param sensitive: data 是否为敏感字段的值
+        """
         if isinstance(data, dict):
-            new_data = {}
+            yield "{"
+            first = True
             for k, v in data.items():
-                # 增加 live_key, sub_session_key 等字段
-                if k in ['rtmp', 'addr', 'code', 'key', 'token', 'csrf', 'csrf_token', 'access_key', 'live_key', 'sub_session_key', 'url', 'qrcode_key', 'refresh_token', 'b_3', 'b_4', 'room_id', 'uid']:
-                    if isinstance(v, str):
-                        new_data[k] = util.mask_string(v, 4, 4)
-                    elif isinstance(v, (int, float)):
-                        new_data[k] = util.mask_string(str(v), 2, 2)
-                    elif isinstance(v, dict):
-                        new_data[k] = self._mask_data(v)
-                    else:
-                        new_data[k] = v
-                elif isinstance(v, (dict, list)):
-                    new_data[k] = self._mask_data(v)
-                else:
-                    new_data[k] = v
-            return new_data
-        elif isinstance(data, list):
-            return [self._mask_data(item) for item in data]
-        return data
+                if not first:
+                    yield ", "
+                first = False
+                yield json.dumps(str(k), ensure_ascii=False) + ": "
+                yield from self._iter_masked_json(v, k in MASK_DATA_KEYS)
+            yield "}"
+        elif isinstance(data, list) and not sensitive:
+            yield "["
+            for i, item in enumerate(data):
+                if i:
+                    yield ", "
+                yield from self._iter_masked_json(item)
+            yield "]"
+        elif sensitive and isinstance(data, str):
+            yield json.dumps(util.mask_string(data, 4, 4), ensure_ascii=False)
+        elif sensitive and isinstance(data, (int, float)):
+            yield json.dumps(util.mask_string(str(data), 2, 2), ensure_ascii=False)
+        else:
+            yield json.dumps(data, ensure_ascii=False)
+
+    def _format_masked_data(self, data, limit=LOG_DATA_LIMIT):
+        """脱敏并序列化，超过 limit 个字符后停止并截断"""
+        if not data:
+            return "None"
+        try:
+            parts = []
+            size = 0
+            for chunk in self._iter_masked_json(data):
+                parts.append(chunk)
+                size += len(chunk)
+                if limit is not None and size > limit:
+                    return "".join(parts)[:limit] + "..."
+            return "".join(parts)
+        except Exception:
+            return "Parse Error"
 
     def _mask_url(self, url):
         """脱敏 URL 中的敏感参数"""
@@ -65,7 +193,7 @@ class BilibiliApi:
             parsed = urllib.parse.urlparse(url)
             qs = urllib.parse.parse_qs(parsed.query)
             changed = False
-            for k in ['uid', 'room_id', 'key', 'token', 'csrf', 'csrf_token', 'access_key', 'qrcode_key']:
+            for k in MASK_URL_KEYS:
                 if k in qs:
                     qs[k] = [util.mask_string(v, 2, 2) for v in qs[k]]
                     changed = True
@@ -77,11 +205,52 @@ class BilibiliApi:
         except:
             return url
 
+    def set_log_sampling(self, path, every):
+        """
+        调试日志按接口采样：path 为 URL 路径 (如 /room/v1/Area/getList)，每 every 次响应只记录 1 次
+        every <= 1 时取消采样
+        """
+        if every <= 1:
+            self.log_sampling.pop(path, None)
+        else:
+            self.log_sampling[path] = every
+
+    def _should_log(self, url):
+        """DEBUG 未启用或被采样跳过时返回 False"""
+        if not logger.isEnabledFor(logging.DEBUG):
+            return False
+        if not self.log_sampling:
+            return True
+        path = urllib.parse.urlsplit(url).path
+        every = self.log_sampling.get(path)
+        if not every:
+            return True
+        with self.log_lock:
+            count = self.log_counters.get(path, 0)
+            self.log_counters[path] = count + 1
+        return count % every == 0
+
+    def _log_request(self, method, url):
+        """记录请求，返回延迟脱敏的 URL 供响应日志复用；不需要记录时返回 None"""
+        if not self._should_log(url):
+            return None
+        masked_url = _LazyLogArg(self._mask_url, url)
+        logger.debug("API Request: %s %s", method, masked_url)
+        return masked_url
+
+    def _log_response(self, masked_url, json_data):
+        """记录部分脱敏后的响应信息 (脱敏和序列化延迟到日志真正输出时)"""
+        if masked_url is None:
+            return
+        code = json_data.get("code", "N/A")
+        msg = json_data.get("msg") or json_data.get("message", "")
+        logger.debug("API Response: %s -> code=%s, msg=%s, data=%s", masked_url, code, msg,
+                     _LazyLogArg(self._format_masked_data, json_data.get("data")))
+
     def _req(self, method, url, params=None, data=None):
         """通用请求封装"""
         try:
-            masked_url = self._mask_url(url)
-            logger.debug(f"API Request: {method} {masked_url}")
+            masked_url = self._log_request(method, url)
             
             # 确保 buvid3 在 cookies 中
             req_cookies = self.cookies.copy()
@@ -89,30 +258,15 @@ class BilibiliApi:
                  req_cookies['buvid3'] = self.cookies['buvid3']
 
             if method == "GET":
-                resp = requests.get(url, params=params, cookies=req_cookies, headers=self.headers, timeout=10)
+                resp = self.session.get(url, params=params, cookies=req_cookies, headers=self.headers, timeout=10)
             else:
-                resp = requests.post(url, params=params, data=data, cookies=req_cookies, headers=self.headers,
-                                     timeout=10)
+                resp = self.session.post(url, params=params, data=data, cookies=req_cookies, headers=self.headers,
+                                         timeout=10)
 
             # 尝试解析 JSON
             try:
                 json_data = resp.json()
-                code = json_data.get("code", "N/A")
-                msg = json_data.get("msg") or json_data.get("message", "")
-                
-                # 记录部分脱敏后的 data 信息
-                resp_data = json_data.get("data")
-                masked_data = "None"
-                if resp_data:
-                    # 简单截取或脱敏，避免日志过大
-                    try:
-                        masked_data = json.dumps(self._mask_data(resp_data), ensure_ascii=False)
-                        if len(masked_data) > 200:
-                            masked_data = masked_data[:200] + "..."
-                    except:
-                        masked_data = "Parse Error"
-
-                logger.debug(f"API Response: {masked_url} -> code={code}, msg={msg}, data={masked_data}")
+                self._log_response(masked_url, json_data)
                 return True, json_data
             except ValueError:
                 logger.error(f"JSON Decode Error. Status: {resp.status_code}, Content: {resp.text[:100]}")
@@ -130,23 +284,17 @@ class BilibiliApi:
         try:
             url = "https://passport.bilibili.com/x/passport-login/web/qrcode/poll"
             params = {"qrcode_key": qrcode_key}
-            masked_url = self._mask_url(f"{url}?qrcode_key={qrcode_key}")
-            logger.debug(f"API Request: GET {masked_url}")
+            masked_url = self._log_request("GET", f"{url}?qrcode_key={qrcode_key}")
             
-            resp = requests.get(url, params=params, headers=self.headers, timeout=10)
+            # 不使用账户的 session：既不带上当前账户的 cookie，也不把新账户的 cookie 写入其 cookie jar
+            resp = self._get_passport_session().get(url, params=params, headers=self.headers, timeout=10)
             json_data = resp.json()
-            code = json_data.get("data", {}).get("code", "N/A")
             
             # 记录脱敏后的响应
-            resp_data = json_data.get("data")
-            masked_data = "None"
-            if resp_data:
-                 try:
-                    masked_data = json.dumps(self._mask_data(resp_data), ensure_ascii=False)
-                 except:
-                    masked_data = "Parse Error"
-
-            logger.debug(f"API Response: {masked_url} -> code={code}, data={masked_data}")
+            if masked_url is not None:
+                code = json_data.get("data", {}).get("code", "N/A")
+                logger.debug("API Response: %s -> code=%s, data=%s", masked_url, code,
+                             _LazyLogArg(self._format_masked_data, json_data.get("data"), None))
             return True, json_data, resp.cookies.get_dict()
         except Exception as e:
             logger.error(f"Request Error: {url} -> {e}")
@@ -155,50 +303,102 @@ class BilibiliApi:
     # --- 用户信息 ---
     def get_user_info(self):
         """获取基本信息 (昵称、等级、头像、硬币等)"""
-        return self._req("GET", "https://api.bilibili.com/x/web-interface/nav")
+        return self._cached_get("user_info", "https://api.bilibili.com/x/web-interface/nav")
 
     def get_user_stat(self):
         """[新增] 获取统计信息 (粉丝数、关注数、动态数)"""
-        return self._req("GET", "https://api.bilibili.com/x/web-interface/nav/stat")
+        return self._cached_get("user_stat", "https://api.bilibili.com/x/web-interface/nav/stat")
 
     def get_room_id_by_uid(self, uid):
         """通过 UID 获取直播间 ID"""
-        return self._req("GET", f"https://api.live.bilibili.com/room/v2/Room/room_id_by_uid?uid={uid}")
+        return self._cached_get("room_id_by_uid", f"https://api.live.bilibili.com/room/v2/Room/room_id_by_uid?uid={uid}")
 
     # --- 直播控制 ---
     def get_area_list(self):
-        return self._req("GET", "https://api.live.bilibili.com/room/v1/Area/getList", params={"show_pinyin": 1})
+        return self._cached_get("area_list", "https://api.live.bilibili.com/room/v1/Area/getList", params={"show_pinyin": 1})
 
     def get_room_info(self, room_id):
-        return self._req("GET", "https://api.live.bilibili.com/room/v1/Room/get_info", params={"room_id": room_id})
+        return self._cached_get("room_info", "https://api.live.bilibili.com/room/v1/Room/get_info", params={"room_id": room_id})
 
     def get_room_news(self, room_id, uid):
         params = {'room_id': room_id, 'uid': uid}
-        return self._req("GET", "https://api.live.bilibili.com/xlive/app-blink/v1/index/getRoomNews", params=params)
+        return self._cached_get("room_news", "https://api.live.bilibili.com/xlive/app-blink/v1/index/getRoomNews", params=params)
+
+    def _write(self, url, data, invalidates):
+        """写接口：成功后失效相关只读接口的缓存"""
+        success, res = self._req("POST", url, data=data)
+        if success and res.get('code') == 0:
+            self.invalidate_cache(*invalidates)
+        return success, res
 
     def update_title(self, room_id, title, csrf):
         data = {'room_id': room_id, 'platform': 'pc_link', 'title': title, 'csrf_token': csrf, 'csrf': csrf}
-        return self._req("POST", "https://api.live.bilibili.com/room/v1/Room/update", data=data)
+        return self._write("https://api.live.bilibili.com/room/v1/Room/update", data, ("room_info",))
 
     def update_announcement(self, room_id, uid, content, csrf):
         data = {'room_id': room_id, 'uid': uid, 'content': content, 'csrf_token': csrf, 'csrf': csrf}
-        return self._req("POST", "https://api.live.bilibili.com/xlive/app-blink/v1/index/updateRoomNews", data=data)
+        return self._write("https://api.live.bilibili.com/xlive/app-blink/v1/index/updateRoomNews", data, ("room_news",))
 
     def update_area(self, room_id, area_id, csrf):
         data = {'room_id': room_id, 'area_id': area_id, 'platform': 'pc_link', 'csrf_token': csrf, 'csrf': csrf}
-        return self._req("POST", "https://api.live.bilibili.com/room/v1/Room/update", data=data)
-
-    def start_live(self, room_id, area_id, csrf):
-        # 1. 获取时间戳
-        s1, t_resp = self._req("GET", "https://api.bilibili.com/x/report/click/now")
-        if not s1 or t_resp['code'] != 0: return False, t_resp
-        ts = t_resp["data"]["now"]
-
-        # 2. 获取版本
-        v_params = self._appsign({"system_version": 2, "ts": ts})
-        s2, v_resp = self._req("GET",
-                               "https://api.live.bilibili.com/xlive/app-blink/v1/liveVersionInfo/getHomePageLiveVersion",
-                               params=v_params)
+        return self._write("https://api.live.bilibili.com/room/v1/Room/update", data, ("room_info",))
+
+    # --- 开播准备 ---
+    def sync_clock(self):
+        """请求 click/now 并记录服务器与本地的时间偏移 (按往返中点估算)，成功返回 True"""
+        start = time.time()
+        success, res = self._req("GET", "https://api.bilibili.com/x/report/click/now")
+        end = time.time()
+        if not success or res.get('code') != 0:
+            logger.warning(f"Clock sync failed: {res}")
+            return False
+        self.clock_offset = res["data"]["now"] - (start + end) / 2
+        self.clock_synced_at = end
+        logger.debug(f"Clock synced, offset={self.clock_offset:.3f}s, rtt={(end - start) * 1000:.0f}ms")
+        return True
+
+    def _clock_stale(self):
+        return self.clock_offset is None or time.time() - self.clock_synced_at > self.CLOCK_SYNC_TTL
+
+    def server_time(self):
+        """根据本地记录的偏移计算服务器时间戳，偏移过期时重新同步；同步失败返回 None"""
+        if self._clock_stale():
+            if not self.sync_clock():
+                return None
+        return int(time.time() + self.clock_offset)
+
+    def get_live_version(self):
+        """直播姬版本信息 (build / curr_version)，带缓存"""
+        def fetch():
+            ts = self.server_time() or int(time.time())
+            return self._req("GET",
+                             "https://api.live.bilibili.com/xlive/app-blink/v1/liveVersionInfo/getHomePageLiveVersion",
+                             params=self._appsign({"system_version": 2, "ts": ts}))
+        return self.cache.get_or_fetch(("live_version",), self.CACHE_TTL["live_version"], fetch)
+
+    def prepare_start_live(self):
+        """预热开播所需的连接、时间偏移和版本信息，之后开播只需一次请求"""
+        self.warm_up()
+        if self._clock_stale():
+            self.sync_clock()
+        self.get_live_version()
+
+    def start_live(self, room_id, area_id, csrf, timings=None):
+        """
+        :param timings: 可选 dict，写入各阶段耗时 (毫秒)：clock / version / start
+        """
+        timings = {} if timings is None else timings
+
+        # 1. 获取时间戳 (偏移有效时无需请求)
+        t0 = time.perf_counter()
+        ts = self.server_time()
+        timings["clock"] = round((time.perf_counter() - t0) * 1000, 1)
+        if ts is None: return False, {"code": -1, "msg": "获取服务器时间失败"}
+
+        # 2. 获取版本 (缓存)
+        t0 = time.perf_counter()
+        s2, v_resp = self.get_live_version()
+        timings["version"] = round((time.perf_counter() - t0) * 1000, 1)
         if not s2 or v_resp['code'] != 0: return False, v_resp
 
         # 3. 开始直播
@@ -207,17 +407,25 @@ class BilibiliApi:
             'csrf_token': csrf, 'csrf': csrf, 'build': v_resp['data']['build'],
             'version': v_resp['data']['curr_version'], 'ts': ts
         }
-        return self._req("POST", "https://api.live.bilibili.com/room/v1/Room/startLive", data=self._appsign(data))
+        t0 = time.perf_counter()
+        success, res = self._write("https://api.live.bilibili.com/room/v1/Room/startLive", self._appsign(data),
+                                   ("room_info",))
+        timings["start"] = round((time.perf_counter() - t0) * 1000, 1)
+        if not success or res.get('code') not in (0, 60024, 60043):
+            # 失败时下次重新获取版本和时间，避免缓存的数据过期导致持续失败
+            self.invalidate_cache("live_version")
+            self.clock_offset = None
+        return success, res
 
     def stop_live(self, room_id, csrf):
         data = {'room_id': room_id, 'platform': 'pc_link', 'csrf_token': csrf, 'csrf': csrf}
-        return self._req("POST", "https://api.live.bilibili.com/room/v1/Room/stopLive", data=data)
+        return self._write("https://api.live.bilibili.com/room/v1/Room/stopLive", data, ("room_info",))
 
     # --- 弹幕发送 ---
     def send_danmu(self, room_id, msg, csrf):
         """发送弹幕"""
         # 1. 获取 Wbi 签名参数
-        _, query = get_w_rid_and_wts(other_data_dict={"web_location": 444.8})
+        _, query = get_w_rid_and_wts(other_data_dict={"web_location": 444.8}, session=self.session)
         
         # 2. 准备数据
         data = dt.bullet_data.copy()
@@ -229,7 +437,10 @@ class BilibiliApi:
         
         url = f"https://api.live.bilibili.com/msg/send?{query}"
         
-        return self._req("POST", url, data=data)
+        success, res = self._req("POST", url, data=data)
+        if success and is_sign_error(res):
+            logger.warning("Wbi sign rejected, keys invalidated")
+        return success, res
 
     # --- buvid3 获取 ---
     def get_buvid3(self):
@@ -238,3 +449,4 @@ class BilibiliApi:
         if success and res['code'] == 0:
             return res['data']['b_3']
         return None
+
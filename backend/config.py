@@ -1,7 +1,11 @@
 import os
 import sys
+import re
 import json
+import atexit
+import copy
 import logging
+import threading
 from backend import util
 
 import shutil  # 用于迁移配置文件
@@ -57,45 +61,254 @@ def get_config_path():
         return app_path
 
 CONFIG_FILE = os.path.join(get_config_path(), "config.json")
+ACCOUNTS_DIR = os.path.join(get_config_path(), "accounts")
+
+CONFIG_VERSION = 2  # 2: config.json 只保存索引，账户数据按 uid 分文件存放于 accounts/
+# 索引中保留的账户摘要字段 (账户列表展示用)，完整数据在账户文件中
+SUMMARY_FIELDS = ("uid", "uname", "face", "level", "roomId", "cookie_expired")
+
 
 class Config:
+    """
+    配置存储 (write-behind)：save() 只标记为脏并安排延迟写入，调用方不会阻塞在磁盘 I/O 上；
+    flush() 立即写入，退出时调用。写入为原子操作，内容未变化时跳过。
+
+    存储结构：config.json 为索引 (current_uid、应用设置、账户摘要)，
+    每个账户的完整数据存放在 accounts/<uid>.json，按需加载，修改后只写入该账户的文件。
+    """
+    SAVE_DELAY = 0.5  # 首次 save() 后等待合并后续修改的时间（秒）
+    RETRY_DELAY = 5  # 写入失败后的重试间隔（秒）
+
     def __init__(self):
+        self._lock = threading.Lock()  # 保护 data / accounts 的修改以及 _dirty / _timer
+        self._write_lock = threading.Lock()  # 串行化写盘
+        self._dirty = set()  # 待写入的文件：None 表示索引，其余为账户 uid
+        self._timer = None
+        self._last_written = {}  # 文件路径 -> 上次写入 (或读取) 的内容
+        self.accounts = {}  # uid -> 已加载的完整账户数据
         self.data = self._load_config()
+        self._migrate_sharded()
+        atexit.register(self.flush)
+
+    @staticmethod
+    def _account_file(uid):
+        return os.path.join(ACCOUNTS_DIR, re.sub(r'[^\w-]', '_', str(uid)) + ".json")
+
+    def _read_json(self, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        data = json.loads(text)
+        self._last_written[path] = text
+        return data
 
     def _load_config(self):
-        default_config = {"users": {}, "current_uid": None, "min_to_tray": True}
+        default_config = {"version": CONFIG_VERSION, "users": {}, "current_uid": None, "min_to_tray": True,
+                          "danmu_decode_mode": "inline"}
         if os.path.exists(CONFIG_FILE):
             try:
-                with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if "cookie" in data and "users" not in data:
-                        logger.info("Migrating legacy config...")
-                        try:
-                            temp = util.ck_str_to_dict(data["cookie"])
-                            uid = temp.get("DedeUserID", "default")
-                            return {
-                                "users": {
-                                    uid: {
-                                        "uid": uid, "uname": "Saved User", "face": "",
-                                        "cookie": data.get("cookie", ""), "roomId": data.get("roomId", ""),
-                                        "csrf": data.get("csrf", ""), "last_title": data.get("last_title", ""),
-                                        "last_area_id": data.get("last_area_id", ""),
-                                        "last_area_name": data.get("last_area_name", []),
-                                        "last_announcement": data.get("last_announcement", "")
-                                    }
-                                },
-                                "current_uid": uid,
-                                "min_to_tray": True # Default to True
-                            }
-                        except: pass
-                    return data
+                data = self._read_json(CONFIG_FILE)
+                if "cookie" in data and "users" not in data:
+                    logger.info("Migrating legacy config...")
+                    try:
+                        temp = util.ck_str_to_dict(data["cookie"])
+                        uid = temp.get("DedeUserID", "default")
+                        return {
+                            "users": {
+                                uid: {
+                                    "uid": uid, "uname": "Saved User", "face": "",
+                                    "cookie": data.get("cookie", ""), "roomId": data.get("roomId", ""),
+                                    "csrf": data.get("csrf", ""), "last_title": data.get("last_title", ""),
+                                    "last_area_id": data.get("last_area_id", ""),
+                                    "last_area_name": data.get("last_area_name", []),
+                                    "last_announcement": data.get("last_announcement", "")
+                                }
+                            },
+                            "current_uid": uid,
+                            "min_to_tray": True # Default to True
+                        }
+                    except: pass
+                return data
             except Exception as e:
                 logger.error(f"Config load failed: {e}")
         return default_config
 
-    def save(self):
+    def _migrate_sharded(self):
+        """单文件格式 (所有账户数据都在 config.json) 迁移为索引 + 账户文件"""
+        if self.data.get("version", 1) >= CONFIG_VERSION:
+            return
+        users = self.data.get("users", {})
+        logger.info(f"Migrating config to per-account storage ({len(users)} accounts)...")
+        # 完整数据先放入内存，迁移中途失败时也不会丢失
+        self.accounts.update(users)
         try:
-            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            # 先写账户文件，再写索引；中途失败时旧的 config.json 仍然完整，下次启动会重新迁移
+            os.makedirs(ACCOUNTS_DIR, exist_ok=True)
+            for uid, user in users.items():
+                self._write_file(self._account_file(uid), user)
+            self.data["users"] = {uid: self._summary(user) for uid, user in users.items()}
+            self.data["version"] = CONFIG_VERSION
+            self._write_file(CONFIG_FILE, self.data)
         except Exception as e:
-            logger.error(f"Save config failed: {e}")
+            logger.error(f"Config migration failed: {e}")
+            # 迁移失败时保持内存中的数据可用，下次保存时再写入
+            self.data["users"] = {uid: self._summary(user) for uid, user in users.items()}
+            self.data["version"] = CONFIG_VERSION
+            with self._lock:
+                self._dirty.add(None)
+                self._dirty.update(users)
+
+    @staticmethod
+    def _summary(user):
+        return {k: user[k] for k in SUMMARY_FIELDS if k in user}
+
+    # --- 账户数据 ---
+    def has_user(self, uid):
+        return uid is not None and str(uid) in self.data.get("users", {})
+
+    def get_user(self, uid):
+        """
+        返回账户的完整数据 (首次访问时从账户文件加载)，账户不存在或文件读取失败时返回 None
+        读取失败时不能用索引中的摘要代替：摘要没有 cookie / csrf，之后保存会覆盖账户文件中的凭据
+        """
+        if not self.has_user(uid):
+            return None
+        uid = str(uid)
+        with self._lock:
+            user = self.accounts.get(uid)
+            if user is not None:
+                return user
+        try:
+            user = self._read_json(self._account_file(uid))
+        except Exception as e:
+            logger.error(f"Load account failed: {e}")
+            return None
+        with self._lock:
+            return self.accounts.setdefault(uid, user)
+
+    def set(self, key, value):
+        """修改应用设置 (如 current_uid、min_to_tray) 并安排保存"""
+        with self._lock:
+            self.data[key] = value
+        self.save()
+
+    def get_current_user(self):
+        return self.get_user(self.data.get("current_uid"))
+
+    def list_users(self):
+        """账户摘要列表，不加载账户文件"""
+        return list(self.data.get("users", {}).values())
+
+    def set_user(self, uid, user):
+        """写入账户的完整数据"""
+        uid = str(uid)
+        with self._lock:
+            self.accounts[uid] = user
+            self.data.setdefault("users", {})[uid] = self._summary(user)
+        self.save(uid)
+
+    def update_user(self, uid, fields):
+        """更新账户的部分字段，账户不存在时返回 False"""
+        return bool(self.update_users({uid: fields}))
+
+    def update_users(self, updates):
+        """
+        批量更新多个账户的部分字段，只安排一次保存
+        字段在锁内合并到最新的账户数据上，不会覆盖其他线程同时做的修改
+        :param updates: uid -> 需要更新的字段
+        :return: 实际更新的 uid 列表 (不存在或读取失败的账户跳过)
+        """
+        for uid in updates:
+            self.get_user(uid)  # 确保已加载
+        updated = []
+        with self._lock:
+            for uid, fields in updates.items():
+                uid = str(uid)
+                user = self.accounts.get(uid)
+                if user is None or uid not in self.data.get("users", {}):
+                    continue
+                user.update(fields)
+                self.data["users"][uid] = self._summary(user)
+                self._dirty.add(uid)
+                updated.append(uid)
+        if updated:
+            self.save()
+        return updated
+
+    def remove_user(self, uid):
+        uid = str(uid)
+        with self._lock:
+            if self.data.get("users", {}).pop(uid, None) is None:
+                return False
+            self.accounts.pop(uid, None)
+            self._dirty.add(uid)
+        self.save()
+        return True
+
+    # --- 持久化 ---
+    def save(self, uid=None):
+        """
+        标记配置已修改，延迟写入磁盘 (SAVE_DELAY 内的多次修改只写一次)
+        :param uid: 修改了账户数据时传入，只写入该账户的文件；索引总是一并检查 (内容未变化时不写)
+        """
+        with self._lock:
+            self._dirty.add(None)
+            if uid is not None:
+                self._dirty.add(str(uid))
+            self._schedule(self.SAVE_DELAY)
+
+    def _schedule(self, delay):
+        """安排延迟写入 (调用方需持有 _lock)"""
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _serialize(self, data):
+        # 修改 data / accounts 的操作都持有 _lock，在锁内复制快照，锁外序列化
+        with self._lock:
+            snapshot = copy.deepcopy(data)
+        return json.dumps(snapshot, ensure_ascii=False, indent=2)
+
+    def _write_file(self, path, data):
+        content = self._serialize(data)
+        if content == self._last_written.get(path):
+            return
+        util.atomic_write_text(path, content)
+        self._last_written[path] = content
+
+    def _flush_one(self, key):
+        if key is None:
+            self._write_file(CONFIG_FILE, self.data)
+            return
+        path = self._account_file(key)
+        with self._lock:
+            user = self.accounts.get(key)
+        if user is not None:
+            os.makedirs(ACCOUNTS_DIR, exist_ok=True)
+            self._write_file(path, user)
+        elif key not in self.data.get("users", {}) and os.path.exists(path):
+            # 账户已删除
+            os.remove(path)
+            self._last_written.pop(path, None)
+
+    def flush(self):
+        """立即写入未保存的修改"""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                dirty, self._dirty = self._dirty, set()
+            failed = set()
+            # 账户文件先于索引写入，索引中出现的账户总有对应的文件
+            for key in sorted(dirty, key=lambda k: k is None):
+                try:
+                    self._flush_one(key)
+                except Exception as e:
+                    logger.error(f"Save config failed: {e}")
+                    failed.add(key)
+            if failed:
+                # 写入失败的文件重新标记为脏，稍后重试
+                with self._lock:
+                    self._dirty.update(failed)
+                    self._schedule(self.RETRY_DELAY)
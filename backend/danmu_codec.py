@@ -0,0 +1,194 @@
+"""
+说明：B站直播弹幕 WebSocket 数据包编解码
+
+数据包格式：16 字节头 (packet_len, header_len, proto_ver, operation, seq) + body，
+proto_ver 为 2/3 时 body 为 zlib/brotli 压缩的若干个子包。
+"""
+
+import json
+import logging
+import struct
+import zlib
+
+import brotli
+
+logger = logging.getLogger("DanmuCodec")
+
+HEADER = struct.Struct('!IHHII')
+HEADER_SIZE = HEADER.size
+POPULARITY = struct.Struct('!I')
+
+# 协议版本
+PROTO_JSON = 0
+PROTO_HEARTBEAT = 1
+PROTO_ZLIB = 2
+PROTO_BROTLI = 3
+
+# 操作码
+OP_HEARTBEAT = 2
+OP_HEARTBEAT_REPLY = 3
+OP_MESSAGE = 5
+OP_AUTH = 7
+OP_AUTH_REPLY = 8
+
+
+def pack_packet(operation: int, body: bytes, proto_ver: int = PROTO_HEARTBEAT) -> bytes:
+    """打包一个数据包"""
+    return HEADER.pack(HEADER_SIZE + len(body), HEADER_SIZE, proto_ver, operation, 1) + body
+
+
+def _decompress(proto_ver, body):
+    if proto_ver == PROTO_ZLIB:
+        return zlib.decompress(body)
+    # brotli 绑定不一定支持 buffer 协议，这里只复制压缩前的数据
+    return brotli.decompress(bytes(body))
+
+
+_PROTO_VERSIONS = frozenset((PROTO_JSON, PROTO_HEARTBEAT, PROTO_ZLIB, PROTO_BROTLI))
+_OPERATIONS = frozenset((OP_HEARTBEAT, OP_HEARTBEAT_REPLY, OP_MESSAGE, OP_AUTH, OP_AUTH_REPLY))
+
+
+def _resync(view, offset, end):
+    """
+    长度字段损坏时，从 offset 之后逐字节查找下一个看起来合法的包头
+    :return: 下一个包的偏移，找不到时返回 end
+    """
+    for pos in range(offset + 1, end - HEADER_SIZE + 1):
+        packet_len, header_len, proto_ver, operation, _ = HEADER.unpack_from(view, pos)
+        if header_len == HEADER_SIZE and proto_ver in _PROTO_VERSIONS and operation in _OPERATIONS \
+                and HEADER_SIZE <= packet_len <= end - pos:
+            return pos
+    return end
+
+
+def iter_packets(data, on_error=None):
+    """
+    迭代解码数据包，按原始顺序产出 (operation, body_view)
+    :param data: 收到的原始字节 (bytes / bytearray / memoryview)
+    :param on_error: 可选回调，参数为错误描述；默认写 warning 日志
+    :return: 生成器，body_view 为 memoryview，需在下一次迭代前使用或复制
+    """
+    report = on_error or logger.warning
+    # 栈中保存尚未解析完的缓冲区及其偏移，压缩包解出的子缓冲区压栈后优先处理，保证顺序
+    stack = [(memoryview(data), 0)]
+    while stack:
+        view, offset = stack.pop()
+        end = len(view)
+        while offset < end:
+            if end - offset < HEADER_SIZE:
+                report(f"Truncated packet header: {end - offset} bytes left")
+                break
+            packet_len, header_len, proto_ver, operation, _ = HEADER.unpack_from(view, offset)
+            if packet_len < HEADER_SIZE or offset + packet_len > end:
+                # 长度字段不可信：向后查找下一个合法包头继续解析，只丢弃中间无法识别的字节
+                resync = _resync(view, offset, end)
+                report(f"Malformed packet length {packet_len} at offset {offset} (buffer {end}), "
+                       f"skipped {resync - offset} bytes")
+                offset = resync
+                continue
+            if header_len < HEADER_SIZE or header_len > packet_len:
+                # 包长度可信，仅跳过这一个包
+                report(f"Malformed header length {header_len} at offset {offset}")
+                offset += packet_len
+                continue
+
+            body = view[offset + header_len:offset + packet_len]
+            offset += packet_len
+
+            if proto_ver in (PROTO_ZLIB, PROTO_BROTLI):
+                try:
+                    inner = _decompress(proto_ver, body)
+                except Exception as e:
+                    report(f"Decompress error (proto {proto_ver}): {e}")
+                    continue
+                stack.append((view, offset))
+                view, offset, end = memoryview(inner), 0, len(inner)
+                continue
+
+            yield operation, body
+
+
+_CMD_KEY = b'"cmd"'
+_WHITESPACE = b' \t\r\n'
+
+
+def extract_cmd(body):
+    """
+    不解析 JSON，直接从原始字节中取出 cmd 的值
+    :return: cmd 的 bytes；找不到或格式不符合预期时返回 None (调用方应退回完整解析)
+    """
+    # memoryview 不支持 find；cmd 通常位于开头，只复制前 64 字节
+    head = bytes(body[:64])
+    pos = head.find(_CMD_KEY)
+    if pos < 0:
+        return None
+    pos += len(_CMD_KEY)
+    n = len(head)
+    while pos < n and head[pos] in _WHITESPACE:
+        pos += 1
+    if pos >= n or head[pos] != 0x3A:  # ':'
+        return None
+    pos += 1
+    while pos < n and head[pos] in _WHITESPACE:
+        pos += 1
+    if pos >= n or head[pos] != 0x22:  # '"'
+        return None
+    end = head.find(b'"', pos + 1)
+    if end < 0:
+        return None
+    cmd = head[pos + 1:end]
+    # 含转义字符时交给 JSON 解析
+    if b'\\' in cmd:
+        return None
+    return cmd
+
+
+class CommandFilter:
+    """已订阅命令集合，在原始字节层面判断是否需要解析 (可 pickle，供进程池使用)"""
+
+    def __init__(self, exact=(), prefixes=()):
+        self.exact = frozenset(c.encode('utf-8') for c in exact)
+        self.prefixes = tuple(p.encode('utf-8') for p in prefixes)
+
+    def accepts(self, cmd: bytes) -> bool:
+        return cmd in self.exact or cmd.startswith(self.prefixes)
+
+    def __eq__(self, other):
+        if not isinstance(other, CommandFilter):
+            return NotImplemented
+        return self.exact == other.exact and set(self.prefixes) == set(other.prefixes)
+
+    def __hash__(self):
+        return hash((self.exact, frozenset(self.prefixes)))
+
+
+def decode_frame(data, command_filter=None):
+    """
+    完整解码一帧 (解压 + JSON 解析)，结果只包含可 pickle 的对象，可在线程/进程池中执行
+    :param command_filter: 可选 CommandFilter，未订阅的 OP_MESSAGE 在解析前直接丢弃
+    :return: (events, errors, skipped_messages, skipped_bytes)；events 为 [(operation, payload)]，
+             OP_MESSAGE / OP_AUTH_REPLY 的 payload 为 dict，OP_HEARTBEAT_REPLY 为人气值 int；
+             认证回复无法解析时仍产出 (OP_AUTH_REPLY, None)，由调用方按认证失败处理
+    """
+    events = []
+    errors = []
+    skipped_messages = 0
+    skipped_bytes = 0
+    for operation, body in iter_packets(data, on_error=errors.append):
+        try:
+            if operation == OP_MESSAGE and command_filter is not None:
+                cmd = extract_cmd(body)
+                if cmd is not None and not command_filter.accepts(cmd):
+                    skipped_messages += 1
+                    skipped_bytes += len(body)
+                    continue
+            if operation in (OP_MESSAGE, OP_AUTH_REPLY):
+                events.append((operation, json.loads(bytes(body))))
+            elif operation == OP_HEARTBEAT_REPLY:
+                if len(body) >= POPULARITY.size:
+                    events.append((operation, POPULARITY.unpack_from(body)[0]))
+        except Exception as e:
+            errors.append(f"JSON decode error (op {operation}): {e}")
+            if operation == OP_AUTH_REPLY:
+                events.append((operation, None))
+    return events, errors, skipped_messages, skipped_bytes
@@ -0,0 +1,53 @@
+"""
+说明：弹幕连接凭据缓存
+
+缓存 getDanmuInfo 返回的 token / host_list 以及 uid 解析结果 (WBI 密钥由 get_wbi.wbi_keys 缓存)，
+短暂断线后的重连无需再发起任何 HTTP 请求；认证失败 (op 8 且 code 非 0) 时才失效刷新。
+"""
+
+import logging
+import time
+
+logger = logging.getLogger("DanmuCredentials")
+
+
+class CredentialCache:
+    TOKEN_TTL = 30 * 60  # token 与 host_list（秒）
+    UID_TTL = 60 * 60  # 未登录时 uid=0 的解析结果（秒）
+
+    def __init__(self):
+        self.danmu_info = {}  # (room_id, uid) -> (data, fetched_at)
+        self.anonymous = {}  # cookie 指纹 -> fetched_at，记录已确认未登录的 cookie
+
+    @staticmethod
+    def _fresh(fetched_at, ttl):
+        return time.monotonic() - fetched_at < ttl
+
+    def get_danmu_info(self, room_id, uid):
+        entry = self.danmu_info.get((str(room_id), int(uid)))
+        if entry and self._fresh(entry[1], self.TOKEN_TTL):
+            return entry[0]
+        return None
+
+    def set_danmu_info(self, room_id, uid, data):
+        self.danmu_info[(str(room_id), int(uid))] = (data, time.monotonic())
+
+    def is_anonymous(self, cookie_key):
+        fetched_at = self.anonymous.get(cookie_key)
+        return fetched_at is not None and self._fresh(fetched_at, self.UID_TTL)
+
+    def set_anonymous(self, cookie_key):
+        self.anonymous[cookie_key] = time.monotonic()
+
+    def invalidate(self, room_id=None, uid=None):
+        """认证失败时调用：清除对应房间的 token 和未登录标记"""
+        if room_id is None:
+            self.danmu_info.clear()
+        else:
+            self.danmu_info.pop((str(room_id), int(uid or 0)), None)
+        self.anonymous.clear()
+        logger.info("Danmu credentials invalidated")
+
+
+# 进程内共享，主房间与 DanmuHub 的所有房间共用
+credential_cache = CredentialCache()
@@ -0,0 +1,146 @@
+"""
+说明：弹幕服务器选择
+
+getDanmuInfo 会返回多个 host，这里并发向各 host 建立 WebSocket 连接并使用最快的一个，
+同时记录每个 host 的延迟与失败次数，供后续连接排序和故障切换使用。
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("DanmuHosts")
+
+
+class HostSelector:
+    CONNECT_TIMEOUT = 10  # 单个 host 的建连超时（秒）
+    STATS_TTL = 600  # 统计数据有效期，过期后重新并发建连（秒）
+    EWMA_ALPHA = 0.3
+
+    def __init__(self):
+        self.stats = {}  # "host:port" -> {"latency": 秒, "failures": 连续失败次数, "updated": 时间戳}
+
+    @staticmethod
+    def host_key(host):
+        return f"{host['host']}:{host['wss_port']}"
+
+    def _entry(self, key):
+        return self.stats.setdefault(key, {"latency": None, "failures": 0, "updated": 0})
+
+    def record_success(self, host, latency):
+        entry = self._entry(self.host_key(host))
+        if entry["latency"] is None:
+            entry["latency"] = latency
+        else:
+            entry["latency"] += self.EWMA_ALPHA * (latency - entry["latency"])
+        entry["failures"] = 0
+        entry["updated"] = time.time()
+
+    def record_failure(self, host):
+        entry = self._entry(self.host_key(host))
+        entry["failures"] += 1
+        entry["updated"] = time.time()
+
+    def order(self, hosts):
+        """按 (连续失败次数, 延迟) 排序，未测过的 host 排在同失败次数的已测 host 之后，保持原有相对顺序"""
+        def sort_key(item):
+            index, host = item
+            entry = self.stats.get(self.host_key(host))
+            if not entry:
+                return 0, float('inf'), index
+            latency = entry["latency"] if entry["latency"] is not None else float('inf')
+            return entry["failures"], latency, index
+        return [host for _, host in sorted(enumerate(hosts), key=sort_key)]
+
+    def is_fresh(self, hosts):
+        """所有 host 都有有效期内的统计数据"""
+        now = time.time()
+        for host in hosts:
+            entry = self.stats.get(self.host_key(host))
+            if not entry or now - entry["updated"] > self.STATS_TTL:
+                return False
+        return True
+
+    async def _open(self, host, open_connection):
+        """建立一个连接并记录耗时，超时或失败时记录失败后抛出"""
+        start = time.perf_counter()
+        try:
+            conn = await asyncio.wait_for(open_connection(host), self.CONNECT_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"Connect failed: {host['host']} -> {e!r}")
+            self.record_failure(host)
+            raise
+        self.record_success(host, time.perf_counter() - start)
+        return conn
+
+    @staticmethod
+    async def _close(conn):
+        try:
+            await conn.close()
+        except Exception:
+            pass
+
+    async def _connect_in_order(self, hosts, open_connection):
+        ordered = self.order(hosts)
+        for index, host in enumerate(ordered):
+            try:
+                conn = await self._open(host, open_connection)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                continue
+            return host, conn, ordered[index + 1:]
+        raise ConnectionError("All danmu hosts failed")
+
+    async def _race(self, hosts, open_connection):
+        tasks = {asyncio.create_task(self._open(h, open_connection)): h for h in hosts}
+        pending = set(tasks)
+        winner = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+                    if winner is None:
+                        winner = task
+                    else:
+                        # 同一轮完成的其他连接不再使用
+                        await self._close(task.result())
+        finally:
+            for task in pending:
+                task.cancel()
+            # 取消前可能已经建连成功，统一关闭，避免泄漏
+            for task, result in zip(pending, await asyncio.gather(*pending, return_exceptions=True)):
+                if not isinstance(result, BaseException):
+                    await self._close(result)
+        if winner is None:
+            raise ConnectionError("All danmu hosts failed")
+        host = tasks[winner]
+        ordered = self.order(hosts)
+        logger.debug("Connect race result: " + ", ".join(
+            f"{h['host']}={self._format_latency(h)}" for h in ordered))
+        return host, winner.result(), [h for h in ordered if h is not host]
+
+    def _format_latency(self, host):
+        entry = self.stats.get(self.host_key(host))
+        if not entry or entry["latency"] is None:
+            return "n/a"
+        return f"{entry['latency'] * 1000:.0f}ms"
+
+    async def connect(self, hosts, open_connection):
+        """
+        建立连接：统计数据仍有效时按排序依次尝试；否则同时向所有 host 发起连接，
+        直接使用最先成功的连接 (不做额外探测)，其余连接关闭
+        :param open_connection: 协程函数，参数为 host，返回带 close() 协程的连接对象
+        :return: (host, 连接, 按排序剩余的备用 host)
+        :raises ConnectionError: 所有 host 均失败
+        """
+        if len(hosts) <= 1 or self.is_fresh(hosts):
+            return await self._connect_in_order(hosts, open_connection)
+        return await self._race(hosts, open_connection)
+
+# 进程内共享，主房间与 DanmuHub 的所有房间共用同一份统计
+host_selector = HostSelector()
@@ -0,0 +1,214 @@
+"""
+说明：后端 -> 前端的事件总线
+
+高频事件 (弹幕、日志) 不再逐条调用 evaluate_js，而是按通道排队，
+由后台线程每隔 FLUSH_INTERVAL 合并为一次 onEventBatch 调用 (一次 json.dumps、一次 JS 调用)。
+低优先级通道 (进场、互动提示) 使用有界队列，满了丢弃最旧的事件。
+
+开启 compact 的通道以列式结构推送 (见 wire_format)，由前端展开。
+
+窗口隐藏到托盘期间不向前端推送：每个通道只在环形缓冲区中保留最近的事件并按类型计数，
+窗口重新显示时一次性推送快照 (onEventSnapshot)，而不是回放全部事件。
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+from backend.wire_format import encode_columnar
+
+logger = logging.getLogger("EventBus")
+
+
+class _Channel:
+    __slots__ = ("name", "function_name", "queue", "max_size", "compact", "hidden", "published", "dropped")
+
+    def __init__(self, name, function_name, max_size=None, snapshot_size=50, compact=False):
+        self.name = name
+        self.function_name = function_name
+        self.max_size = max_size
+        self.compact = compact
+        self.queue = deque()  # (enqueued_at, event)
+        self.hidden = deque(maxlen=snapshot_size)  # 窗口隐藏期间的最近事件
+        self.published = 0
+        self.dropped = 0
+
+
+class EventBus:
+    FLUSH_INTERVAL = 0.033  # 合并窗口（秒），约两帧
+    IDLE_TICK = 1.0  # 没有事件时执行 flush 钩子的间隔（秒）
+
+    def __init__(self, window_service, interval=FLUSH_INTERVAL):
+        self.window_service = window_service
+        self.interval = interval
+        self.channels = {}  # 通道名 -> _Channel，按注册顺序推送
+        self._lock = threading.Lock()  # 保护各通道的队列
+        # 串行化“取出 + 推送”：后台线程与 stop() 等调用方同时 flush 时，批次仍按入队顺序到达前端
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._flush_hooks = []
+        self.visible = True
+        self.hidden_since = None
+        self.hidden_counts = {}  # 隐藏期间按类型计数
+        self.stats = {"flushes": 0, "events": 0, "max_events_per_flush": 0,
+                      "latency_total_ms": 0.0, "max_latency_ms": 0.0}
+
+    def register_channel(self, name, function_name, max_size=None, snapshot_size=50, compact=False):
+        """
+        :param function_name: 前端 window 上的处理函数，每个事件调用一次
+        :param max_size: 队列上限，超出时丢弃最旧的事件 (用于低优先级通道)；None 表示不限
+        :param snapshot_size: 窗口隐藏期间保留的最近事件数
+        :param compact: 事件为字段相同的 dict 时使用列式编码推送
+        """
+        with self._lock:
+            self.channels[name] = _Channel(name, function_name, max_size, snapshot_size, compact)
+
+    def add_flush_hook(self, hook):
+        """每次推送前 (以及空闲时每隔 IDLE_TICK) 在总线线程中调用，可在其中 publish 延迟生成的事件"""
+        self._flush_hooks.append(hook)
+
+    def _run_hooks(self):
+        for hook in self._flush_hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.error(f"Event flush hook failed: {e!r}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="EventBus", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止后台线程，并推送剩余事件"""
+        self._stopped = True
+        self._wakeup.set()
+        self._run_hooks()
+        self.flush()
+
+    def publish(self, name, event):
+        """事件入队，不阻塞调用方"""
+        with self._lock:
+            channel = self.channels[name]
+            if not self.visible:
+                channel.hidden.append(event)
+                channel.published += 1
+                kind = event.get("type", name) if isinstance(event, dict) else name
+                self.hidden_counts[kind] = self.hidden_counts.get(kind, 0) + 1
+                return
+            if channel.max_size is not None and len(channel.queue) >= channel.max_size:
+                channel.queue.popleft()
+                channel.dropped += 1
+            channel.queue.append((time.perf_counter(), event))
+            channel.published += 1
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopped:
+            woken = self._wakeup.wait(self.IDLE_TICK)
+            if self._stopped:
+                break
+            if woken:
+                # 等待合并窗口内的其他事件
+                time.sleep(self.interval)
+                self._wakeup.clear()
+            self._run_hooks()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Event flush failed: {e!r}")
+
+    def flush(self):
+        """将所有通道的排队事件合并为一次前端调用"""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        batch = []
+        oldest = None
+        count = 0
+        with self._lock:
+            for channel in self.channels.values():
+                if not channel.queue:
+                    continue
+                items = channel.queue
+                channel.queue = deque()
+                if oldest is None or items[0][0] < oldest:
+                    oldest = items[0][0]
+                count += len(items)
+                batch.append([channel, [event for _, event in items]])
+        if not batch:
+            return 0
+        batch = self._encode(batch)
+
+        # 格式：[[函数名, [事件, ...]], ...]，由前端 bridge.js 的 onEventBatch 分发
+        self.window_service.send_to_frontend("onEventBatch", batch)
+
+        latency = (time.perf_counter() - oldest) * 1000
+        stats = self.stats
+        stats["flushes"] += 1
+        stats["events"] += count
+        stats["max_events_per_flush"] = max(stats["max_events_per_flush"], count)
+        stats["latency_total_ms"] += latency
+        stats["max_latency_ms"] = max(stats["max_latency_ms"], latency)
+        return count
+
+    @staticmethod
+    def _encode(batch):
+        """[[_Channel, 事件列表], ...] -> [[函数名, 事件列表或列式结构], ...]，在锁外执行"""
+        return [[channel.function_name, encode_columnar(events) if channel.compact else events]
+                for channel, events in batch]
+
+    def set_visible(self, visible):
+        """
+        窗口隐藏 / 显示时调用
+        显示时推送隐藏期间的快照：{"hidden_ms", "counts": {类型: 数量}, "batch": 与 onEventBatch 相同格式}
+        整个切换持有 flush 锁，后台线程不会在快照之前推送显示后的新事件，也不会在隐藏后推送
+        """
+        with self._flush_lock:
+            if not visible:
+                with self._lock:
+                    if not self.visible:
+                        return
+                    # 之后的事件进入环形缓冲区
+                    self.visible = False
+                    self.hidden_since = time.monotonic()
+                    self.hidden_counts = {}
+                # 隐藏前已排队的事件照常推送
+                self._flush()
+                return
+
+            with self._lock:
+                if self.visible:
+                    return
+                self.visible = True
+                batch = []
+                for channel in self.channels.values():
+                    if channel.hidden:
+                        batch.append([channel, list(channel.hidden)])
+                        channel.hidden.clear()
+                snapshot = {
+                    "hidden_ms": int((time.monotonic() - self.hidden_since) * 1000),
+                    "counts": self.hidden_counts,
+                }
+                self.hidden_counts = {}
+            snapshot["batch"] = self._encode(batch)
+            self.window_service.send_to_frontend("onEventSnapshot", snapshot)
+
+    def get_stats(self):
+        with self._flush_lock:
+            stats = dict(self.stats)
+        flushes = stats["flushes"]
+        stats["avg_events_per_flush"] = round(stats["events"] / flushes, 2) if flushes else 0
+        stats["avg_latency_ms"] = round(stats.pop("latency_total_ms") / flushes, 2) if flushes else 0
+        stats["max_latency_ms"] = round(stats["max_latency_ms"], 2)
+        with self._lock:
+            stats["visible"] = self.visible
+            stats["channels"] = {
+                c.name: {"published": c.published, "dropped": c.dropped, "queued": len(c.queue)}
+                for c in self.channels.values()
+            }
+        return stats
@@ -5,16 +5,23 @@ wbi算法来源：https://github.com/SocialSisterYi/bilibili-API-collect/blob/ma
 
 本文档作者：Chace
 
-版本：1.0.0
+版本：1.1.0
 
 更新时间：2025-02-11
 """
 
-from functools import reduce
+from functools import lru_cache
 from hashlib import md5
+import json
+import logging
+import os
+import threading
 import urllib.parse
 import time
 import requests
+from backend import util
+
+logger = logging.getLogger("Wbi")
 
 # 打乱映射表
 mixinKeyEncTab = [
@@ -25,9 +32,10 @@ mixinKeyEncTab = [
 ]
 
 
+@lru_cache(maxsize=8)
 def getMixinKey(orig: str):
-    """对 imgKey 和 subKey 进行字符顺序打乱编码"""
-    return reduce(lambda s, i: s + orig[i], mixinKeyEncTab, '')[:32]
+    """对 imgKey 和 subKey 进行字符顺序打乱编码 (每组密钥只计算一次)"""
+    return ''.join(orig[i] for i in mixinKeyEncTab)[:32]
 
 
 def encWbi(params: dict, img_key: str, sub_key: str):
@@ -48,13 +56,16 @@ def encWbi(params: dict, img_key: str, sub_key: str):
     return params
 
 
-def getWbiKeys() -> tuple[str, str]:
-    """获取最新的 img_key 和 sub_key"""
+def getWbiKeys(session=None) -> tuple[str, str]:
+    """
+    获取最新的 img_key 和 sub_key
+    :param session: 可选的 requests.Session，复用调用方的连接池
+    """
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
         'Referer': 'https://www.bilibili.com/'
     }
-    resp = requests.get('https://api.bilibili.com/x/web-interface/nav', headers=headers)
+    resp = (session or requests).get('https://api.bilibili.com/x/web-interface/nav', headers=headers)
     resp.raise_for_status()
     json_content = resp.json()
     img_url: str = json_content['data']['wbi_img']['img_url']
@@ -64,13 +75,133 @@ def getWbiKeys() -> tuple[str, str]:
     return img_key, sub_key
 
 
-def get_w_rid_and_wts(other_data_dict: dict) -> tuple[dict, str]:
+class WbiKeyProvider:
+    """
+    WBI 密钥缓存：内存 + 磁盘 (路径由 set_cache_file 指定)
+
+    - B站每日轮换密钥，缓存在北京时间次日 0 点或获取 24 小时后过期
+    - 距离过期不足 REFRESH_AHEAD 秒时在后台线程提前刷新
+    - 接口返回 -352 / -403 签名错误时调用 invalidate() 强制刷新
+    - 同一时间只有一个线程请求 nav，其余线程等待并复用结果
+    """
+    REFRESH_AHEAD = 10 * 60
+    MAX_AGE = 24 * 60 * 60
+    SIGN_ERROR_CODES = (-352, -403)
+
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self.keys = None  # (img_key, sub_key)
+        self.expires_at = 0
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._refreshing = False
+        self._load()
+
+    def set_cache_file(self, cache_file):
+        """指定磁盘缓存路径并加载其中仍有效的密钥"""
+        self.cache_file = cache_file
+        self._load()
+
+    @classmethod
+    def _expire_time(cls, fetched_at):
+        # 北京时间 (UTC+8) 次日 0 点
+        day = 24 * 60 * 60
+        next_midnight = (int(fetched_at + 8 * 3600) // day + 1) * day - 8 * 3600
+        return min(next_midnight, fetched_at + cls.MAX_AGE)
+
+    def _load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            expires_at = self._expire_time(data['fetched_at'])
+            if time.time() < expires_at:
+                self.keys = (data['img_key'], data['sub_key'])
+                self.expires_at = expires_at
+        except Exception as e:
+            logger.warning(f"Load wbi key cache failed: {e}")
+
+    def _save(self, fetched_at):
+        if not self.cache_file:
+            return
+        try:
+            img_key, sub_key = self.keys
+            util.atomic_write_text(self.cache_file, json.dumps(
+                {"img_key": img_key, "sub_key": sub_key, "fetched_at": fetched_at}))
+        except Exception as e:
+            logger.warning(f"Save wbi key cache failed: {e}")
+
+    def _fetch(self, session=None, min_remaining=0):
+        """
+        请求 nav 获取密钥 (single-flight)
+        :param min_remaining: 等锁期间其他线程已刷新、且剩余有效期超过该值时直接复用
+        """
+        with self._fetch_lock:
+            keys = self.keys
+            if keys and self.expires_at - time.time() > min_remaining:
+                return keys
+            keys = getWbiKeys(session)
+            fetched_at = time.time()
+            with self._lock:
+                self.keys = keys
+                self.expires_at = self._expire_time(fetched_at)
+                self._save(fetched_at)
+        getMixinKey(keys[0] + keys[1])  # 预先计算 mixin key
+        logger.debug("Wbi keys refreshed")
+        return keys
+
+    def _refresh_in_background(self, session=None):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self._fetch(session, self.REFRESH_AHEAD)
+            except Exception as e:
+                logger.warning(f"Background wbi key refresh failed: {e}")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get(self, session=None) -> tuple[str, str]:
+        """获取 (img_key, sub_key)，缓存失效时同步请求"""
+        keys, remaining = self.keys, self.expires_at - time.time()
+        if keys and remaining > 0:
+            if remaining < self.REFRESH_AHEAD:
+                self._refresh_in_background(session)
+            return keys
+        return self._fetch(session)
+
+    def invalidate(self):
+        with self._lock:
+            self.keys = None
+            self.expires_at = 0
+
+
+# 进程内共享；磁盘缓存路径由 ApiService 启动时指定
+wbi_keys = WbiKeyProvider()
+
+
+def is_sign_error(res: dict) -> bool:
+    """接口返回是否为 WBI 签名错误，是则让缓存的密钥失效"""
+    if isinstance(res, dict) and res.get('code') in WbiKeyProvider.SIGN_ERROR_CODES:
+        wbi_keys.invalidate()
+        return True
+    return False
+
+
+def get_w_rid_and_wts(other_data_dict: dict, session=None) -> tuple[dict, str]:
     """
     获取w_rid和wts
     :param other_data_dict: 其他参数
+    :param session: 可选的 requests.Session，密钥需要刷新时复用其连接池
     :return: 返回的第一个值是含有签名的dict形式，第二个是写入url中的query形式
     """
-    img_key, sub_key = getWbiKeys()
+    img_key, sub_key = wbi_keys.get(session)
 
     signed_params = encWbi(params=other_data_dict, img_key=img_key, sub_key=sub_key)
     query = urllib.parse.urlencode(signed_params)
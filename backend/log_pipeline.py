@@ -0,0 +1,47 @@
+"""
+说明：异步日志管道
+
+所有 logger 只挂一个 QueueHandler，记录入队后立即返回；
+文件、控制台、前端等实际输出由 QueueListener 的后台线程执行，
+写文件 / 推送前端不会阻塞弹幕事件循环或 bridge 线程。
+"""
+
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+_listener = None
+
+
+def start(handlers, level=logging.DEBUG):
+    """替换 root logger 的处理器为队列，handlers 在后台线程中执行"""
+    global _listener
+    if _listener is not None:
+        return _listener
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # 退出时写完队列中剩余的日志
+    atexit.register(stop)
+    return _listener
+
+
+def add_handler(handler):
+    """追加输出处理器；管道未启动时直接挂到 root logger"""
+    if _listener is None:
+        logging.getLogger().addHandler(handler)
+        return
+    _listener.handlers = _listener.handlers + (handler,)
+
+
+def stop():
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
@@ -0,0 +1,235 @@
+"""
+说明：直播分区目录
+
+由 getList (show_pinyin=1) 的响应一次性构建：
+- 正向索引：父分区名 -> 子分区名 -> area_id
+- 反向索引：area_id -> [父分区名, 子分区名]
+- 搜索索引：子分区名 / 拼音的前缀表，供前端输入时实时搜索；
+  字符表用于包含匹配，只检查含有关键词全部字符的分区，不扫描整个目录
+get_partitions 的响应在构建时生成并复用，目录本身构建后只读，刷新时整体替换。
+
+PartitionStore 将分区列表持久化到磁盘，启动时直接使用，过期后在后台刷新。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from backend import util
+
+logger = logging.getLogger("PartitionCatalog")
+
+
+class PartitionCatalog:
+    PREFIX_MAX = 8  # 前缀索引的最大长度，更长的关键词在前缀候选中再过滤
+    SEARCH_CACHE_SIZE = 128
+
+    def __init__(self, areas=None):
+        """
+        :param areas: getList 响应的 data 列表
+        """
+        self.by_name = {}  # 父分区名 -> {子分区名: area_id}
+        self.by_id = {}  # str(area_id) -> [父分区名, 子分区名]
+        self.entries = []  # (父分区名, 子分区名, area_id, 名称小写, 拼音小写)
+        self.prefixes = {}  # 前缀 -> entries 下标列表
+        self.chars = {}  # 字符 -> 名称或拼音中含有该字符的 entries 下标集合
+        self._search_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        for p in areas or []:
+            p_name = p['name']
+            sub_map = self.by_name.setdefault(p_name, {})
+            for s in p.get('list') or []:
+                s_name = s['name']
+                aid = s['id']
+                sub_map[s_name] = aid
+                self.by_id[str(aid)] = [p_name, s_name]
+                self.entries.append((p_name, s_name, aid, s_name.lower(), (s.get('pinyin') or '').lower()))
+
+        for index, entry in enumerate(self.entries):
+            keys = set()
+            for text in (entry[3], entry[4]):
+                for i in range(1, min(len(text), self.PREFIX_MAX) + 1):
+                    keys.add(text[:i])
+            for key in keys:
+                self.prefixes.setdefault(key, []).append(index)
+            for char in set(entry[3] + entry[4]):
+                self.chars.setdefault(char, set()).add(index)
+
+        # 预先生成 get_partitions 的响应，每次调用直接复用
+        self.response = {"code": 0, "data": {p: list(s.keys()) for p, s in self.by_name.items()}}
+
+    def __bool__(self):
+        return bool(self.by_name)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_id(self, p_name, s_name):
+        return self.by_name.get(p_name, {}).get(s_name)
+
+    def get_names(self, area_id):
+        """根据 area_id 反查分区名称 [parent_name, sub_name]，未找到时返回 []"""
+        return list(self.by_id.get(str(area_id), []))
+
+    def _rank(self, entry, keyword):
+        """数值越小越靠前：名称完全匹配 > 名称前缀 > 拼音前缀 > 名称包含 > 拼音包含"""
+        name, pinyin = entry[3], entry[4]
+        if name == keyword:
+            return 0
+        if name.startswith(keyword):
+            return 1
+        if pinyin.startswith(keyword):
+            return 2
+        if keyword in name:
+            return 3
+        if keyword in pinyin:
+            return 4
+        return None
+
+    def _containing_chars(self, keyword):
+        """名称或拼音中含有关键词全部字符的 entries 下标 (包含匹配的候选)"""
+        sets = sorted((self.chars.get(char, ()) for char in set(keyword)), key=len)
+        if not sets or not sets[0]:
+            return set()
+        return set(sets[0]).intersection(*sets[1:])
+
+    def search(self, keyword, limit=20):
+        """
+        按子分区名或拼音搜索，返回 [{"parent", "name", "id"}]
+        相同关键词的结果会缓存，前端逐字输入时可直接复用
+        """
+        keyword = (keyword or '').strip().lower()
+        if not keyword:
+            return []
+        cache_key = (keyword, limit)
+        with self._cache_lock:
+            result = self._search_cache.get(cache_key)
+            if result is not None:
+                self._search_cache.move_to_end(cache_key)
+                return result
+
+        candidates = self.prefixes.get(keyword[:self.PREFIX_MAX], [])
+        ranked = []
+        for index in candidates:
+            rank = self._rank(self.entries[index], keyword)
+            if rank is not None:
+                ranked.append((rank, index))
+        if len(ranked) < limit:
+            # 前缀不够时再补充包含关键词的分区
+            for index in self._containing_chars(keyword).difference(candidates):
+                rank = self._rank(self.entries[index], keyword)
+                if rank is not None:
+                    ranked.append((rank, index))
+        ranked.sort()
+
+        result = []
+        for _, index in ranked[:limit]:
+            p_name, s_name, aid = self.entries[index][:3]
+            result.append({"parent": p_name, "name": s_name, "id": aid})
+
+        with self._cache_lock:
+            self._search_cache[cache_key] = result
+            if len(self._search_cache) > self.SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+        return result
+
+
+class PartitionStore:
+    """
+    分区目录缓存：内存 + 磁盘
+
+    - 启动时从磁盘加载，界面无需等待网络请求
+    - 超过 MAX_AGE 后在后台线程刷新，完成后整体替换目录
+    - 只有目录为空或请求了未知分区时才同步请求
+    """
+    MAX_AGE = 6 * 60 * 60
+
+    def __init__(self, api_client, cache_file=None):
+        self.api = api_client
+        self.cache_file = cache_file
+        self.catalog = PartitionCatalog()
+        self.fetched_at = 0
+        self._lock = threading.Lock()  # 串行化网络刷新
+        self._flag_lock = threading.Lock()
+        self._refreshing = False
+        self._load()
+
+    def _load(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.catalog = PartitionCatalog(data['areas'])
+            self.fetched_at = data['fetched_at']
+            logger.debug(f"Partition cache loaded: {len(self.catalog)} areas")
+        except Exception as e:
+            logger.warning(f"Load partition cache failed: {e}")
+
+    def _save(self, areas, fetched_at):
+        if not self.cache_file:
+            return
+        try:
+            util.atomic_write_text(self.cache_file, json.dumps(
+                {"fetched_at": fetched_at, "areas": areas}, ensure_ascii=False))
+        except Exception as e:
+            logger.warning(f"Save partition cache failed: {e}")
+
+    def is_stale(self):
+        return not self.catalog or time.time() - self.fetched_at > self.MAX_AGE
+
+    def refresh(self, force=False):
+        """
+        同步刷新，成功返回 True
+        :param force: 跳过接口响应缓存 (请求了未知分区时使用)
+        """
+        with self._lock:
+            if force:
+                self.api.invalidate_cache("area_list")
+            success, res = self.api.get_area_list()
+            if not (success and res.get('code') == 0):
+                logger.error(f"Failed to refresh partitions: {res}")
+                return False
+            areas = res['data']
+            fetched_at = time.time()
+            self.catalog = PartitionCatalog(areas)
+            self.fetched_at = fetched_at
+            self._save(areas, fetched_at)
+        logger.debug(f"Partition catalog built: {len(self.catalog)} areas")
+        return True
+
+    def refresh_in_background(self):
+        with self._flag_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"Background partition refresh failed: {e}")
+            finally:
+                with self._flag_lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def prefetch(self):
+        """启动时调用：缓存过期或为空时在后台刷新"""
+        if self.is_stale():
+            self.refresh_in_background()
+
+    def get(self):
+        """返回当前目录；为空时同步请求，过期时后台刷新并先返回旧目录"""
+        catalog = self.catalog
+        if not catalog:
+            self.refresh()
+            return self.catalog
+        if self.is_stale():
+            self.refresh_in_background()
+        return catalog
@@ -1,9 +1,14 @@
 class AuthService:
-    def __init__(self, api_client, user_service, live_service, session_state):
-        self.api = api_client
-        self.user_service = user_service
-        self.live_service = live_service
-        self.state = session_state
+    def __init__(self, sessions):
+        """
+        :param sessions: SessionRegistry，登录成功后为新账户注册独立的会话
+        """
+        self.sessions = sessions
+
+    @property
+    def api(self):
+        # 二维码接口与账户无关，使用当前会话的客户端
+        return self.sessions.active.api
 
     def get_login_qrcode(self):
         success, res = self.api.get_passport_qrcode()
@@ -14,20 +19,31 @@ class AuthService:
         if not success: return {"code": -1, "msg": "网络请求失败"}
         data = res.get('data', {})
         if data.get('code') == 0:
+            uid = str(cookies.get("DedeUserID"))
+            # 新账户使用独立的会话，其他账户的连接不受影响
+            session = self.sessions.create(uid, cookies)
             try:
-                self.state.clear()
-                self.api.update_cookies(cookies)
-                csrf = cookies.get('bili_jct', '')
-                room_id = self.user_service.fetch_room_id(cookies)
-                if not room_id: return {"code": -1, "msg": "获取直播间ID失败"}
-                ok, full_data = self.user_service.fetch_full_user_data()
-                if ok:
-                    uid = str(cookies.get("DedeUserID"))
-                    cookie_str = "; ".join([f"{k}={v}" for k, v in cookies.items()])
-                    saved_user = self.user_service.save_user_data(uid, full_data, cookie_str, room_id, csrf)
-                    self.live_service._refresh_partitions_internal()
-                    return {"code": 0, "data": saved_user}
-                return {"code": -1, "msg": "获取用户信息失败"}
+                result = self._register_session(session, uid, cookies)
             except Exception as e:
-                return {"code": -1, "msg": str(e)}
+                result = {"code": -1, "msg": str(e)}
+            if result["code"] != 0:
+                # 登录未完成，释放未注册的会话
+                session.release()
+            return result
         return {"code": data.get('code'), "msg": data.get('message')}
+
+    def _register_session(self, session, uid, cookies):
+        """获取账户资料并保存，成功后注册会话并设为当前账户"""
+        user_service = session.user_service
+        csrf = cookies.get('bili_jct', '')
+        room_id = user_service.fetch_room_id(cookies)
+        if not room_id: return {"code": -1, "msg": "获取直播间ID失败"}
+        ok, full_data = user_service.fetch_full_user_data()
+        if not ok: return {"code": -1, "msg": "获取用户信息失败"}
+        cookie_str = "; ".join([f"{k}={v}" for k, v in cookies.items()])
+        saved_user = user_service.save_user_data(uid, full_data, cookie_str, room_id, csrf)
+        self.sessions.add(session)
+        self.sessions.activate(uid)
+        # 分区列表与账户无关，已有缓存时不阻塞登录流程
+        session.live_service.partitions.prefetch()
+        return {"code": 0, "data": saved_user}
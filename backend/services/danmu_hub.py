@@ -0,0 +1,112 @@
+import logging
+
+import aiohttp
+
+from backend import util
+from backend.async_bilibili_api import AsyncBilibiliApi
+from backend.danmu_decoder import DanmuDecoder, DECODE_INLINE
+from backend.services.danmu_service import DanmuService
+from backend.state import SessionState
+
+logger = logging.getLogger("DanmuHub")
+
+
+class DanmuHub:
+    """
+    在同一个事件循环上同时监听多个直播间的弹幕
+
+    所有房间共用一个 aiohttp.ClientSession (一个连接池、一个 SSL 上下文) 和一个解码工作器，
+    每个房间各自维护 WebSocket、心跳、重连状态和自己的 SessionState，不会改写账户的会话状态。
+    以下协程方法必须在弹幕事件循环中执行。
+    """
+
+    def __init__(self, api_client, session_state, decode_mode=DECODE_INLINE, async_api=None):
+        self.api = api_client
+        self.async_api = async_api or AsyncBilibiliApi(api_client)
+        self.state = session_state
+        self.decode_mode = decode_mode
+        self.rooms = {}  # room_id -> DanmuService
+        self.session = None
+        self.decoder = None
+        self.message_callback = None
+        self.handlers = []  # [(cmd, fn, prefix)]，新房间自动注册
+
+    def set_callback(self, callback):
+        self.message_callback = callback
+
+    def set_decode_mode(self, mode):
+        """设置解码模式，所有房间停止后重新开始监听时生效"""
+        self.decode_mode = mode
+
+    def register_handler(self, cmd, fn, prefix=False):
+        """为所有房间 (含之后加入的房间) 注册命令处理器"""
+        self.handlers.append((cmd, fn, prefix))
+        for service in self.rooms.values():
+            service.register_handler(cmd, fn, prefix)
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            # WebSocket 长连接同样占用连接池名额，这里不设总数上限
+            connector = aiohttp.TCPConnector(limit=0, ssl=util.get_ssl_context())
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    def _get_decoder(self):
+        if self.decoder is not None and not self.rooms and self.decoder.mode != self.decode_mode:
+            self.decoder.close()
+            self.decoder = None
+        if self.decoder is None:
+            self.decoder = DanmuDecoder(self.decode_mode)
+        return self.decoder
+
+    def _room_state(self, room_id):
+        """房间独立的连接状态，只从账户状态中带上 uid (用于认证包)"""
+        state = SessionState()
+        state.room_id = room_id
+        state.uid = self.state.uid
+        return state
+
+    async def watch_room(self, room_id):
+        """开始监听直播间，已在监听则跳过"""
+        room_id = str(room_id)
+        if room_id in self.rooms:
+            return False
+        service = DanmuService(self.api, self._room_state(room_id), session=self._get_session(),
+                               decoder=self._get_decoder(), async_api=self.async_api)
+        service.set_callback(self.message_callback)
+        for cmd, fn, prefix in self.handlers:
+            service.register_handler(cmd, fn, prefix)
+        self.rooms[room_id] = service
+        logger.info(f"Watching room: {util.mask_string(room_id)} ({len(self.rooms)} rooms)")
+        await service.connect(room_id)
+        return True
+
+    async def unwatch_room(self, room_id):
+        """停止监听直播间"""
+        service = self.rooms.pop(str(room_id), None)
+        if not service:
+            return False
+        await service.stop()
+        logger.info(f"Unwatched room: {util.mask_string(str(room_id))} ({len(self.rooms)} rooms)")
+        return True
+
+    async def stop(self):
+        """停止所有房间并释放共享资源"""
+        for room_id in list(self.rooms):
+            await self.unwatch_room(room_id)
+        if self.session is not None:
+            try:
+                await self.session.close()
+            except Exception:
+                pass
+            self.session = None
+        if self.decoder is not None:
+            self.decoder.close()
+            self.decoder = None
+
+    def get_rooms(self):
+        return [
+            {"room_id": room_id, "connected": service.ws is not None,
+             "reconnect_attempts": service.reconnect_attempts}
+            for room_id, service in self.rooms.items()
+        ]
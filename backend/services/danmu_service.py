@@ -1,24 +1,76 @@
 import asyncio
 import json
 import logging
-import struct
-import zlib
 import base64
-import ssl
+import time
 
-import brotli
 import aiohttp
-import certifi
-from backend import get_wbi
 from backend import util
 from backend import dm_pb2
+from backend import danmu_codec
+from backend.async_bilibili_api import AsyncBilibiliApi
+from backend.danmu_credentials import credential_cache
+from backend.danmu_decoder import DanmuDecoder, DECODE_INLINE
+from backend.danmu_hosts import host_selector
 
 logger = logging.getLogger("DanmuService")
 
+# INTERACT_WORD msg_type -> 文案
+INTERACT_MSG_TEXT = {1: "进入直播间", 2: "关注了直播间", 3: "分享了直播间"}
+
+
+class CommandRegistry:
+    """命令名 -> 处理器 映射，精确匹配优先，其次最长前缀匹配；每个命令名只查找一次并缓存结果"""
+    MAX_CACHE = 1024
+
+    def __init__(self):
+        self.exact = {}
+        self.prefixes = {}
+        self._cache = {}
+
+    def register(self, cmd, fn, prefix=False):
+        (self.prefixes if prefix else self.exact)[cmd] = fn
+        self._cache.clear()
+
+    def unregister(self, cmd, prefix=False):
+        (self.prefixes if prefix else self.exact).pop(cmd, None)
+        self._cache.clear()
+
+    def build_filter(self):
+        """生成对应的原始字节层命令过滤器"""
+        return danmu_codec.CommandFilter(self.exact.keys(), self.prefixes.keys())
+
+    def resolve(self, cmd):
+        """返回 cmd 对应的处理器，未注册返回 None (同样会被缓存)"""
+        try:
+            return self._cache[cmd]
+        except KeyError:
+            pass
+        handler = self.exact.get(cmd)
+        if handler is None:
+            best = ""
+            for p, fn in self.prefixes.items():
+                if len(p) > len(best) and cmd.startswith(p):
+                    best, handler = p, fn
+        if len(self._cache) >= self.MAX_CACHE:
+            self._cache.clear()
+        self._cache[cmd] = handler
+        return handler
+
+
 class DanmuService:
-    def __init__(self, api_client, session_state):
+    def __init__(self, api_client, session_state, decode_mode=DECODE_INLINE, session=None, decoder=None,
+                 async_api=None):
+        """
+        :param api_client: 同步 BilibiliApi，仅用于 pywebview 桥接线程中的调用 (如发送弹幕)
+        :param session: 可选的共享 aiohttp.ClientSession (由 DanmuHub 提供)，不会在断开时关闭
+        :param decoder: 可选的共享 DanmuDecoder，不会在停止时关闭
+        :param async_api: 事件循环内使用的 AsyncBilibiliApi，未传入时基于 api_client 创建
+        """
         self.api = api_client
+        self.async_api = async_api or AsyncBilibiliApi(api_client)
         self.state = session_state
+        self.room_id = None
         self.ws = None
         self.running = False
         self.heartbeat_task = None
@@ -26,10 +78,26 @@ class DanmuService:
         self.message_callback = None
         self.log_callback = None
         self.session = None
+        self.shared_session = session
         self.reconnect_attempts = 0
         self.reconnect_delay = 5  # 初始重连延迟（秒）
         self.max_reconnect_delay = 60  # 最大重连延迟（秒）
         self._reconnecting = False  # 防止重复触发重连
+        self.danmu_info = None  # 最近一次 getDanmuInfo 的结果 (token 与 host 列表)
+        self.current_host = None
+        self.failover_hosts = []  # 故障切换时依次尝试的备用 host
+        self.disconnected_at = None  # 断线时刻，用于统计重连耗时
+        self.owns_decoder = decoder is None
+        self.decoder = decoder or DanmuDecoder(decode_mode)
+        self.decode_mode = self.decoder.mode
+        self.decode_queue = None  # 非 inline 模式下按接收顺序排队的解码任务
+        self.dispatch_task = None
+        self.command_filter = None
+        self.commands = CommandRegistry()
+        self._register_default_handlers()
+        # 未注册处理器的命令在 JSON 解析前直接丢弃
+        self.prefilter_enabled = True
+        self.filter_stats = {"parsed_messages": 0, "skipped_messages": 0, "skipped_bytes": 0}
 
     def set_callback(self, callback):
         self.message_callback = callback
@@ -37,6 +105,10 @@ class DanmuService:
     def set_log_callback(self, callback):
         self.log_callback = callback
 
+    def set_decode_mode(self, mode):
+        """设置解码模式 (inline / thread / process)，下次连接时生效"""
+        self.decode_mode = mode
+
     def _log(self, msg):
         logger.info(msg)
         if self.log_callback:
@@ -44,11 +116,10 @@ class DanmuService:
 
     def _notify_frontend(self, msg_type, msg_content):
         """通知前端消息"""
-        if self.message_callback:
-            self.message_callback({
-                'type': 'system',
-                'msg': msg_content
-            })
+        self._emit({
+            'type': 'system',
+            'msg': msg_content
+        })
 
     def _mask_string(self, s, visible_start=2, visible_end=2):
         """简单的字符串脱敏"""
@@ -88,33 +159,13 @@ class DanmuService:
              return {"code": -1, "msg": "网络请求失败"}
 
     async def get_danmu_info(self, room_id):
-        """获取弹幕服务器信息"""
+        """获取弹幕服务器信息 (buvid3 由调用方 _connect_internal 预先获取)"""
         try:
-            # 1. 准备参数
-            params = {
-                "id": room_id,
-                "type": 0
-            }
-            
-            # 2. 获取 Wbi 签名
-            signed_params, _ = get_wbi.get_w_rid_and_wts(params)
-
-            if 'buvid3' not in self.api.cookies:
-                buvid3 = self.api.get_buvid3()
-                if buvid3:
-                    self.api.cookies['buvid3'] = buvid3
-                    self._log(f"Fetched buvid3: {self._mask_string(buvid3, 4, 4)}")
-                else:
-                    logger.warning("Failed to fetch buvid3")
-            
-            # 3. 请求接口
-            success, res = self.api._req("GET", "https://api.live.bilibili.com/xlive/web-room/v1/index/getDanmuInfo", params=signed_params)
-            
+            success, res = await self.async_api.get_danmu_info(room_id)
             if success and res['code'] == 0:
                 return res['data']
-            else:
-                logger.error(f"Failed to get danmu info: {res}")
-                return None
+            logger.error(f"Failed to get danmu info: {res}")
+            return None
         except Exception as e:
             logger.error(f"Error getting danmu info: {e}")
             return None
@@ -125,6 +176,11 @@ class DanmuService:
             await self.stop()
 
         self.running = True
+        self.room_id = room_id
+        self.danmu_info = None
+        self.current_host = None
+        self.failover_hosts = []
+        self.disconnected_at = None
         self.reconnect_attempts = 0
         self._reconnecting = False
         
@@ -139,6 +195,10 @@ class DanmuService:
         if self.receive_task:
             self.receive_task.cancel()
             self.receive_task = None
+        if self.dispatch_task:
+            self.dispatch_task.cancel()
+            self.dispatch_task = None
+        self.decode_queue = None
         # 关闭旧的 WebSocket 和 session
         if self.ws:
             try:
@@ -146,54 +206,85 @@ class DanmuService:
             except Exception:
                 pass
             self.ws = None
-        if self.session:
+        if self.session and self.session is not self.shared_session:
             try:
                 await self.session.close()
             except Exception:
                 pass
-            self.session = None
+        self.session = None
 
-    async def _connect_internal(self, room_id):
-        """内部连接逻辑，支持重连"""
+    async def _connect_internal(self, room_id, failover=False):
+        """
+        内部连接逻辑，支持重连
+        :param failover: 为 True 时复用上次的 token，直接尝试下一个备用 host
+        """
         # 先清理旧连接
         await self._cleanup_connection()
 
-        # 尝试获取 buvid3，如果不存在则先获取
-        if 'buvid3' not in self.api.cookies:
-            buvid3 = self.api.get_buvid3()
-            if buvid3:
-                self.api.cookies['buvid3'] = buvid3
-                self._log(f"Fetched buvid3: {self._mask_string(buvid3, 4, 4)}")
-            else:
-                logger.warning("Failed to fetch buvid3")
-
-        # 尝试获取 uid
-        if not self.state.uid:
-             success, res = self.api.get_user_info()
-             if success and res['code'] == 0 and res['data']['isLogin']:
-                 self.state.uid = res['data']['mid']
-                 self._log(f"Fetched uid: {self._mask_string(str(self.state.uid), 2, 2)}")
-             else:
-                 self.state.uid = 0
-                 self._log("User not logged in, using uid=0")
-
-        danmu_info = await self.get_danmu_info(room_id)
-        if not danmu_info:
+        if self.owns_decoder and self.decoder.mode != self.decode_mode:
+            self.decoder.close()
+            self.decoder = DanmuDecoder(self.decode_mode)
+
+        if not (failover and self.danmu_info and self.failover_hosts):
+            # 尝试获取 buvid3，如果不存在则先获取
+            if 'buvid3' not in self.api.cookies:
+                buvid3 = await self.async_api.get_buvid3()
+                if buvid3:
+                    self.api.cookies['buvid3'] = buvid3
+                    self._log(f"Fetched buvid3: {self._mask_string(buvid3, 4, 4)}")
+                else:
+                    logger.warning("Failed to fetch buvid3")
+
+            # 尝试获取 uid (已确认未登录的 cookie 在缓存有效期内不再请求 nav)
+            cookie_key = self.api.cookies.get('DedeUserID', '')
+            if not self.state.uid and not credential_cache.is_anonymous(cookie_key):
+                 success, res = await self.async_api.get_user_info()
+                 if success and res['code'] == 0 and res['data']['isLogin']:
+                     self.state.uid = res['data']['mid']
+                     self._log(f"Fetched uid: {self._mask_string(str(self.state.uid), 2, 2)}")
+                 else:
+                     self.state.uid = 0
+                     credential_cache.set_anonymous(cookie_key)
+                     self._log("User not logged in, using uid=0")
+
+            danmu_info = credential_cache.get_danmu_info(room_id, self.state.uid or 0)
+            if not danmu_info:
+                danmu_info = await self.get_danmu_info(room_id)
+                if not danmu_info or not danmu_info.get('host_list'):
+                    self.danmu_info = None
+                    self.failover_hosts = []
+                    self._schedule_reconnect(room_id)
+                    return False
+                credential_cache.set_danmu_info(room_id, self.state.uid or 0, danmu_info)
+            self.danmu_info = danmu_info
+            self.failover_hosts = danmu_info['host_list']
+
+        token = self.danmu_info['token']
+        self.session = self.shared_session or aiohttp.ClientSession()
+
+        def open_ws(host):
+            # 优先使用 wss
+            return self.session.ws_connect(f"wss://{host['host']}:{host['wss_port']}/sub",
+                                           headers=self.api.headers, ssl=util.get_ssl_context())
+
+        # 统计过期时同时向所有 host 建连并使用最快的连接，否则按延迟和历史失败次数依次尝试；
+        # 剩余 host 留作故障切换，全部失败后才进入指数退避
+        try:
+            host, ws, self.failover_hosts = await host_selector.connect(self.failover_hosts, open_ws)
+        except ConnectionError as e:
+            logger.error(f"Failed to connect to danmu server: {e}")
+            self.failover_hosts = []
+            await self._cleanup_connection()
             self._schedule_reconnect(room_id)
             return False
+        if not self.running:
+            await ws.close()
+            return False
+        self.ws = ws
+        self.current_host = host
+        ws_url = f"wss://{host['host']}:{host['wss_port']}/sub"
 
-        token = danmu_info['token']
-        host_list = danmu_info['host_list']
-        
-        # 优先使用 wss
-        ws_url = f"wss://{host_list[0]['host']}:{host_list[0]['wss_port']}/sub"
-        
         try:
-            # PyInstaller 打包后默认 CA 路径可能来自构建机，使用 certifi 保证 WSS 校验一致。
-            ssl_context = ssl.create_default_context(cafile=certifi.where())
-            self.session = aiohttp.ClientSession()
-            self.ws = await self.session.ws_connect(ws_url, headers=self.api.headers, ssl=ssl_context)
-            
             # 发送认证包
             auth_data = {
                 "uid": int(self.state.uid),
@@ -203,23 +294,38 @@ class DanmuService:
                 "type": 2,
                 "key": token
             }
-            await self.send_packet(7, json.dumps(auth_data))
-            
-            # 启动心跳和接收任务
+            await self.send_packet(danmu_codec.OP_AUTH, json.dumps(auth_data))
+
+            # 启动心跳和接收任务，非 inline 模式额外启动按序分发任务
+            if self.decoder.mode != DECODE_INLINE:
+                self.decode_queue = asyncio.Queue()
+                self.dispatch_task = asyncio.create_task(self._dispatch_loop(self.decode_queue))
             self.heartbeat_task = asyncio.create_task(self._heartbeat_loop(room_id))
             self.receive_task = asyncio.create_task(self._receive_loop(room_id))
-            
+
             self._log(f"Connected to danmu server: {ws_url}")
+            if self.disconnected_at is not None:
+                elapsed = (time.perf_counter() - self.disconnected_at) * 1000
+                self._log(f"Danmu reconnected in {elapsed:.0f}ms")
+                self.disconnected_at = None
             self._notify_frontend('system', "弹幕服务器连接成功")
             self.reconnect_attempts = 0  # 重连成功，重置计数
             self._reconnecting = False
             return True
         except Exception as e:
-            logger.error(f"Failed to connect to danmu server: {e}")
+            # 当前 host 计入失败，由重连逻辑切换到下一个备用 host
+            logger.error(f"Failed to connect to danmu server {ws_url}: {e!r}")
             await self._cleanup_connection()
             self._schedule_reconnect(room_id)
             return False
 
+    def _on_auth_failed(self):
+        credential_cache.invalidate(self.room_id, self.state.uid or 0)
+        self.danmu_info = None
+        self.failover_hosts = []
+        self.current_host = None
+        self._schedule_reconnect(self.room_id)
+
     def _schedule_reconnect(self, room_id):
         """调度重连任务（带指数退避，无次数上限）"""
         if not self.running:
@@ -228,6 +334,26 @@ class DanmuService:
         if self._reconnecting:
             return
         self._reconnecting = True
+        if self.disconnected_at is None:
+            self.disconnected_at = time.perf_counter()
+
+        if self.current_host:
+            # 已连接的 host 断开，计入失败统计
+            host_selector.record_failure(self.current_host)
+            self.current_host = None
+
+        if self.danmu_info and self.failover_hosts:
+            # 还有未尝试的备用 host，立即切换，不进入退避
+            next_host = self.failover_hosts[0]['host']
+            self._log(f"弹幕连接断开，立即切换到备用服务器 {next_host}")
+
+            async def failover_task():
+                self._reconnecting = False
+                if self.running:
+                    await self._connect_internal(room_id, failover=True)
+
+            asyncio.create_task(failover_task())
+            return
 
         self.reconnect_attempts += 1
         # 指数退避：5, 10, 20, 40, 60, 60, 60...
@@ -249,6 +375,8 @@ class DanmuService:
         self.running = False
         self._reconnecting = False
         await self._cleanup_connection()
+        if self.owns_decoder:
+            self.decoder.close()
         self._log("Danmu service stopped")
 
     async def send_packet(self, operation, body):
@@ -256,15 +384,13 @@ class DanmuService:
         if not self.ws:
             return
         
-        body_bytes = body.encode('utf-8')
-        header = struct.pack('!IHHII', 16 + len(body_bytes), 16, 1, operation, 1)
-        await self.ws.send_bytes(header + body_bytes)
+        await self.ws.send_bytes(danmu_codec.pack_packet(operation, body.encode('utf-8')))
 
     async def _heartbeat_loop(self, room_id):
         """心跳循环"""
         while self.running:
             try:
-                await self.send_packet(2, "")
+                await self.send_packet(danmu_codec.OP_HEARTBEAT, "")
                 await asyncio.sleep(30)
             except asyncio.CancelledError:
                 return
@@ -279,7 +405,7 @@ class DanmuService:
             try:
                 msg = await self.ws.receive()
                 if msg.type == aiohttp.WSMsgType.BINARY:
-                    await self._decode_packet(msg.data)
+                    self._decode_packet(msg.data)
                 elif msg.type == aiohttp.WSMsgType.CLOSED:
                     logger.warning("WebSocket connection closed")
                     self._schedule_reconnect(room_id)
@@ -295,193 +421,208 @@ class DanmuService:
                 self._schedule_reconnect(room_id)
                 return
 
-    async def _decode_packet(self, data):
-        """解码数据包"""
-        offset = 0
-        while offset < len(data):
+    def _decode_packet(self, data):
+        """解码数据包：inline 模式直接分发，否则交给解码工作器并按接收顺序排队"""
+        result = self.decoder.submit(data, self.command_filter if self.prefilter_enabled else None)
+        if self.decode_queue is None:
+            self._dispatch_frame(*result)
+        else:
+            self.decode_queue.put_nowait(result)
+
+    async def _dispatch_loop(self, queue):
+        """按接收顺序等待解码结果并分发"""
+        while True:
+            future = await queue.get()
             try:
-                packet_len, header_len, proto_ver, operation, seq = struct.unpack('!IHHII', data[offset:offset+16])
-                body = data[offset+16:offset+packet_len]
-                
-                if proto_ver == 2:
-                    # zlib 压缩
-                    body = zlib.decompress(body)
-                    await self._decode_packet(body)
-                elif proto_ver == 3:
-                    # brotli 压缩
-                    body = brotli.decompress(body)
-                    await self._decode_packet(body)
-                else:
-                    if operation == 5:
-                        # 普通包 (命令)
-                        try:
-                            body_json = json.loads(body.decode('utf-8'))
-                            await self._handle_command(body_json)
-                        except Exception as e:
-                            logger.error(f"JSON decode error: {e}")
-                    elif operation == 3:
-                        # 心跳回复 (人气值)
-                        popularity = struct.unpack('!I', body)[0]
-                        # logger.debug(f"Popularity: {popularity}")
-                    elif operation == 8:
-                        # 认证包回复
-                        try:
-                            body_json = json.loads(body.decode('utf-8'))
-                            if body_json.get('code') == 0:
-                                self._log("Danmu authentication successful")
-                            else:
-                                logger.error(f"Danmu authentication failed: {body_json}")
-                        except Exception as e:
-                            logger.error(f"Auth response decode error: {e}")
-                
-                offset += packet_len
+                result = await future
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                logger.error(f"Packet decode error: {e}")
-                break
-
-    async def _handle_command(self, command):
-        """处理命令"""
-        cmd = command.get('cmd', '')
-        if cmd.startswith('DANMU_MSG'):
-            # print(command)
-            info = command.get('info', [])
-            # print(info)
-            if info:
-                danmu_data = {
-                    'type': 'danmu',
-                    'uid': info[2][0],
-                    'uname': info[2][1],
-                    'face': '', # 弹幕消息中不直接包含头像，需要额外获取或从 info[0][15]['user']['base']['face'] 获取
-                    'msg': info[1]
-                }
-                
-                # 尝试获取头像
+                logger.error(f"Decode worker error: {e}")
+                continue
+            self._dispatch_frame(*result)
+
+    def _dispatch_frame(self, events, errors, skipped_messages=0, skipped_bytes=0):
+        """分发一帧解码结果"""
+        stats = self.filter_stats
+        stats["skipped_messages"] += skipped_messages
+        stats["skipped_bytes"] += skipped_bytes
+        for err in errors:
+            logger.error(f"Packet decode error: {err}")
+        for operation, payload in events:
+            if operation == danmu_codec.OP_MESSAGE:
+                # 普通包 (命令)
+                stats["parsed_messages"] += 1
                 try:
-                    if len(info) > 0 and len(info[0]) > 15:
-                         extra = info[0][15]
-                         if 'user' in extra and 'base' in extra['user']:
-                             danmu_data['face'] = extra['user']['base']['face']
-                except:
-                    pass
-
-                if self.message_callback:
-                    self.message_callback(danmu_data)
-        
-        elif cmd == 'INTERACT_WORD':
-             # 交互消息（进场、关注、分享）
-             data = command.get('data', {})
-             msg_type = data.get('msg_type')
-             
-             # 尝试转为 int
-             try:
-                 msg_type = int(msg_type)
-             except:
-                 pass
-
-             msg_text = ""
-             if msg_type == 1:
-                 msg_text = "进入直播间"
-             elif msg_type == 2:
-                 msg_text = "关注了直播间"
-             elif msg_type == 3:
-                 msg_text = "分享了直播间"
-             
-             if msg_text:
-                 self._log(f"Interact: {data.get('uname')} {msg_text}")
-                 interact_data = {
-                     'type': 'interact',
-                     'uid': data.get('uid'),
-                     'uname': data.get('uname'),
-                     'msg': msg_text
-                 }
-                 if self.message_callback:
-                     self.message_callback(interact_data)
-
-        elif cmd.startswith('ENTRY_EFFECT'):
-             # 进场特效
-             data = command.get('data', {})
-             # print(data)
-             copy_writing = data.get('copy_writing')
-             if copy_writing:
-                 self._log(f"Entry Effect: {copy_writing}")
-                 msg = copy_writing.replace('<%', '').replace('%>', '')
-                 interact_data = {
-                     'type': 'interact',
-                     'uid': data.get('uid'),
-                     'uname': '', # 名字在 msg 里
-                     'msg': msg
-                 }
-                 if self.message_callback:
-                     self.message_callback(interact_data)
-
-        elif cmd.startswith('SEND_GIFT'):
-            # 送礼
-            data = command.get('data', {})
-            # print(data)
-            gift_name = data.get('giftName') or data.get('gift_name')
-            self._log(f"Gift: {data.get('uname')} sent {gift_name}")
-            gift_data = {
-                'type': 'gift',
-                'uid': data.get('uid'),
-                'uname': data.get('uname'),
-                'face': data.get('face'),
-                'gift_name': gift_name,
-                'num': data.get('num'),
-                'action': data.get('action') or '投喂'
+                    self._handle_command(payload)
+                except Exception as e:
+                    logger.error(f"Handle command error: {e}")
+            elif operation == danmu_codec.OP_HEARTBEAT_REPLY:
+                # 心跳回复 (人气值)
+                # logger.debug(f"Popularity: {payload}")
+                pass
+            elif operation == danmu_codec.OP_AUTH_REPLY:
+                # 认证包回复；回复体无法解析 (payload 不是 dict) 时同样按认证失败处理
+                if isinstance(payload, dict) and payload.get('code') == 0:
+                    self._log("Danmu authentication successful")
+                else:
+                    logger.error(f"Danmu authentication failed: {payload}")
+                    # token 可能已过期，清除缓存后重新获取
+                    self._on_auth_failed()
+
+    def register_handler(self, cmd, fn, prefix=False):
+        """
+        注册命令处理器
+        :param cmd: 命令名，如 SUPER_CHAT_MESSAGE
+        :param fn: 处理函数，参数为完整的命令 dict
+        :param prefix: 为 True 时匹配所有以 cmd 开头的命令 (如 DANMU_MSG:4:0:2:2:2:0)
+        """
+        self.commands.register(cmd, fn, prefix)
+        self.command_filter = self.commands.build_filter()
+
+    def unregister_handler(self, cmd, prefix=False):
+        self.commands.unregister(cmd, prefix)
+        self.command_filter = self.commands.build_filter()
+
+    @property
+    def subscriptions(self):
+        """当前订阅的命令：(精确匹配集合, 前缀集合)"""
+        return set(self.commands.exact), set(self.commands.prefixes)
+
+    def get_filter_stats(self):
+        return dict(self.filter_stats)
+
+    def _register_default_handlers(self):
+        self.register_handler('DANMU_MSG', self._on_danmu_msg, prefix=True)
+        self.register_handler('INTERACT_WORD', self._on_interact_word)
+        self.register_handler('INTERACT_WORD_V2', self._on_interact_word_v2, prefix=True)
+        self.register_handler('ENTRY_EFFECT', self._on_entry_effect, prefix=True)
+        self.register_handler('SEND_GIFT', self._on_send_gift, prefix=True)
+        self.register_handler('COMBO_SEND', self._on_combo_send, prefix=True)
+
+    def _handle_command(self, command):
+        """处理命令"""
+        handler = self.commands.resolve(command.get('cmd', ''))
+        if handler:
+            handler(command)
+
+    def _emit(self, data):
+        if self.message_callback:
+            # 多房间监听时前端据此区分消息来源
+            data['room_id'] = self.room_id
+            self.message_callback(data)
+
+    def _on_danmu_msg(self, command):
+        # print(command)
+        info = command.get('info', [])
+        # print(info)
+        if info:
+            danmu_data = {
+                'type': 'danmu',
+                'uid': info[2][0],
+                'uname': info[2][1],
+                'face': '', # 弹幕消息中不直接包含头像，需要额外获取或从 info[0][15]['user']['base']['face'] 获取
+                'msg': info[1]
             }
-            if self.message_callback:
-                self.message_callback(gift_data)
-
-        elif cmd.startswith('COMBO_SEND'):
-            # 连击送礼
-            data = command.get('data', {})
-            gift_name = data.get('gift_name') or data.get('giftName')
-            self._log(f"Combo Gift: {data.get('uname')} sent {gift_name} x {data.get('combo_num')}")
-            gift_data = {
-                'type': 'gift',
+
+            # 尝试获取头像
+            try:
+                if len(info) > 0 and len(info[0]) > 15:
+                     extra = info[0][15]
+                     if 'user' in extra and 'base' in extra['user']:
+                         danmu_data['face'] = extra['user']['base']['face']
+            except:
+                pass
+
+            self._emit(danmu_data)
+
+    def _on_interact_word(self, command):
+        # 交互消息（进场、关注、分享）
+        data = command.get('data', {})
+        msg_type = data.get('msg_type')
+
+        # 尝试转为 int
+        try:
+            msg_type = int(msg_type)
+        except:
+            pass
+
+        msg_text = INTERACT_MSG_TEXT.get(msg_type)
+        if msg_text:
+            self._log(f"Interact: {data.get('uname')} {msg_text}")
+            self._emit({
+                'type': 'interact',
                 'uid': data.get('uid'),
                 'uname': data.get('uname'),
-                'face': '', 
-                'gift_name': gift_name,
-                'num': data.get('combo_num'),
-                'action': data.get('action') or '投喂'
-            }
-            if self.message_callback:
-                self.message_callback(gift_data)
-        
-        elif cmd.startswith('INTERACT_WORD_V2'):
-             # 交互消息（进场、关注、分享）
-             data = command.get('data', {})
+                'msg': msg_text
+            })
 
-             # print(data)
-             
-             # 先用 base64 解码 data['pb'] 内的字符串为字节数据pb，再使用proto文件解码pb数据。
-             try:
-                 pb_data = base64.b64decode(data.get('pb', ''))
-                 dm_v2 = dm_pb2.InteractWordV2()
-                 dm_v2.ParseFromString(pb_data)
-                 
-                 msg_type = dm_v2.msg_type
-                 uname = dm_v2.uname
-                 uid = dm_v2.uid
-                 
-                 msg_text = ""
-                 if msg_type == 1:
-                     msg_text = "进入直播间"
-                 elif msg_type == 2:
-                     msg_text = "关注了直播间"
-                 elif msg_type == 3:
-                     msg_text = "分享了直播间"
-                 
-                 if msg_text:
-                     self._log(f"Interact V2: {uname} {msg_text}")
-                     interact_data = {
-                         'type': 'interact',
-                         'uid': uid,
-                         'uname': uname,
-                         'msg': msg_text
-                     }
-                     if self.message_callback:
-                         self.message_callback(interact_data)
-             except Exception as e:
-                 logger.error(f"Decode INTERACT_WORD_V2 error: {e}")
+    def _on_interact_word_v2(self, command):
+        # 交互消息（进场、关注、分享）
+        data = command.get('data', {})
+
+        # print(data)
+
+        # 先用 base64 解码 data['pb'] 内的字符串为字节数据pb，再使用proto文件解码pb数据。
+        try:
+            pb_data = base64.b64decode(data.get('pb', ''))
+            dm_v2 = dm_pb2.InteractWordV2()
+            dm_v2.ParseFromString(pb_data)
+
+            msg_text = INTERACT_MSG_TEXT.get(dm_v2.msg_type)
+            if msg_text:
+                self._log(f"Interact V2: {dm_v2.uname} {msg_text}")
+                self._emit({
+                    'type': 'interact',
+                    'uid': dm_v2.uid,
+                    'uname': dm_v2.uname,
+                    'msg': msg_text
+                })
+        except Exception as e:
+            logger.error(f"Decode INTERACT_WORD_V2 error: {e}")
+
+    def _on_entry_effect(self, command):
+        # 进场特效
+        data = command.get('data', {})
+        # print(data)
+        copy_writing = data.get('copy_writing')
+        if copy_writing:
+            self._log(f"Entry Effect: {copy_writing}")
+            msg = copy_writing.replace('<%', '').replace('%>', '')
+            self._emit({
+                'type': 'interact',
+                'uid': data.get('uid'),
+                'uname': '', # 名字在 msg 里
+                'msg': msg
+            })
+
+    def _on_send_gift(self, command):
+        # 送礼
+        data = command.get('data', {})
+        # print(data)
+        gift_name = data.get('giftName') or data.get('gift_name')
+        self._log(f"Gift: {data.get('uname')} sent {gift_name}")
+        self._emit({
+            'type': 'gift',
+            'uid': data.get('uid'),
+            'uname': data.get('uname'),
+            'face': data.get('face'),
+            'gift_name': gift_name,
+            'num': data.get('num'),
+            'action': data.get('action') or '投喂'
+        })
+
+    def _on_combo_send(self, command):
+        # 连击送礼
+        data = command.get('data', {})
+        gift_name = data.get('gift_name') or data.get('giftName')
+        self._log(f"Combo Gift: {data.get('uname')} sent {gift_name} x {data.get('combo_num')}")
+        self._emit({
+            'type': 'gift',
+            'uid': data.get('uid'),
+            'uname': data.get('uname'),
+            'face': '',
+            'gift_name': gift_name,
+            'num': data.get('combo_num'),
+            'action': data.get('action') or '投喂'
+        })
@@ -1,67 +1,76 @@
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from backend import util
+from backend.partition_catalog import PartitionStore
 
 logger = logging.getLogger("LiveService")
 
 class LiveService:
-    def __init__(self, api_client, config_manager, session_state):
+    def __init__(self, api_client, config_manager, session_state, partitions=None):
+        """
+        :param partitions: 可选的 PartitionStore (带磁盘缓存，多账户会话共用)，未传入时只在内存中缓存
+        """
         self.api = api_client
         self.config_manager = config_manager
         self.state = session_state
-        self.partition_map = {}
+        self.partitions = partitions or PartitionStore(api_client)
+        self.last_start_timings = {}  # 最近一次开播各阶段耗时 (毫秒)
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="LiveService")  # 并发请求
+
+    @property
+    def catalog(self):
+        return self.partitions.get()
 
     def _refresh_partitions_internal(self):
         logger.debug("Refreshing partitions...")
-        success, res = self.api.get_area_list()
-        if success and res.get('code') == 0:
-            self.partition_map = {}
-            for p in res['data']:
-                p_name = p['name']
-                self.partition_map[p_name] = {}
-                for s in p['list']: self.partition_map[p_name][s['name']] = s['id']
-            
+        if self.partitions.refresh(force=True):
             # 刷新后，尝试恢复当前用户的 last_area_id
-            uid = self.config_manager.data.get("current_uid")
-            if uid:
-                uid = str(uid)
-                if uid in self.config_manager.data["users"]:
-                    last_aid = self.config_manager.data["users"][uid].get("last_area_id")
-                    if last_aid: self.state.current_area_id = last_aid
-        else:
-            logger.error(f"Failed to refresh partitions: {res}")
+            user = self._get_user()
+            if user is not None:
+                last_aid = user.get("last_area_id")
+                if last_aid: self.state.current_area_id = last_aid
+
+    def _resolve_area_id(self, p_name, s_name):
+        """分区名 -> area_id；本地目录中没有时才同步请求最新列表"""
+        aid = self.catalog.get_id(p_name, s_name)
+        if not aid:
+            self._refresh_partitions_internal()
+            aid = self.partitions.catalog.get_id(p_name, s_name)
+        return aid
 
     def _get_names_by_id(self, area_id):
         """根据 area_id 反查分区名称 [parent_name, sub_name]"""
-        if not self.partition_map:
-            self._refresh_partitions_internal()
-        
-        target_id = str(area_id)
-        for p_name, sub_map in self.partition_map.items():
-            for s_name, aid in sub_map.items():
-                if str(aid) == target_id:
-                    return [p_name, s_name]
-        return []
+        return self.catalog.get_names(area_id)
 
     # --- API Methods ---
     def get_partitions(self):
-        if not self.partition_map: self._refresh_partitions_internal()
-        data = {p: list(s.keys()) for p, s in self.partition_map.items()}
-        return {"code": 0, "data": data}
+        return self.catalog.response
+
+    def search_partitions(self, keyword, limit=20):
+        """按名称或拼音搜索分区，供前端输入时调用"""
+        return {"code": 0, "data": self.catalog.search(keyword, int(limit))}
+
+    def _get_user(self):
+        """本会话账户的已保存数据"""
+        return self.config_manager.get_user(str(self.state.uid)) if self.state.uid else None
 
     def _save_current_user_fields(self, fields):
-        uid = self.config_manager.data.get("current_uid")
-        if uid:
-            uid = str(uid)
-            if uid in self.config_manager.data["users"]:
-                self.config_manager.data["users"][uid].update(fields)
-                self.config_manager.save()
+        if self.state.uid:
+            self.config_manager.update_user(str(self.state.uid), fields)
 
     def sync_room_profile(self):
         if not self.state.room_id or not self.state.uid:
             return {"code": -1, "msg": "请先登录"}
 
         data = {}
-        success, res = self.api.get_room_info(self.state.room_id)
+        # 用户主动同步，跳过缓存
+        self.api.invalidate_cache("room_info", "room_news")
+        # 两个请求互不依赖，并发执行
+        info_future = self.executor.submit(self.api.get_room_info, self.state.room_id)
+        news_future = self.executor.submit(self.api.get_room_news, self.state.room_id, self.state.uid)
+
+        success, res = info_future.result()
         if success and res.get('code') == 0:
             room = res.get('data', {})
             area_id = room.get('area_id') or room.get('area_v2_id')
@@ -79,7 +88,7 @@ class LiveService:
         else:
             logger.warning(f"Sync room info failed: {res}")
 
-        success, res = self.api.get_room_news(self.state.room_id, self.state.uid)
+        success, res = news_future.result()
         if success and res.get('code') == 0:
             news = res.get('data') or {}
             data["last_announcement"] = news.get('content', '') if isinstance(news, dict) else ''
@@ -92,20 +101,15 @@ class LiveService:
         self._save_current_user_fields(data)
         return {"code": 0, "data": data}
 
-    def update_title(self, title):
-        logger.info(f"Updating title to: {title}")
-        if not self.config_manager.data.get("current_uid"): return {"code": -1, "msg": "未登录"}
+    # 以下 _apply_* 只发送请求，返回 (结果, 需要保存的字段)，由调用方统一保存
+    def _apply_title(self, title):
         success, res = self.api.update_title(self.state.room_id, title, self.state.csrf)
         if success and res['code'] == 0:
-            self._save_current_user_fields({"last_title": title})
-            return {"code": 0}
+            return {"code": 0}, {"last_title": title}
         logger.error(f"Update title failed: {res}")
-        return {"code": -1, "msg": res.get('msg')}
+        return {"code": -1, "msg": res.get('msg')}, {}
 
-    def update_announcement(self, announcement):
-        logger.info("Updating announcement...")
-        if not self.config_manager.data.get("current_uid"):
-            return {"code": -1, "msg": "未登录"}
+    def _apply_announcement(self, announcement):
         success, res = self.api.update_announcement(
             self.state.room_id,
             self.state.uid,
@@ -113,47 +117,104 @@ class LiveService:
             self.state.csrf
         )
         if success and res['code'] == 0:
-            self._save_current_user_fields({"last_announcement": announcement})
-            return {"code": 0}
+            return {"code": 0}, {"last_announcement": announcement}
         logger.error(f"Update announcement failed: {res}")
-        return {"code": -1, "msg": res.get('msg')}
+        return {"code": -1, "msg": res.get('msg')}, {}
 
-    def update_area(self, p_name, s_name):
-        logger.info(f"Updating area to: {p_name} - {s_name}")
-        if not self.config_manager.data.get("current_uid"): return {"code": -1, "msg": "未登录"}
-        if not self.partition_map: self._refresh_partitions_internal()
-        aid = self.partition_map.get(p_name, {}).get(s_name)
+    def _apply_area(self, p_name, s_name):
+        aid = self._resolve_area_id(p_name, s_name)
         if not aid:
             logger.warning(f"Invalid area: {p_name} - {s_name}")
-            return {"code": -1, "msg": "无效分区"}
+            return {"code": -1, "msg": "无效分区"}, {}
         success, res = self.api.update_area(self.state.room_id, aid, self.state.csrf)
         if success and res['code'] == 0:
             self.state.current_area_id = aid
             self.state.current_area_names = [p_name, s_name]
-            uid = self.config_manager.data.get("current_uid")
-            if uid:
-                uid = str(uid)
-                if uid in self.config_manager.data["users"]:
-                    self.config_manager.data["users"][uid]["last_area_id"] = aid
-                    self.config_manager.data["users"][uid]["last_area_name"] = [p_name, s_name]
-                    self.config_manager.save()
-            return {"code": 0}
+            return {"code": 0}, {"last_area_id": aid, "last_area_name": [p_name, s_name]}
         logger.error(f"Update area failed: {res}")
-        return {"code": -1, "msg": res.get('msg')}
+        return {"code": -1, "msg": res.get('msg')}, {}
+
+    def update_title(self, title):
+        logger.info(f"Updating title to: {title}")
+        if not self.state.uid: return {"code": -1, "msg": "未登录"}
+        result, fields = self._apply_title(title)
+        if fields: self._save_current_user_fields(fields)
+        return result
+
+    def update_announcement(self, announcement):
+        logger.info("Updating announcement...")
+        if not self.state.uid:
+            return {"code": -1, "msg": "未登录"}
+        result, fields = self._apply_announcement(announcement)
+        if fields: self._save_current_user_fields(fields)
+        return result
+
+    def update_area(self, p_name, s_name):
+        logger.info(f"Updating area to: {p_name} - {s_name}")
+        if not self.state.uid: return {"code": -1, "msg": "未登录"}
+        result, fields = self._apply_area(p_name, s_name)
+        if fields: self._save_current_user_fields(fields)
+        return result
+
+    def apply_room_profile(self, title=None, area=None, announcement=None):
+        """
+        批量更新直播间信息：只发送与已保存值不同的字段，互不依赖的请求并发执行，最后统一保存一次
+        :param area: [父分区名, 子分区名]
+        :return: data 中按字段 (title / area / announcement) 返回各自结果，未变化的字段标记 skipped
+        """
+        logger.info("Applying room profile...")
+        if not self.state.uid: return {"code": -1, "msg": "未登录"}
+        user = self._get_user() or {}
+
+        tasks = {}
+        results = {}
+        if title is not None:
+            if title == user.get("last_title"):
+                results["title"] = {"code": 0, "skipped": True}
+            elif not title:
+                results["title"] = {"code": -1, "msg": "标题不能为空"}
+            else:
+                tasks["title"] = (self._apply_title, title)
+        if area:
+            if not (isinstance(area, (list, tuple)) and len(area) == 2
+                    and all(isinstance(name, str) and name for name in area)):
+                results["area"] = {"code": -1, "msg": "无效分区"}
+            elif list(area) == list(user.get("last_area_name") or []):
+                results["area"] = {"code": 0, "skipped": True}
+            else:
+                tasks["area"] = (self._apply_area, *area)
+        if announcement is not None:
+            if announcement == user.get("last_announcement"):
+                results["announcement"] = {"code": 0, "skipped": True}
+            else:
+                tasks["announcement"] = (self._apply_announcement, announcement)
+
+        futures = {key: self.executor.submit(*task) for key, task in tasks.items()}
+        fields = {}
+        for key, future in futures.items():
+            results[key], changed = future.result()
+            fields.update(changed)
+        if fields:
+            self._save_current_user_fields(fields)
+
+        code = 0 if all(r["code"] == 0 for r in results.values()) else -1
+        return {"code": code, "data": results}
+
+    def prepare_start_live(self):
+        """打开推流面板时调用：预热连接、时间偏移、版本信息和分区目录"""
+        self.partitions.prefetch()
+        self.api.prepare_start_live()
 
     def start_live(self, p_name=None, s_name=None):
         logger.info("Starting live stream...")
         if not self.state.room_id: return {"code": -1, "msg": "请先登录"}
+        start = time.perf_counter()
+        timings = {}
 
         # 如果前端传了分区名，先更新内存中的 ID
         if p_name and s_name:
-            if not self.partition_map: self._refresh_partitions_internal()
-            aid = self.partition_map.get(p_name, {}).get(s_name)
-            
-            # 如果没找到，尝试强制刷新一次
-            if not aid:
-                self._refresh_partitions_internal()
-                aid = self.partition_map.get(p_name, {}).get(s_name)
+            # 本地目录中没找到时，强制刷新一次
+            aid = self._resolve_area_id(p_name, s_name)
             
             if aid:
                 self.state.current_area_id = aid
@@ -163,18 +224,18 @@ class LiveService:
                 return {"code": -1, "msg": f"无法识别分区: {p_name}-{s_name}"}
 
         if not self.state.current_area_id:
-            uid = self.config_manager.data.get("current_uid")
-            if uid:
-                uid = str(uid)
-                if uid in self.config_manager.data["users"]:
-                    self.state.current_area_id = self.config_manager.data["users"][uid].get("last_area_id", "235")
-                    # 尝试恢复 names，保持一致性
-                    self.state.current_area_names = self.config_manager.data["users"][uid].get("last_area_name", [])
-                else:
-                    self.state.current_area_id = "235"
+            user = self._get_user()
+            if user is not None:
+                self.state.current_area_id = user.get("last_area_id", "235")
+                # 尝试恢复 names，保持一致性
+                self.state.current_area_names = user.get("last_area_name", [])
             else: self.state.current_area_id = "235"
 
-        success, res = self.api.start_live(self.state.room_id, self.state.current_area_id, self.state.csrf)
+        timings["area"] = round((time.perf_counter() - start) * 1000, 1)
+        success, res = self.api.start_live(self.state.room_id, self.state.current_area_id, self.state.csrf, timings)
+        timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+        self.last_start_timings = timings
+        logger.info("Start live timings (ms): " + ", ".join(f"{k}={v}" for k, v in timings.items()))
         if success:
             if res['code'] == 0:
                 logger.info("Live stream started successfully.")
@@ -186,13 +247,8 @@ class LiveService:
                     if found_names:
                         self.state.current_area_names = found_names
 
-                uid = self.config_manager.data.get("current_uid")
-                if uid:
-                    uid = str(uid)
-                    if uid in self.config_manager.data["users"]:
-                        self.config_manager.data["users"][uid]["last_area_id"] = self.state.current_area_id
-                        self.config_manager.data["users"][uid]["last_area_name"] = self.state.current_area_names
-                        self.config_manager.save()
+                self._save_current_user_fields({"last_area_id": self.state.current_area_id,
+                                                "last_area_name": self.state.current_area_names})
                 
                 # 提取推流码逻辑
                 rtmp_data = res['data'].get('rtmp', {})
@@ -229,7 +285,8 @@ class LiveService:
                     "data": {
                         "rtmp1": {"addr": rtmp_addr, "code": rtmp_code},
                         "rtmp2": {"addr": rtmp2_addr, "code": rtmp2_code},
-                        "srt": {"addr": srt_addr, "code": srt_code}
+                        "srt": {"addr": srt_addr, "code": srt_code},
+                        "timings": timings
                     }
                 }
             elif res['code'] == 60024:
@@ -1,20 +1,27 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from backend import util
+from backend.bilibili_api import BilibiliApi
 
 logger = logging.getLogger("UserService")
 
 class UserService:
+    REFRESH_WORKERS = 6  # 刷新全部账户时的并发请求数
+    EXPIRED_CODE = -101  # 账号未登录 (cookie 失效)
+
     def __init__(self, api_client, config_manager, session_state):
         self.api = api_client
         self.config_manager = config_manager
         self.state = session_state
 
     def init_current_user(self):
-        uid = self.config_manager.data.get("current_uid")
-        users = self.config_manager.data.get("users", {})
-        if uid and uid in users:
+        self.init_user(self.config_manager.data.get("current_uid"))
+
+    def init_user(self, uid):
+        """用已保存的账户数据初始化本会话的 cookies 和状态 (不发起网络请求)"""
+        user = self.config_manager.get_user(uid)
+        if user is not None:
             self.state.clear()
-            user = users[uid]
             masked_uid = util.mask_string(str(uid))
             logger.info(f"Init user: {user.get('uname')} ({masked_uid})")
             self.api.update_cookies(util.ck_str_to_dict(user.get("cookie", "")))
@@ -32,46 +39,65 @@ class UserService:
         masked_uid = util.mask_string(uid)
         logger.info(f"Saving user data for uid: {masked_uid}")
         
-        config_data = self.config_manager.data
-        if "users" not in config_data: config_data["users"] = {}
-        old_data = config_data["users"].get(uid, {})
+        new_data = self._build_user_data(uid, full_data, cookie_str, room_id, csrf,
+                                         self.config_manager.get_user(uid) or {})
+        self.config_manager.set("current_uid", uid)
+        self.config_manager.set_user(uid, new_data)
+        
+        self.state.uid = int(uid)
+        self.state.room_id = str(room_id)
+        self.state.csrf = csrf
+        self.state.current_area_id = new_data["last_area_id"]
+        self.state.current_area_names = new_data["last_area_name"]
+        return new_data
+
+    @staticmethod
+    def _profile_fields(full_data):
+        """由 nav / nav/stat 响应得到的账户资料字段"""
         level_info = full_data.get("level_info", {})
         wallet = full_data.get("wallet", {})
         stat = full_data.get("stat", {})
-        new_data = {
-            "uid": uid, "uname": full_data.get("uname", "未知用户"), "face": full_data.get("face", ""),
-            "cookie": cookie_str, "roomId": str(room_id), "csrf": csrf,
+        return {
+            "uname": full_data.get("uname", "未知用户"), "face": full_data.get("face", ""),
             "level": level_info.get("current_level", 0), "current_exp": level_info.get("current_exp", 0),
             "next_exp": level_info.get("next_exp", 0), "money": full_data.get("money", 0),
             "bcoin": wallet.get("bcoin_balance", 0), "following": stat.get("following", 0),
             "follower": stat.get("follower", 0), "dynamic_count": stat.get("dynamic_count", 0),
+        }
+
+    @classmethod
+    def _build_user_data(cls, uid, full_data, cookie_str, room_id, csrf, old_data):
+        new_data = {"uid": uid, "cookie": cookie_str, "roomId": str(room_id), "csrf": csrf}
+        new_data.update(cls._profile_fields(full_data))
+        new_data.update({
             "last_title": old_data.get("last_title", ""), "last_area_id": old_data.get("last_area_id", ""),
             "last_area_name": old_data.get("last_area_name", []),
             "last_announcement": old_data.get("last_announcement", "")
-        }
-        config_data["users"][uid] = new_data
-        config_data["current_uid"] = uid
-        self.config_manager.save()
-        
-        self.state.uid = int(uid)
-        self.state.room_id = str(room_id)
-        self.state.csrf = csrf
-        self.state.current_area_id = new_data["last_area_id"]
-        self.state.current_area_names = new_data["last_area_name"]
+        })
         return new_data
 
-    def fetch_full_user_data(self):
-        logger.debug("Fetching full user data...")
-        s1, nav = self.api.get_user_info()
+    @staticmethod
+    def _merge_user_data(nav, stat):
+        """合并 nav 与 nav/stat 的响应"""
+        s1, nav = nav
         if not s1 or nav.get('code') != 0:
             logger.warning(f"Failed to fetch user info: {nav}")
             return False, nav
-        s2, stat = self.api.get_user_stat()
+        s2, stat = stat
         stat_data = stat.get('data', {}) if s2 and stat.get('code') == 0 else {}
-        full = nav['data']
+        # nav 响应可能来自缓存，复制后再修改
+        full = dict(nav['data'])
         full['stat'] = stat_data
         return True, full
 
+    def fetch_full_user_data(self):
+        logger.debug("Fetching full user data...")
+        s1, nav = self.api.get_user_info()
+        if not s1 or nav.get('code') != 0:
+            logger.warning(f"Failed to fetch user info: {nav}")
+            return False, nav
+        return self._merge_user_data((s1, nav), self.api.get_user_stat())
+
     def fetch_room_id(self, cookies_dict):
         uid = cookies_dict.get("DedeUserID")
         masked_uid = util.mask_string(str(uid)) if uid else "None"
@@ -91,53 +117,118 @@ class UserService:
 
     # --- API Methods ---
     def load_saved_config(self):
-        uid = self.config_manager.data.get("current_uid")
-        users = self.config_manager.data.get("users", {})
-        if uid and uid in users: return {"code": 0, "data": users[uid]}
+        user = self.config_manager.get_current_user()
+        if user is not None: return {"code": 0, "data": user}
         return {"code": 0, "data": {}}
 
     def refresh_current_user(self):
         logger.info("Refreshing current user...")
-        uid = self.config_manager.data.get("current_uid")
-        if not uid or uid not in self.config_manager.data.get("users", {}):
+        uid = str(self.state.uid) if self.state.uid else None
+        if not self.config_manager.has_user(uid):
             logger.warning("Refresh failed: No user logged in.")
             return {"code": -1, "msg": "未登录"}
 
+        user = self.config_manager.get_user(uid)
+        if user is None:
+            return {"code": -1, "msg": "账户数据读取失败"}
+
+        # 用户主动刷新，跳过缓存
+        self.api.invalidate_cache("user_info", "user_stat")
         ok, full_data = self.fetch_full_user_data()
         if ok:
-            user = self.config_manager.data["users"][uid]
             saved_user = self.save_user_data(uid, full_data, user['cookie'], user['roomId'], user['csrf'])
             return {"code": 0, "data": saved_user}
         return {"code": -1, "msg": "刷新失败"}
 
+    def refresh_all_accounts(self, on_result=None):
+        """
+        并发刷新所有已保存账户的信息 (每个账户使用自己的 cookie)，最后统一保存一次
+        只合并刷新得到的资料字段，刷新期间对账户做的其他修改 (标题、分区等) 不会被覆盖
+        :param on_result: 每个账户完成时回调 on_result(item)，用于推送到前端
+        :return: item 列表，item 为 {"uid", "code", "expired", "data"/"msg"}，data 为更新的字段
+        """
+        users = {u["uid"]: self.config_manager.get_user(u["uid"]) for u in self.config_manager.list_users()}
+        users = {uid: user for uid, user in users.items() if user}
+        logger.info(f"Refreshing {len(users)} accounts...")
+        clients = {}
+        futures = {}
+        pending = {}  # uid -> 尚未完成的请求数
+        results = {}  # uid -> {"nav": ..., "stat": ...}
+        items = []
+        updated = {}
+
+        with ThreadPoolExecutor(max_workers=self.REFRESH_WORKERS, thread_name_prefix="AccountRefresh") as pool:
+            for uid, user in users.items():
+                api = clients[uid] = BilibiliApi()
+                api.update_cookies(util.ck_str_to_dict(user.get("cookie", "")))
+                futures[pool.submit(api.get_user_info)] = (uid, "nav")
+                futures[pool.submit(api.get_user_stat)] = (uid, "stat")
+                pending[uid] = 2
+
+            for future in as_completed(futures):
+                uid, kind = futures[future]
+                try:
+                    res = future.result()
+                except Exception as e:
+                    res = (False, {"code": -1, "msg": str(e)})
+                results.setdefault(uid, {})[kind] = res
+                pending[uid] -= 1
+                if pending[uid]:
+                    continue
+
+                # 该账户的两个请求都已完成
+                clients.pop(uid).close()
+                nav = results[uid]["nav"]
+                expired = nav[1].get('code') == self.EXPIRED_CODE
+                ok, full_data = self._merge_user_data(nav, results[uid]["stat"])
+                if ok:
+                    fields = dict(self._profile_fields(full_data), cookie_expired=False)
+                    updated[uid] = fields
+                    item = {"uid": uid, "code": 0, "expired": False, "data": fields}
+                else:
+                    if expired:
+                        updated[uid] = {"cookie_expired": True}
+                    item = {"uid": uid, "code": -1, "expired": expired,
+                            "msg": "登录已失效" if expired else full_data.get("msg") or full_data.get("message", "刷新失败")}
+                items.append(item)
+                if on_result:
+                    try:
+                        on_result(item)
+                    except Exception as e:
+                        logger.warning(f"Account refresh callback failed: {e}")
+
+        if updated:
+            self.config_manager.update_users(updated)
+        expired_count = sum(1 for item in items if item["expired"])
+        logger.info(f"Accounts refreshed: {len(updated) - expired_count} ok, {expired_count} expired, "
+                    f"{len(items) - len(updated)} failed")
+        return items
+
     def get_account_list(self):
-        users = self.config_manager.data.get("users", {})
-        lst = [v for k, v in users.items()]
+        # 只返回索引中的摘要，不加载各账户文件
+        lst = self.config_manager.list_users()
         return {"code": 0, "data": {"list": lst, "current_uid": self.config_manager.data.get("current_uid")}}
 
     def switch_account(self, uid):
         masked_uid = util.mask_string(str(uid))
         logger.info(f"Switching account to: {masked_uid}")
-        users = self.config_manager.data.get("users", {})
-        if uid in users:
-            self.config_manager.data["current_uid"] = uid
-            self.config_manager.save()
-            self.init_current_user()
-            return {"code": 0, "data": users[uid]}
+        if self.config_manager.has_user(uid):
+            user = self.config_manager.get_user(uid)
+            if user is None:
+                return {"code": -1, "msg": "账户数据读取失败"}
+            # 只记录当前账户，各账户的会话由 SessionRegistry 管理
+            self.config_manager.set("current_uid", uid)
+            return {"code": 0, "data": user}
         logger.warning(f"Switch account failed: User {masked_uid} not found.")
         return {"code": -1, "msg": "账户不存在"}
 
     def logout(self, uid):
         masked_uid = util.mask_string(str(uid))
         logger.info(f"Logging out user: {masked_uid}")
-        users = self.config_manager.data.get("users", {})
-        if uid in users:
-            del users[uid]
+        if self.config_manager.has_user(uid):
             if self.config_manager.data.get("current_uid") == uid:
-                self.config_manager.data["current_uid"] = None
-                self.state.clear()
-                self.api.update_cookies({})
-            self.config_manager.save()
+                self.config_manager.set("current_uid", None)
+            self.config_manager.remove_user(uid)
             return {"code": 0}
         logger.warning(f"Logout failed: User {masked_uid} not found.")
         return {"code": -1, "msg": "账户不存在"}
@@ -0,0 +1,189 @@
+"""
+说明：多账户会话注册表
+
+每个账户一个 AccountSession，拥有独立的 API 客户端 (cookies 与连接池)、会话状态、业务服务和弹幕连接。
+切换前端的“当前账户”只是切换 active 指向，不产生网络请求，也不会断开其他账户的弹幕连接。
+未登录时使用 uid 为 None 的匿名会话。
+"""
+
+import asyncio
+import logging
+import threading
+
+from backend import util
+from backend.async_bilibili_api import AsyncBilibiliApi
+from backend.bilibili_api import BilibiliApi
+from backend.danmu_decoder import DECODE_INLINE
+from backend.partition_catalog import PartitionStore
+from backend.services.danmu_hub import DanmuHub
+from backend.services.danmu_service import DanmuService
+from backend.services.live_service import LiveService
+from backend.services.user_service import UserService
+from backend.state import SessionState
+
+logger = logging.getLogger("SessionRegistry")
+
+
+class AccountSession:
+    def __init__(self, uid, config_manager, partitions=None, decode_mode=DECODE_INLINE):
+        self.uid = uid
+        self.api = BilibiliApi()
+        # 弹幕事件循环内使用的异步客户端，与 api 共用 cookies
+        self.async_api = AsyncBilibiliApi(self.api)
+        self.state = SessionState()
+        self.user_service = UserService(self.api, config_manager, self.state)
+        self.live_service = LiveService(self.api, config_manager, self.state, partitions=partitions)
+        self.danmu_service = DanmuService(self.api, self.state, decode_mode, async_api=self.async_api)
+        # 额外监听的直播间 (房管、连麦主播等)
+        self.danmu_hub = DanmuHub(self.api, self.state, decode_mode, async_api=self.async_api)
+
+    def set_callback(self, callback):
+        self.danmu_service.set_callback(callback)
+        self.danmu_hub.set_callback(callback)
+
+    def set_decode_mode(self, mode):
+        self.danmu_service.set_decode_mode(mode)
+        self.danmu_hub.set_decode_mode(mode)
+
+    async def stop_danmu(self):
+        await self.danmu_service.stop()
+        await self.danmu_hub.stop()
+
+    async def close(self):
+        """停止弹幕并释放连接"""
+        await self.stop_danmu()
+        await self.async_api.close()
+        self.release()
+
+    def release(self):
+        """释放同步资源：HTTP 连接池与 LiveService 的线程池"""
+        self.api.close()
+        self.live_service.executor.shutdown(wait=False)
+
+
+class SessionRegistry:
+    def __init__(self, config_manager, loop, decode_mode=DECODE_INLINE, partition_cache_file=None):
+        """
+        :param loop: 弹幕事件循环，关闭会话时在其中执行
+        :param partition_cache_file: 分区目录的磁盘缓存文件
+        """
+        self.config_manager = config_manager
+        self.loop = loop
+        self.decode_mode = decode_mode
+        self.sessions = {}  # uid (str) 或 None (匿名) -> AccountSession
+        self.active = None
+        self.message_callback = None
+        self._lock = threading.Lock()
+        # 分区目录与账户无关，所有会话共用，使用不带 cookie 的独立客户端
+        self.partitions = PartitionStore(BilibiliApi(), partition_cache_file)
+
+    def set_callback(self, callback):
+        """弹幕消息回调，消息中的 account_uid 为来源账户"""
+        self.message_callback = callback
+        for session in self.sessions.values():
+            self._bind_callback(session)
+
+    def _bind_callback(self, session):
+        callback = self.message_callback
+        if callback is None:
+            session.set_callback(None)
+            return
+        uid = session.uid
+
+        def on_message(data):
+            data["account_uid"] = uid
+            callback(data)
+        session.set_callback(on_message)
+
+    def create(self, uid, cookies=None):
+        """
+        创建会话但不注册 (登录流程中使用，成功后再 add)
+        :param cookies: 传入时直接使用，否则从已保存的账户数据初始化
+        """
+        session = AccountSession(uid, self.config_manager, self.partitions, self.decode_mode)
+        if cookies is not None:
+            session.api.update_cookies(cookies)
+        elif uid is not None:
+            session.user_service.init_user(uid)
+        self._bind_callback(session)
+        return session
+
+    def add(self, session):
+        """注册会话，替换同一账户的旧会话 (旧会话的连接会被关闭)"""
+        with self._lock:
+            old = self.sessions.get(session.uid)
+            self.sessions[session.uid] = session
+            if self.active is old:
+                self.active = session
+        if old is not None and old is not session:
+            self._close_session(old)
+        return session
+
+    def get(self, uid):
+        """返回账户的会话，不存在时创建 (只读取本地保存的数据，不发起网络请求)"""
+        uid = str(uid) if uid is not None else None
+        with self._lock:
+            session = self.sessions.get(uid)
+        if session is not None:
+            return session
+        # create 会读取账户文件，不在锁内执行
+        created = self.create(uid)
+        with self._lock:
+            session = self.sessions.setdefault(uid, created)
+            count = len(self.sessions)
+        if session is not created:
+            # 其他线程已创建同一账户的会话
+            created.release()
+        else:
+            logger.info(f"Session opened: {util.mask_string(uid) if uid else 'anonymous'} ({count} sessions)")
+        return session
+
+    def activate(self, uid):
+        """切换当前账户，其他账户的连接保持运行"""
+        session = self.get(uid if self.config_manager.has_user(uid) else None)
+        with self._lock:
+            self.active = session
+        return session
+
+    def _close_session(self, session):
+        if self.loop is not None and self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(session.close(), self.loop)
+        else:
+            session.release()
+
+    def close(self, uid):
+        """关闭账户的会话 (登出时调用)，当前账户被关闭时切换到匿名会话"""
+        uid = str(uid) if uid is not None else None
+        with self._lock:
+            session = self.sessions.pop(uid, None)
+        if session is None:
+            return False
+        self._close_session(session)
+        if self.active is session:
+            self.activate(None)
+        logger.info(f"Session closed: {util.mask_string(uid) if uid else 'anonymous'}")
+        return True
+
+    def set_decode_mode(self, mode):
+        self.decode_mode = mode
+        for session in self.sessions.values():
+            session.set_decode_mode(mode)
+
+    def invalidate_cache(self, uids, *endpoints):
+        """账户资料在会话外被更新时调用，丢弃这些账户已有会话中缓存的旧响应 (不创建新会话)"""
+        with self._lock:
+            sessions = [self.sessions[str(uid)] for uid in uids if str(uid) in self.sessions]
+        for session in sessions:
+            session.api.invalidate_cache(*endpoints)
+
+    def all(self):
+        return list(self.sessions.values())
+
+    def get_sessions(self):
+        """各会话的概况，供前端展示"""
+        return [
+            {"uid": session.uid, "active": session is self.active, "room_id": session.state.room_id,
+             "is_live": session.state.is_live, "danmu_running": session.danmu_service.running,
+             "watched_rooms": len(session.danmu_hub.rooms)}
+            for session in self.sessions.values()
+        ]
@@ -1,6 +1,12 @@
+import os
 import re
+import ssl
 from urllib.parse import unquote
 
+import certifi
+
+_ssl_context = None
+
 def ck_str_to_dict(ck_str: str) -> dict:
     cookies_pattern = re.compile(r'(\w+)=([^;]+)(?:;|$)')
     return {key: unquote(value) for key, value in cookies_pattern.findall(ck_str)}
@@ -15,3 +21,22 @@ def mask_string(s: str, visible_start=2, visible_end=2) -> str:
     if len(s) <= visible_start + visible_end:
         return "*" * len(s)
     return s[:visible_start] + "*" * 5 + s[-visible_end:]
+
+
+def get_ssl_context():
+    """进程内共享的 SSL 上下文，避免每次连接重新加载 CA"""
+    global _ssl_context
+    if _ssl_context is None:
+        # PyInstaller 打包后默认 CA 路径可能来自构建机，使用 certifi 保证 WSS 校验一致。
+        _ssl_context = ssl.create_default_context(cafile=certifi.where())
+    return _ssl_context
+
+
+def atomic_write_text(path, text):
+    """原子写入：先写临时文件并 fsync，再 rename 覆盖，中途崩溃不会留下写了一半的文件"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
@@ -0,0 +1,187 @@
+"""
+说明：性能基准测试 (不属于单元测试，部分基准会访问网络)
+
+用法：python bench.py <名称> [<名称> ...]，不带参数时列出可用的基准
+"""
+
+import asyncio
+import sys
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """注册基准测试"""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+# --- 弹幕解码：对比各模式下事件循环的调度延迟 ---
+def _make_decoder_frame(sub_packets=500):
+    import brotli
+    from backend import danmu_codec
+    body = b"".join(
+        danmu_codec.pack_packet(
+            danmu_codec.OP_MESSAGE,
+            ('{"cmd":"DANMU_MSG","info":[[0],"%d",[%d,"user%d"]]}' % (i, i, i)).encode(),
+            danmu_codec.PROTO_JSON)
+        for i in range(sub_packets)
+    )
+    return danmu_codec.pack_packet(danmu_codec.OP_MESSAGE, brotli.compress(body), danmu_codec.PROTO_BROTLI)
+
+
+async def _bench_decode_mode(mode, frame, frames, interval, tick=0.001):
+    from backend.danmu_decoder import DanmuDecoder
+    decoder = DanmuDecoder(mode)
+    lags = []
+    stop = False
+
+    async def ticker():
+        loop = asyncio.get_running_loop()
+        while not stop:
+            t = loop.time()
+            await asyncio.sleep(tick)
+            lags.append(loop.time() - t - tick)
+
+    task = asyncio.create_task(ticker())
+    # 预热工作器，避免把进程启动时间计入
+    res = decoder.submit(frame)
+    if asyncio.isfuture(res):
+        await res
+    await asyncio.sleep(tick * 10)
+    lags.clear()
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    # 不保留已完成的结果，避免大量存活对象触发 GC 干扰测量
+    pending = set()
+    for _ in range(frames):
+        res = decoder.submit(frame)
+        if asyncio.isfuture(res):
+            pending.add(res)
+            res.add_done_callback(pending.discard)
+        # 模拟帧间隔到达
+        await asyncio.sleep(interval)
+    if pending:
+        await asyncio.wait(pending)
+    elapsed = loop.time() - start
+    stop = True
+    await task
+    decoder.close()
+
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0
+    print(f"{mode:<8} total={elapsed * 1000:8.1f}ms  "
+          f"loop lag max={max(lags, default=0) * 1000:6.2f}ms p99={p99 * 1000:6.2f}ms")
+
+
+@benchmark("decoder")
+def bench_decoder(frames=200, sub_packets=500, interval=0.02):
+    from backend.danmu_decoder import DECODE_MODES
+    frame = _make_decoder_frame(sub_packets)
+    print(f"{frames} frames x {sub_packets} sub-packets ({len(frame)} bytes/frame), "
+          f"interval {interval * 1000:.0f}ms")
+    for mode in DECODE_MODES:
+        asyncio.run(_bench_decode_mode(mode, frame, frames, interval))
+
+
+# --- HTTP：开播前置请求在冷/热连接下的耗时 (需要网络) ---
+@benchmark("http")
+def bench_http(rounds=5):
+    import time
+    from backend.bilibili_api import BilibiliApi
+
+    def start_live_prelude(api):
+        # start_live 的前两步 (无需登录)；第三步 startLive 需要登录，这里不发送
+        start = time.perf_counter()
+        _, t_resp = api._req("GET", "https://api.bilibili.com/x/report/click/now")
+        ts = (t_resp.get("data") or {}).get("now", int(time.time()))
+        api._req("GET", "https://api.live.bilibili.com/xlive/app-blink/v1/liveVersionInfo/getHomePageLiveVersion",
+                 params=api._appsign({"system_version": 2, "ts": ts}))
+        return (time.perf_counter() - start) * 1000
+
+    cold = []
+    for _ in range(rounds):
+        # 每轮新建 Session，相当于旧实现的逐请求建连
+        api = BilibiliApi()
+        cold.append(start_live_prelude(api))
+        api.close()
+
+    api = BilibiliApi()
+    api.warm_up()
+    warm = [start_live_prelude(api) for _ in range(rounds)]
+    api.close()
+
+    # 预热后的开播准备：时间来自本地偏移，版本来自缓存
+    api = BilibiliApi()
+    api.prepare_start_live()
+    prepared = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        api.server_time()
+        api.get_live_version()
+        prepared.append((time.perf_counter() - start) * 1000)
+    api.close()
+
+    print(f"cold:     avg={sum(cold) / rounds:7.1f}ms  min={min(cold):7.1f}ms")
+    print(f"warm:     avg={sum(warm) / rounds:7.1f}ms  min={min(warm):7.1f}ms")
+    print(f"prepared: avg={sum(prepared) / rounds:7.1f}ms  min={min(prepared):7.1f}ms")
+
+
+# --- 事件推送：逐条 dict JSON 与列式编码的字节数和序列化耗时 ---
+def _make_wire_events(count, users=50):
+    import random
+    rng = random.Random(0)
+    names = [f"用户{i}" for i in range(users)]
+    events = []
+    for i in range(count):
+        u = rng.randrange(users)
+        kind = rng.random()
+        if kind < 0.7:
+            event = {"type": "danmu", "uid": 10000 + u, "uname": names[u],
+                     "face": f"https://i0.hdslb.com/bfs/face/{u:040x}.jpg", "msg": f"弹幕内容 {i}"}
+        elif kind < 0.9:
+            event = {"type": "interact", "uid": 10000 + u, "uname": names[u], "msg": "进入直播间"}
+        else:
+            event = {"type": "gift", "uid": 10000 + u, "uname": names[u],
+                     "face": f"https://i0.hdslb.com/bfs/face/{u:040x}.jpg",
+                     "gift_name": "小心心", "num": 1, "action": "投喂"}
+        event["room_id"] = "12345"
+        event["account_uid"] = "67890"
+        events.append(event)
+    return events
+
+
+@benchmark("wire")
+def bench_wire(batch_sizes=(10, 20, 50, 200), rounds=500):
+    import json
+    import time
+    from backend.wire_format import decode_columnar, encode_columnar
+
+    def timed(func):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            payload = func()
+        return payload, (time.perf_counter() - start) / rounds * 1000
+
+    for size in batch_sizes:
+        events = _make_wire_events(size)
+        assert decode_columnar(encode_columnar(events)) == events
+        plain, plain_ms = timed(lambda: json.dumps(events))
+        compact, compact_ms = timed(lambda: json.dumps(encode_columnar(events)))
+        print(f"{size:>4} events  dict: {len(plain):>7} bytes {plain_ms:6.3f}ms  "
+              f"columnar: {len(compact):>7} bytes {compact_ms:6.3f}ms  "
+              f"({len(compact) / len(plain) * 100:.0f}% size)")
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:]
+    if not names:
+        print("Available benchmarks: " + ", ".join(BENCHMARKS))
+    for name in names:
+        if name not in BENCHMARKS:
+            sys.exit(f"Unknown benchmark: {name}")
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
@@ -1,6 +1,10 @@
-import { reactive } from 'vue';
+import { reactive, markRaw } from 'vue';
+import { expandColumnar } from '@/utils/columnar';
+import { RingBuffer } from '@/utils/ringBuffer';
 
-const state = reactive({ logs: [] });
+// 日志保存在环形缓冲区中 (不做深层响应式)，logsVersion 在每次写入后递增，由虚拟列表渲染
+const LOG_CAPACITY = 10000;
+const state = reactive({ logs: markRaw(new RingBuffer(LOG_CAPACITY)), logsVersion: 0 });
 
 const log = (msg) => {
   // 如果 msg 是对象，尝试转字符串，避免 [object Object]
@@ -12,13 +16,9 @@ const log = (msg) => {
     }
   }
   const time = new Date().toLocaleTimeString();
-  // 修改为 push，最新的在最下面
+  // 最新的在最下面，超出容量时覆盖最旧的
   state.logs.push(`[${time}] ${msg}`);
-
-  // 限制日志数量，防止内存溢出
-  if (state.logs.length > 500) {
-    state.logs.shift();
-  }
+  state.logsVersion++;
 };
 
 // 暴露给后端调用
@@ -26,6 +26,27 @@ window.onBackendLog = (msg) => {
   log(msg);
 };
 
+// 后端事件总线合并推送：[[函数名, [事件, ...] 或列式结构], ...]，逐个分发给对应的处理函数
+window.onEventBatch = (batch) => {
+  for (const [fn, events] of batch) {
+    const handler = window[fn];
+    if (!handler) continue;
+    for (const event of expandColumnar(events)) handler(event);
+  }
+};
+
+// 窗口从托盘恢复时，后端推送隐藏期间的快照：最近的事件 + 按类型的计数
+const SNAPSHOT_LABELS = { danmu: '弹幕', gift: '礼物', interact: '互动', system: '系统消息', log: '日志', account: '账户刷新' };
+window.onEventSnapshot = (snapshot) => {
+  window.onEventBatch(snapshot.batch || []);
+  const summary = Object.entries(snapshot.counts || {})
+    .map(([type, count]) => `${SNAPSHOT_LABELS[type] || type} ${count}`)
+    .join('，');
+  if (summary) {
+    log(`后台运行 ${Math.round((snapshot.hidden_ms || 0) / 1000)} 秒，期间收到: ${summary}`);
+  }
+};
+
 // 等待 pywebview 就绪的 Promise
 const waitPywebview = new Promise((resolve) => {
   if (window.pywebview) {
@@ -103,6 +124,11 @@ export const useBridge = () => {
       return res.code === 0 ? res.data : {};
     },
 
+    async searchPartitions(keyword, limit = 20) {
+      const res = await callPy('search_partitions', keyword, limit);
+      return res.code === 0 ? res.data : [];
+    },
+
     async syncRoomProfile() {
       log('正在同步直播信息...');
       const res = await callPy('sync_room_profile');
@@ -114,6 +140,16 @@ export const useBridge = () => {
       return { success: false, msg: res.msg };
     },
 
+    async applyRoomProfile(title, area, announcement) {
+      log('正在更新直播间信息...');
+      const res = await callPy('apply_room_profile', title ?? null, area ?? null, announcement ?? null);
+      for (const [field, r] of Object.entries(res.data || {})) {
+        if (r.code !== 0) log(`${field} 更新失败: ${r.msg}`);
+      }
+      if (res.code === 0) log('直播间信息已更新');
+      return { success: res.code === 0, msg: res.msg, results: res.data || {} };
+    },
+
     async updateSettings(type, val1, val2) {
       log(`正在更新${type}...`);
       let res;
@@ -134,6 +170,10 @@ export const useBridge = () => {
       }
     },
 
+    async prepareStartLive() {
+      await callPy('prepare_start_live');
+    },
+
     async toggleLive(isStarting, p_name, s_name) {
       if (isStarting) {
         log('正在获取推流码...');
@@ -168,6 +208,20 @@ export const useBridge = () => {
       return res.code === 0 ? res.data : { list: [], current_uid: null };
     },
 
+    async getSessions() {
+      const res = await callPy('get_sessions');
+      return res.code === 0 ? res.data : [];
+    },
+
+    async refreshAllAccounts() {
+      log('正在刷新全部账户...');
+      const res = await callPy('refresh_all_accounts');
+      const items = res.code === 0 ? res.data : [];
+      const expired = items.filter(item => item.expired).length;
+      log(`账户刷新完成: ${items.length} 个${expired ? `，${expired} 个登录已失效` : ''}`);
+      return items;
+    },
+
     async switchAccount(uid) {
       const res = await callPy('switch_account', uid);
       return res.code === 0 ? { success: true, data: res.data } : { success: false, msg: res.msg };
@@ -196,6 +250,18 @@ export const useBridge = () => {
       return await callPy('stop_danmu_monitor');
     },
 
+    // 多房间弹幕监听
+    async watchRoom(roomId) {
+      return await callPy('watch_room', roomId);
+    },
+    async unwatchRoom(roomId) {
+      return await callPy('unwatch_room', roomId);
+    },
+    async getWatchedRooms() {
+      const res = await callPy('get_watched_rooms');
+      return res.code === 0 ? res.data : [];
+    },
+
     // 发送弹幕
     async sendDanmu(msg) {
       const res = await callPy('send_danmu', msg);
@@ -0,0 +1,22 @@
+// 展开后端的列式编码 (backend/wire_format.py)：
+// { $columnar, n, fields, columns, strings, interned, masks? } -> [事件, ...]
+// 每列只包含带有该字段的事件的值；masks[row] 的第 f 位表示该事件带有 fields[f]，省略时所有事件字段相同
+export const expandColumnar = (data) => {
+  if (Array.isArray(data)) return data;
+  const { n, fields, columns, strings, interned, masks } = data;
+  const values = columns.slice();
+  for (const i of interned) {
+    values[i] = values[i].map((v) => (v === null ? null : strings[v]));
+  }
+  const cursors = new Array(fields.length).fill(0);
+  const events = new Array(n);
+  for (let row = 0; row < n; row++) {
+    const mask = masks ? masks[row] : -1;
+    const event = {};
+    for (let f = 0; f < fields.length; f++) {
+      if (mask & (1 << f)) event[fields[f]] = values[f][cursors[f]++];
+    }
+    events[row] = event;
+  }
+  return events;
+};
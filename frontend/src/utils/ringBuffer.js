@@ -0,0 +1,39 @@
+// 固定容量的环形缓冲区：push 为 O(1)，满了覆盖最旧的元素
+// 每个元素有递增的序号 seq，位于 [start, end) 内的序号有效，可作为列表渲染的稳定 key
+export class RingBuffer {
+  constructor(capacity) {
+    this.capacity = capacity;
+    this.items = new Array(capacity);
+    this.start = 0; // 最旧元素的序号
+    this.end = 0; // 下一个元素的序号
+  }
+
+  get size() {
+    return this.end - this.start;
+  }
+
+  push(item) {
+    this.items[this.end % this.capacity] = item;
+    this.end++;
+    if (this.end - this.start > this.capacity) {
+      this.start = this.end - this.capacity;
+    }
+  }
+
+  // 按序号取元素
+  at(seq) {
+    return this.items[seq % this.capacity];
+  }
+
+  // 清空后序号继续递增，已渲染的 key 不会与新元素冲突
+  clear() {
+    this.items = new Array(this.capacity);
+    this.start = this.end;
+  }
+
+  toArray() {
+    const result = [];
+    for (let seq = this.start; seq < this.end; seq++) result.push(this.at(seq));
+    return result;
+  }
+}
@@ -0,0 +1,65 @@
+// 虚拟列表的行高索引，数据来自 RingBuffer
+// 行高按槽位 (seq % capacity) 存放，与缓冲区一一对应；未渲染过的行按 estimateHeight 计算
+// 追加消息只更新新增 / 被覆盖行的高度 (O(1))
+export class RowHeights {
+  constructor(capacity, estimateHeight) {
+    this.capacity = capacity;
+    this.estimateHeight = estimateHeight;
+    this.heights = new Float64Array(capacity);
+    this.total = 0;
+    this.trackedStart = 0;
+    this.trackedEnd = 0;
+  }
+
+  heightOf(seq) {
+    return this.heights[seq % this.capacity];
+  }
+
+  // 同步缓冲区的变化：减去被覆盖 / 清空的行，加上新增的行
+  sync(buffer) {
+    const evictEnd = Math.min(buffer.start, this.trackedEnd);
+    for (let seq = this.trackedStart; seq < evictEnd; seq++) this.total -= this.heightOf(seq);
+    for (let seq = Math.max(this.trackedEnd, buffer.start); seq < buffer.end; seq++) {
+      this.heights[seq % this.capacity] = this.estimateHeight;
+      this.total += this.estimateHeight;
+    }
+    this.trackedStart = buffer.start;
+    this.trackedEnd = buffer.end;
+    if (buffer.size === 0) this.total = 0;
+  }
+
+  // 记录渲染后的实际高度，返回是否有变化；已被覆盖的行忽略
+  measure(seq, height) {
+    if (seq < this.trackedStart || seq >= this.trackedEnd || !height) return false;
+    const slot = seq % this.capacity;
+    if (height === this.heights[slot]) return false;
+    this.total += height - this.heights[slot];
+    this.heights[slot] = height;
+    return true;
+  }
+
+  // 可视范围 [first, last) 及其顶部偏移：从离 top 较近的一端开始累加行高，停在底部时只需遍历可见的几行
+  range(buffer, top, viewportHeight, overscan = 0) {
+    const { start, end } = buffer;
+    const bottom = top + viewportHeight;
+
+    let first;
+    let firstTop;
+    if (top > this.total / 2) {
+      first = end;
+      firstTop = this.total;
+      while (first > start && firstTop > top) firstTop -= this.heightOf(--first);
+    } else {
+      first = start;
+      firstTop = 0;
+      while (first < end && firstTop + this.heightOf(first) <= top) firstTop += this.heightOf(first++);
+    }
+    let last = first;
+    let lastBottom = firstTop;
+    while (last < end && lastBottom < bottom) lastBottom += this.heightOf(last++);
+
+    for (let i = 0; i < overscan && first > start; i++) firstTop -= this.heightOf(--first);
+    last = Math.min(end, last + overscan);
+    return { first, last, offset: firstTop, total: this.total };
+  }
+}
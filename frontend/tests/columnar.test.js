@@ -0,0 +1,37 @@
+// 列式编码展开：与 backend/wire_format.py 的编码互逆
+import { test } from 'node:test';
+import assert from 'node:assert/strict';
+import { expandColumnar } from '../src/utils/columnar.js';
+
+test('plain arrays are returned unchanged', () => {
+  const events = [{ a: 1 }];
+  assert.equal(expandColumnar(events), events);
+});
+
+test('dense batch without masks', () => {
+  const data = {
+    $columnar: 1, n: 2, fields: ['type', 'msg'], columns: [[0, 0], ['a', 'b']],
+    strings: ['danmu'], interned: [0],
+  };
+  assert.deepEqual(expandColumnar(data), [{ type: 'danmu', msg: 'a' }, { type: 'danmu', msg: 'b' }]);
+});
+
+test('presence masks keep missing fields missing', () => {
+  // 与 encode_columnar([{type: danmu, face: f, msg: a}, {type: interact, msg: b}, {type: danmu, face: null, msg: c}]) 一致
+  const data = {
+    $columnar: 1, n: 3, fields: ['type', 'face', 'msg'],
+    columns: [[0, 1, 0], [2, null], ['a', 'b', 'c']],
+    strings: ['danmu', 'interact', 'f'], interned: [0, 1], masks: [7, 5, 7],
+  };
+  assert.deepEqual(expandColumnar(data), [
+    { type: 'danmu', face: 'f', msg: 'a' },
+    { type: 'interact', msg: 'b' },
+    { type: 'danmu', face: null, msg: 'c' },
+  ]);
+  assert.ok(!('face' in expandColumnar(data)[1]));
+});
+
+test('events without fields', () => {
+  const data = { $columnar: 1, n: 2, fields: [], columns: [], strings: [], interned: [] };
+  assert.deepEqual(expandColumnar(data), [{}, {}]);
+});
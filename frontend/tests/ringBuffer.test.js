@@ -0,0 +1,27 @@
+// 环形缓冲区：覆盖最旧元素，序号持续递增
+import { test } from 'node:test';
+import assert from 'node:assert/strict';
+import { RingBuffer } from '../src/utils/ringBuffer.js';
+
+test('push keeps the newest items up to capacity', () => {
+  const buffer = new RingBuffer(3);
+  assert.equal(buffer.size, 0);
+  for (let i = 0; i < 5; i++) buffer.push(i);
+  assert.equal(buffer.size, 3);
+  assert.deepEqual([buffer.start, buffer.end], [2, 5]);
+  assert.deepEqual(buffer.toArray(), [2, 3, 4]);
+  assert.equal(buffer.at(4), 4);
+});
+
+test('sequence numbers keep increasing after clear', () => {
+  const buffer = new RingBuffer(2);
+  buffer.push('a');
+  buffer.push('b');
+  buffer.clear();
+  assert.equal(buffer.size, 0);
+  assert.deepEqual(buffer.toArray(), []);
+  buffer.push('c');
+  assert.deepEqual([buffer.start, buffer.end], [2, 3]);
+  assert.equal(buffer.at(2), 'c');
+  assert.deepEqual(buffer.toArray(), ['c']);
+});
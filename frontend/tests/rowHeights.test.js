@@ -0,0 +1,64 @@
+// 虚拟列表的行高索引与可视范围计算
+import { test } from 'node:test';
+import assert from 'node:assert/strict';
+import { RingBuffer } from '../src/utils/ringBuffer.js';
+import { RowHeights } from '../src/utils/rowHeights.js';
+
+const filled = (capacity, count) => {
+  const buffer = new RingBuffer(capacity);
+  for (let i = 0; i < count; i++) buffer.push(i);
+  return buffer;
+};
+
+test('sync adds new rows and drops evicted ones', () => {
+  const buffer = filled(4, 3);
+  const heights = new RowHeights(4, 10);
+  heights.sync(buffer);
+  assert.equal(heights.total, 30);
+
+  assert.ok(heights.measure(0, 25));
+  assert.ok(!heights.measure(0, 25));
+  assert.equal(heights.total, 45);
+
+  // 覆盖序号 0、1，实测高度随之移除
+  for (let i = 3; i < 6; i++) buffer.push(i);
+  heights.sync(buffer);
+  assert.equal(heights.total, 40);
+  assert.ok(!heights.measure(0, 30));
+
+  buffer.clear();
+  heights.sync(buffer);
+  assert.equal(heights.total, 0);
+  buffer.push('x');
+  heights.sync(buffer);
+  assert.equal(heights.total, 10);
+});
+
+test('range from the top and from the bottom', () => {
+  const buffer = filled(100, 100);
+  const heights = new RowHeights(100, 10);
+  heights.sync(buffer);
+
+  assert.deepEqual(heights.range(buffer, 0, 35), { first: 0, last: 4, offset: 0, total: 1000 });
+  assert.deepEqual(heights.range(buffer, 955, 45), { first: 95, last: 100, offset: 950, total: 1000 });
+  // 上下各多渲染 overscan 行
+  assert.deepEqual(heights.range(buffer, 500, 20, 2), { first: 48, last: 54, offset: 480, total: 1000 });
+});
+
+test('range uses measured heights and buffer sequence numbers', () => {
+  const buffer = filled(10, 15);
+  const heights = new RowHeights(10, 10);
+  heights.sync(buffer);
+  heights.measure(5, 50);
+  assert.equal(heights.total, 140);
+  // 第一行 (序号 5) 高 50，滚动 55 后可见序号 6 (50-60) 与 7 (60-70)
+  assert.deepEqual(heights.range(buffer, 55, 10), { first: 6, last: 8, offset: 50, total: 140 });
+  assert.deepEqual(heights.range(buffer, 0, 60), { first: 5, last: 7, offset: 0, total: 140 });
+});
+
+test('empty buffer', () => {
+  const buffer = new RingBuffer(5);
+  const heights = new RowHeights(5, 10);
+  heights.sync(buffer);
+  assert.deepEqual(heights.range(buffer, 0, 100, 3), { first: 0, last: 0, offset: 0, total: 0 });
+});
@@ -38,6 +38,7 @@ elif sys.platform == 'darwin':
 import webview
 import logging
 from logging.handlers import RotatingFileHandler
+from backend import log_pipeline
 from backend.api_service import ApiService
 
 def get_log_xdg_base_path():
@@ -68,23 +69,27 @@ def get_log_path():
         os.makedirs(log_dir)
     return os.path.join(log_dir, 'app.log')
 
-# 配置日志
-log_file = get_log_path()
-file_handler = RotatingFileHandler(log_file, maxBytes=5*1024*1024, backupCount=3, encoding='utf-8')
-handlers = [file_handler]
-if sys.stdout:
-    handlers.append(logging.StreamHandler(sys.stdout))
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)-15s - %(levelname)-8s - %(message)s',
-    handlers=handlers
-)
-# 屏蔽 urllib3 的 DEBUG 日志
-logging.getLogger("urllib3").setLevel(logging.INFO)
-
 logger = logging.getLogger("Main")
-logger.info(f"Log file path: {log_file}")
+
+# 配置日志
+# 只在主进程中调用：process 解码模式的子进程 (spawn) 会重新导入本模块，
+# 不能在模块级别再打开一个指向同一文件的 RotatingFileHandler，否则轮转时会相互冲突
+def setup_logging():
+    log_file = get_log_path()
+    file_handler = RotatingFileHandler(log_file, maxBytes=5*1024*1024, backupCount=3, encoding='utf-8')
+    handlers = [file_handler]
+    if sys.stdout:
+        handlers.append(logging.StreamHandler(sys.stdout))
+
+    log_formatter = logging.Formatter('%(asctime)s - %(name)-15s - %(levelname)-8s - %(message)s')
+    for handler in handlers:
+        handler.setFormatter(log_formatter)
+    # 文件 / 控制台输出在日志管道的后台线程中执行，记录日志的线程只负责入队
+    log_pipeline.start(handlers, level=logging.DEBUG)
+    # 屏蔽 urllib3 的 DEBUG 日志
+    logging.getLogger("urllib3").setLevel(logging.INFO)
+
+    logger.info(f"Log file path: {log_file}")
 
 def get_html_path():
     if getattr(sys, 'frozen', False):
@@ -134,6 +139,11 @@ def _get_primary_monitor_scale_win():
         return 1.0
 
 if __name__ == '__main__':
+    # 弹幕 process 解码模式使用进程池，PyInstaller 打包后需要 freeze_support
+    import multiprocessing
+    multiprocessing.freeze_support()
+    setup_logging()
+
     api = ApiService()
     window_width = 1000
     window_height = 720
@@ -219,17 +229,14 @@ if __name__ == '__main__':
     def cleanup_services(api_service):
         """执行清理工作：停止直播、停止弹幕、保存配置"""
         try:
-            # 1. 停止直播
-            if api_service.session_state.is_live:
-                api_service.live_service.stop_live()
-            
-            # 2. 停止弹幕
-            import asyncio
-            if api_service.loop:
-                 asyncio.run_coroutine_threadsafe(api_service.danmu_service.stop(), api_service.loop)
+            # 1. 停止所有账户的直播和弹幕
+            api_service.stop_all_sessions()
+
+            # 2. 保存配置
+            api_service.config_manager.flush()
 
-            # 3. 保存配置
-            api_service.config_manager.save()
+            # 3. 推送仍在排队的事件
+            api_service.event_bus.stop()
             print("Services cleaned up.")
         except Exception as e:
             print(f"Cleanup failed: {e}")
@@ -247,7 +254,7 @@ if __name__ == '__main__':
         window.restore()
         # 通知前端恢复轮询等操作
         try:
-            api.window_service.send_to_frontend("onAppShown", None)
+            api.app_shown()
         except Exception:
             pass
 
@@ -324,7 +331,7 @@ if __name__ == '__main__':
                     window.minimize()
                 # [Fix] 异步通知前端暂停轮询，不能同步调用 evaluate_js，否则在 UI 线程死锁
                 threading.Thread(
-                    target=lambda: api.window_service.send_to_frontend("onAppHidden", None),
+                    target=api.app_hidden,
                     daemon=True
                 ).start()
                 return False  # 阻止窗口关闭
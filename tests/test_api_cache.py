@@ -0,0 +1,93 @@
+"""只读接口响应缓存：TTL、single-flight 与失效"""
+
+import copy
+import threading
+import time
+
+from backend import api_cache
+from backend.api_cache import ResponseCache
+
+OK = (True, {"code": 0, "data": {"items": [1, 2]}})
+
+
+def counting_fetch(result=OK, delay=0.0, started=None):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        if started is not None:
+            started.set()
+        time.sleep(delay)
+        return copy.deepcopy(result)
+    return fetch, calls
+
+
+def test_concurrent_requests_share_one_fetch():
+    cache = ResponseCache()
+    fetch, calls = counting_fetch(delay=0.05)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch(("room_info", 1), 30, fetch)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and results == [OK] * 8
+    stats = cache.get_stats()
+    assert stats["misses"] == 1 and stats["coalesced"] == 7
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(api_cache.time, "monotonic", lambda: now)
+    cache = ResponseCache()
+    fetch, calls = counting_fetch()
+    cache.get_or_fetch(("room_info",), 30, fetch)
+    now += 29
+    cache.get_or_fetch(("room_info",), 30, fetch)
+    assert len(calls) == 1
+    now += 2
+    cache.get_or_fetch(("room_info",), 30, fetch)
+    assert len(calls) == 2
+
+
+def test_failures_are_not_cached():
+    cache = ResponseCache()
+    for result in [(True, {"code": -101}), (False, {"code": -1})]:
+        fetch, calls = counting_fetch(result)
+        cache.get_or_fetch(("user_info",), 60, fetch)
+        cache.get_or_fetch(("user_info",), 60, fetch)
+        assert len(calls) == 2
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_invalidate_during_fetch_discards_the_stale_result():
+    cache = ResponseCache()
+    started = threading.Event()
+    fetch, calls = counting_fetch(delay=0.05, started=started)
+    thread = threading.Thread(target=cache.get_or_fetch, args=(("room_info",), 30, fetch))
+    thread.start()
+    started.wait()
+    # 写接口在请求进行中使缓存失效：旧结果不写入缓存
+    cache.invalidate("room_info")
+    thread.join()
+    cache.get_or_fetch(("room_info",), 30, fetch)
+    assert len(calls) == 2
+
+
+def test_callers_get_independent_copies():
+    cache = ResponseCache()
+    fetch, _ = counting_fetch(delay=0.05)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch(("area_list",), 60, fetch)))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    hit = cache.get_or_fetch(("area_list",), 60, fetch)
+    for _, res in results + [hit]:
+        res["data"]["items"].append("mutated")
+    # 修改返回值不影响缓存和其他调用方
+    assert cache.get_or_fetch(("area_list",), 60, fetch) == OK
+    assert all(res["data"]["items"] == [1, 2, "mutated"] for _, res in results + [hit])
@@ -0,0 +1,128 @@
+"""AsyncBilibiliApi：组合同步客户端，提供同名的异步接口"""
+
+import asyncio
+import inspect
+import time
+from unittest.mock import AsyncMock
+
+import pytest
+from aiohttp import web
+
+from backend import get_wbi
+from backend.async_bilibili_api import AsyncBilibiliApi
+from backend.bilibili_api import BilibiliApi
+
+# 只对同步客户端有意义的方法 (连接池、cookie jar、响应缓存管理、日志采样设置，异步客户端共用同步客户端的设置)
+SYNC_ONLY = {"update_cookies", "warm_up", "invalidate_cache", "get_cache_stats", "set_log_sampling"}
+
+
+@pytest.fixture
+def api():
+    api = AsyncBilibiliApi()
+    yield api
+    api.sync_api.close()
+
+
+def test_mirrors_every_public_sync_method():
+    names = {name for name, member in vars(BilibiliApi).items()
+             if not name.startswith("_") and inspect.isfunction(member)} - SYNC_ONLY
+    missing = [name for name in sorted(names)
+               if not inspect.iscoroutinefunction(getattr(AsyncBilibiliApi, name, None))]
+    assert missing == []
+
+
+def test_shares_cookies_with_sync_client():
+    sync_api = BilibiliApi()
+    api = AsyncBilibiliApi(sync_api)
+    sync_api.update_cookies({"SESSDATA": "a"})
+    assert api.cookies == {"SESSDATA": "a"} and api.headers is sync_api.headers
+    sync_api.close()
+
+
+def test_req_sends_current_cookies(api):
+    async def handler(request):
+        if request.path == "/text":
+            return web.Response(text="not json")
+        return web.json_response({"code": 0, "data": {"cookie": request.headers.get("Cookie")}})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/{name}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        try:
+            api.sync_api.update_cookies({"SESSDATA": "a"})
+            first = await api._req("GET", f"{base}/json")
+            # 切换账户后下一次请求立即使用新 cookie
+            api.sync_api.update_cookies({"SESSDATA": "b"})
+            second = await api._req("GET", f"{base}/json")
+            bad = await api._req("GET", f"{base}/text")
+        finally:
+            await api.close()
+            await runner.cleanup()
+        return first, second, bad
+
+    first, second, bad = asyncio.run(run())
+    assert first == (True, {"code": 0, "data": {"cookie": "SESSDATA=a"}})
+    assert second[1]["data"]["cookie"] == "SESSDATA=b"
+    assert bad[0] is False
+
+
+def test_start_live_awaits_each_step(api):
+    api._req = AsyncMock(side_effect=[
+        (True, {"code": 0, "data": {"now": 100}}),
+        (True, {"code": 0, "data": {"rtmp": {}}}),
+    ])
+    # 版本信息通过同步客户端获取，共用其缓存
+    api.sync_api._req = lambda method, url, params=None, data=None: (
+        True, {"code": 0, "data": {"build": 1, "curr_version": "v"}})
+    timings = {}
+    success, res = asyncio.run(api.start_live(1, 2, "csrf", timings))
+    assert success and res["code"] == 0
+    method, url = api._req.await_args.args
+    data = api._req.await_args.kwargs["data"]
+    assert (method, url.rsplit("/", 1)[1]) == ("POST", "startLive")
+    assert data["ts"] == 100 and data["build"] == 1 and "sign" in data
+    assert timings.keys() == {"clock", "version", "start"}
+
+
+def test_prepared_start_live_sends_only_start_live(api):
+    api.sync_api.clock_offset = 0
+    api.sync_api.clock_synced_at = time.time()
+    api.sync_api._req = lambda method, url, params=None, data=None: (
+        True, {"code": 0, "data": {"build": 1, "curr_version": "v"}})
+    api._req = AsyncMock(return_value=(True, {"code": 0, "data": {}}))
+    asyncio.run(api.prepare_start_live())
+    assert api._req.await_count == 0
+
+    asyncio.run(api.start_live(1, 2, "csrf"))
+    assert api._req.await_count == 1
+    # startLive 失败后丢弃缓存的时间偏移
+    api._req.return_value = (True, {"code": 1})
+    asyncio.run(api.start_live(1, 2, "csrf"))
+    assert api.sync_api.clock_offset is None
+
+
+def test_get_danmu_info_signs_params(api, monkeypatch):
+    monkeypatch.setattr(get_wbi, "get_w_rid_and_wts",
+                        lambda params, session=None: (dict(params, w_rid="sig"), None))
+    api._req = AsyncMock(return_value=(True, {"code": 0, "data": {"token": "tok"}}))
+
+    success, res = asyncio.run(api.get_danmu_info(123))
+
+    assert success and res["data"]["token"] == "tok"
+    assert api._req.await_args.kwargs["params"] == {"id": 123, "type": 0, "w_rid": "sig"}
+
+
+def test_writes_invalidate_the_sync_cache(api):
+    api.sync_api.invalidate_cache = lambda *endpoints: invalidated.extend(endpoints)
+    invalidated = []
+    api._req = AsyncMock(return_value=(True, {"code": 0}))
+    asyncio.run(api.update_title(1, "t", "csrf"))
+    asyncio.run(api.update_announcement(1, 2, "a", "csrf"))
+    api._req.return_value = (True, {"code": 1})
+    asyncio.run(api.stop_live(1, "csrf"))
+    assert invalidated == ["room_info", "room_news"]
@@ -0,0 +1,199 @@
+"""BilibiliApi：使用本地 HTTP 服务，不访问外网"""
+
+import http.server
+import json
+import logging
+import threading
+import time
+
+import pytest
+
+from backend.bilibili_api import BilibiliApi
+from backend.util import mask_string
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 允许 keep-alive
+
+    def do_GET(self):
+        body = json.dumps({"code": 0, "data": {
+            "code": 0, "cookie": self.headers.get("Cookie"), "port": self.client_address[1]}}).encode()
+        self.send_response(200)
+        self.send_header("Set-Cookie", "SESSDATA=account_B; Path=/")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+
+
+@pytest.fixture
+def api():
+    api = BilibiliApi()
+    yield api
+    api.close()
+
+
+def test_requests_reuse_the_pooled_connection(api, server_url):
+    _, first = api._req("GET", server_url)
+    _, second = api._req("GET", server_url)
+    assert first["data"]["port"] == second["data"]["port"]
+
+
+def test_update_cookies_replaces_the_cookie_jar(api, server_url):
+    api.update_cookies({"SESSDATA": "account_A"})
+    api.session.get(server_url)  # 服务端下发的 cookie 写入 jar
+    api.update_cookies({"SESSDATA": "account_C"})
+    assert api.session.cookies.get_dict() == {"SESSDATA": "account_C"}
+
+
+def test_qrcode_poll_does_not_leak_cookies_into_account_session(api, server_url):
+    api.update_cookies({"SESSDATA": "account_A"})
+    passport = api._get_passport_session()
+    get = passport.get
+    passport.get = lambda url, **kwargs: get(server_url, **kwargs)
+    ok, res, cookies = api.poll_passport_qrcode("key")
+    assert ok
+    # 轮询请求不带当前账户的 cookie，新账户的 cookie 只通过返回值交给调用方
+    assert res["data"]["cookie"] is None
+    assert cookies == {"SESSDATA": "account_B"}
+    assert api.session.cookies.get_dict() == {"SESSDATA": "account_A"}
+    assert api.session.get(server_url).json()["data"]["cookie"] == "SESSDATA=account_A"
+
+
+def test_cached_reads_are_per_account_and_invalidated_by_writes(api):
+    calls = []
+
+    def fake_req(method, url, params=None, data=None):
+        calls.append((method, url.rsplit("/", 1)[1]))
+        return True, {"code": 0, "data": {}}
+
+    api._req = fake_req
+    api.update_cookies({"DedeUserID": "1"})
+    api.get_room_info(10)
+    api.get_room_info(10)
+    assert calls == [("GET", "get_info")]
+
+    api.update_title(10, "t", "csrf")
+    api.get_room_info(10)
+    assert calls[1:] == [("POST", "update"), ("GET", "get_info")]
+
+    # 另一个账户不共用缓存
+    api.update_cookies({"DedeUserID": "2"})
+    api.get_room_info(10)
+    assert len(calls) == 4 and api.get_cache_stats()["hits"] == 1
+
+
+def test_masked_log_data_masks_sensitive_scalars(api):
+    data = {"room_id": 12345678, "isLogin": True, "code": True, "key": "abcdefghijkl",
+            "list": [{"token": "tok123456789"}], "url": ["kept", "as-is"]}
+    text = api._format_masked_data(data, limit=None)
+    assert f'"room_id": "{mask_string("12345678", 2, 2)}"' in text
+    assert '"isLogin": true' in text
+    # bool 属于数值，与原来的脱敏规则一致
+    assert f'"code": "{mask_string("True", 2, 2)}"' in text
+    assert f'"key": "{mask_string("abcdefghijkl", 4, 4)}"' in text
+    assert f'"token": "{mask_string("tok123456789", 4, 4)}"' in text
+    assert '"url": ["kept", "as-is"]' in text
+
+
+def test_masked_log_data_is_truncated(api):
+    text = api._format_masked_data({"items": list(range(1000))}, limit=50)
+    assert len(text) == 53 and text.endswith("...")
+
+
+def test_logging_is_skipped_below_debug(api, monkeypatch, caplog):
+    caplog.set_level(logging.INFO, logger="BiliAPI")
+    monkeypatch.setattr(api, "_mask_url", lambda url: pytest.fail("masked without a DEBUG record"))
+    assert api._log_request("GET", "https://x/a?uid=1") is None
+    api._log_response(None, {"code": 0, "data": {"uid": 1}})
+    assert caplog.records == []
+
+
+def test_debug_logging_masks_lazily(api, caplog):
+    caplog.set_level(logging.DEBUG, logger="BiliAPI")
+    masked_url = api._log_request("GET", "https://x/a?uid=12345678")
+    api._log_response(masked_url, {"code": 0, "data": {"uid": 12345678}})
+    assert "12345678" not in caplog.text
+    assert mask_string("12345678", 2, 2) in caplog.text
+
+
+def test_log_sampling_per_path(api, caplog):
+    caplog.set_level(logging.DEBUG, logger="BiliAPI")
+    api.set_log_sampling("/a", 3)
+    logged = [api._log_request("GET", "https://x/a") is not None for _ in range(6)]
+    assert logged == [True, False, False, True, False, False]
+    # 其他接口不受影响；every <= 1 时取消采样
+    assert api._log_request("GET", "https://x/b") is not None
+    api.set_log_sampling("/a", 1)
+    assert all(api._log_request("GET", "https://x/a") is not None for _ in range(3))
+
+
+def test_log_sampling_counts_every_call_across_threads(api, caplog):
+    caplog.set_level(logging.DEBUG, logger="BiliAPI")
+    api.set_log_sampling("/a", 10)
+    logged = []
+
+    def worker():
+        for _ in range(1000):
+            logged.append(api._should_log("https://x/a"))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(logged) == 800
+
+
+def test_server_time_uses_the_synced_offset(api, monkeypatch):
+    calls = []
+
+    def fake_req(method, url, params=None, data=None):
+        calls.append(url)
+        return True, {"code": 0, "data": {"now": int(time.time()) + 1000}}
+    api._req = fake_req
+    assert api.server_time() - time.time() == pytest.approx(1000, abs=2)
+    api.server_time()
+    assert len(calls) == 1
+    # 偏移过期后重新同步
+    monkeypatch.setattr(BilibiliApi, "CLOCK_SYNC_TTL", -1)
+    api.server_time()
+    assert len(calls) == 2
+
+
+def test_prepared_start_live_sends_only_start_live(api):
+    calls = []
+    start_code = [0]
+
+    def fake_req(method, url, params=None, data=None):
+        name = url.rsplit("/", 1)[1]
+        calls.append(name)
+        if name == "now":
+            return True, {"code": 0, "data": {"now": int(time.time())}}
+        if name == "getHomePageLiveVersion":
+            return True, {"code": 0, "data": {"build": 1, "curr_version": "v"}}
+        return True, {"code": start_code[0], "data": {}}
+    api._req = fake_req
+    api.warm_up = lambda: None
+    api.prepare_start_live()
+    assert calls == ["now", "getHomePageLiveVersion"]
+
+    timings = {}
+    api.start_live(1, 2, "csrf", timings)
+    assert calls[2:] == ["startLive"]
+    assert timings.keys() == {"clock", "version", "start"}
+    # 开播失败后丢弃缓存的版本和时间偏移，下次重新获取
+    start_code[0] = 1
+    api.start_live(1, 2, "csrf")
+    api.start_live(1, 2, "csrf")
+    assert calls[3:] == ["startLive", "now", "getHomePageLiveVersion", "startLive"]
@@ -0,0 +1,83 @@
+"""命令分发：CommandRegistry 的匹配规则与缓存失效"""
+
+from unittest.mock import MagicMock
+
+from backend.services.danmu_service import CommandRegistry, DanmuService
+from backend.state import SessionState
+
+
+def handler(name):
+    return lambda command: name
+
+
+def test_exact_match_wins_over_prefix():
+    registry = CommandRegistry()
+    registry.register("INTERACT_WORD", handler("exact"))
+    registry.register("INTERACT", handler("prefix"), prefix=True)
+    assert registry.resolve("INTERACT_WORD")(None) == "exact"
+    assert registry.resolve("INTERACT_WORD_V2")(None) == "prefix"
+
+
+def test_longest_prefix_wins():
+    registry = CommandRegistry()
+    registry.register("INTERACT_WORD", handler("short"), prefix=True)
+    registry.register("INTERACT_WORD_V2", handler("long"), prefix=True)
+    assert registry.resolve("INTERACT_WORD_V2")(None) == "long"
+    assert registry.resolve("INTERACT_WORD_X")(None) == "short"
+    assert registry.resolve("UNKNOWN") is None
+
+
+def test_resolution_is_memoized():
+    registry = CommandRegistry()
+    registry.register("DANMU_MSG", handler("danmu"), prefix=True)
+    registry.resolve("DANMU_MSG:4:0:2:2:2:0")
+    registry.resolve("ONLINE_RANK_COUNT")
+    assert registry._cache.keys() == {"DANMU_MSG:4:0:2:2:2:0", "ONLINE_RANK_COUNT"}
+    # 未注册的命令同样被缓存为 None
+    assert registry._cache["ONLINE_RANK_COUNT"] is None
+
+
+def test_cache_is_bounded():
+    registry = CommandRegistry()
+    for i in range(CommandRegistry.MAX_CACHE + 10):
+        registry.resolve(f"CMD_{i}")
+    assert len(registry._cache) <= CommandRegistry.MAX_CACHE
+
+
+def make_service():
+    service = DanmuService(MagicMock(), SessionState())
+    received = []
+    service.set_callback(received.append)
+    return service, received
+
+
+def test_register_handler_invalidates_memoized_miss():
+    service, _ = make_service()
+    calls = []
+    service._handle_command({"cmd": "SUPER_CHAT_MESSAGE"})
+    service.register_handler("SUPER_CHAT_MESSAGE", calls.append)
+    service._handle_command({"cmd": "SUPER_CHAT_MESSAGE", "data": 1})
+    assert calls == [{"cmd": "SUPER_CHAT_MESSAGE", "data": 1}]
+
+
+def test_unregister_handler_invalidates_memoized_hit():
+    service, received = make_service()
+    command = {"cmd": "DANMU_MSG", "info": [[0], "hi", [1, "user"]]}
+    service._handle_command(command)
+    service.unregister_handler("DANMU_MSG", prefix=True)
+    service._handle_command(command)
+    assert [m["msg"] for m in received] == ["hi"]
+
+
+def test_interact_word_v2_is_reachable():
+    service, _ = make_service()
+    assert service.commands.resolve("INTERACT_WORD_V2") == service._on_interact_word_v2
+    assert service.commands.resolve("INTERACT_WORD") == service._on_interact_word
+
+
+def test_default_handlers_emit_events():
+    service, received = make_service()
+    service._handle_command({"cmd": "SEND_GIFT", "data": {"uid": 1, "uname": "u", "giftName": "g", "num": 2}})
+    service._handle_command({"cmd": "INTERACT_WORD", "data": {"uid": 1, "uname": "u", "msg_type": "2"}})
+    assert [(m["type"], m["msg"] if "msg" in m else m["gift_name"]) for m in received] == [
+        ("gift", "g"), ("interact", "关注了直播间")]
@@ -0,0 +1,189 @@
+"""Config：延迟写入、原子写盘以及索引 + 账户文件的读写，使用临时目录"""
+
+import json
+import os
+
+import pytest
+
+from backend import config as config_module
+
+
+@pytest.fixture
+def config_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_module, "CONFIG_FILE", str(tmp_path / "config.json"))
+    monkeypatch.setattr(config_module, "ACCOUNTS_DIR", str(tmp_path / "accounts"))
+    return tmp_path
+
+
+def read_config(config_dir, name="config.json"):
+    with open(config_dir / name, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def make_config():
+    cfg = config_module.Config()
+    cfg.set_user("1", {"uid": "1", "uname": "a", "cookie": "SESSDATA=x", "csrf": "c", "roomId": "9"})
+    cfg.flush()
+    return cfg
+
+
+def test_saves_are_coalesced_until_flush(config_dir, monkeypatch):
+    monkeypatch.setattr(config_module.Config, "SAVE_DELAY", 60)
+    cfg = config_module.Config()
+    cfg.set("min_to_tray", False)
+    cfg.set("danmu_decode_mode", "thread")
+    # save() 不写盘，只安排一次延迟写入
+    assert not os.path.exists(config_dir / "config.json")
+    timer = cfg._timer
+    assert timer is not None
+    cfg.set("current_uid", "1")
+    assert cfg._timer is timer
+
+    cfg.flush()
+    assert cfg._timer is None
+    data = read_config(config_dir)
+    assert (data["min_to_tray"], data["danmu_decode_mode"], data["current_uid"]) == (False, "thread", "1")
+
+
+def test_save_timer_flushes(config_dir, monkeypatch):
+    monkeypatch.setattr(config_module.Config, "SAVE_DELAY", 0.01)
+    cfg = config_module.Config()
+    cfg.set("min_to_tray", False)
+    cfg._timer.join(1)
+    assert read_config(config_dir)["min_to_tray"] is False
+
+
+def test_unchanged_content_is_not_rewritten(config_dir, monkeypatch):
+    cfg = config_module.Config()
+    cfg.set("min_to_tray", False)
+    cfg.flush()
+    writes = []
+    monkeypatch.setattr(config_module.util, "atomic_write_text", lambda path, text: writes.append(path))
+    cfg.set("min_to_tray", False)
+    cfg.flush()
+    assert writes == []
+    # 重新加载后与磁盘内容一致，同样跳过
+    cfg = config_module.Config()
+    cfg.save()
+    cfg.flush()
+    assert writes == []
+
+
+def test_atomic_write_leaves_no_temp_file(config_dir):
+    path = str(config_dir / "config.json")
+    config_module.util.atomic_write_text(path, "{}")
+    config_module.util.atomic_write_text(path, '{"a": 1}')
+    assert os.listdir(config_dir) == ["config.json"]
+    assert read_config(config_dir) == {"a": 1}
+
+
+def test_failed_write_is_retried(config_dir, monkeypatch):
+    cfg = config_module.Config()
+    monkeypatch.setattr(config_module.Config, "RETRY_DELAY", 0.05)
+    real_write = config_module.util.atomic_write_text
+    calls = []
+
+    def flaky_write(path, text):
+        calls.append(path)
+        if len(calls) == 1:
+            raise OSError("disk full")
+        real_write(path, text)
+    monkeypatch.setattr(config_module.util, "atomic_write_text", flaky_write)
+
+    cfg.set("min_to_tray", False)
+    cfg.flush()
+    # 第一次写入失败后由定时器重试
+    retry = cfg._timer
+    assert retry is not None
+    retry.join(1)
+    assert read_config(config_dir)["min_to_tray"] is False
+
+
+def test_set_user_writes_account_file_and_summary(config_dir):
+    make_config()
+    assert read_config(config_dir, "accounts/1.json")["cookie"] == "SESSDATA=x"
+    assert read_config(config_dir)["users"]["1"] == {"uid": "1", "uname": "a", "roomId": "9"}
+
+
+def test_accounts_are_loaded_on_demand(config_dir):
+    make_config()
+    cfg = config_module.Config()
+    assert cfg.accounts == {}
+    assert cfg.list_users() == [{"uid": "1", "uname": "a", "roomId": "9"}]
+    assert cfg.get_user("1")["csrf"] == "c"
+    assert cfg.update_user("1", {"last_title": "t"})
+    cfg.flush()
+    assert read_config(config_dir, "accounts/1.json")["last_title"] == "t"
+
+
+def test_remove_user_deletes_account_file(config_dir):
+    cfg = make_config()
+    assert cfg.remove_user("1")
+    assert not cfg.remove_user("1")
+    cfg.flush()
+    assert not os.path.exists(config_dir / "accounts" / "1.json")
+    assert read_config(config_dir)["users"] == {}
+
+
+def test_unreadable_account_file_does_not_overwrite_credentials(config_dir):
+    make_config()
+    account_file = config_dir / "accounts" / "1.json"
+    account_file.write_text("{broken", encoding="utf-8")
+
+    cfg = config_module.Config()
+    assert cfg.has_user("1")
+    assert cfg.get_user("1") is None
+    assert cfg.update_user("1", {"last_title": "t"}) is False
+    cfg.flush()
+    # 摘要不会被当作完整数据写回账户文件
+    assert account_file.read_text(encoding="utf-8") == "{broken"
+
+
+LEGACY = {"current_uid": "1", "min_to_tray": False, "users": {
+    "1": {"uid": "1", "uname": "a", "cookie": "SESSDATA=x", "csrf": "c", "roomId": "9", "last_title": "t"},
+    "2": {"uid": "2", "uname": "b", "cookie": "SESSDATA=y", "csrf": "d", "roomId": "8"},
+}}
+
+
+def write_legacy(config_dir):
+    (config_dir / "config.json").write_text(json.dumps(LEGACY), encoding="utf-8")
+
+
+def test_migrate_sharded_splits_single_file_config(config_dir, monkeypatch):
+    write_legacy(config_dir)
+    cfg = config_module.Config()
+    index = read_config(config_dir)
+    assert index["version"] == config_module.CONFIG_VERSION
+    assert index["current_uid"] == "1" and index["min_to_tray"] is False
+    assert index["users"]["1"] == {"uid": "1", "uname": "a", "roomId": "9"}
+    for uid, user in LEGACY["users"].items():
+        assert read_config(config_dir, f"accounts/{uid}.json") == user
+    assert cfg.get_user("2")["cookie"] == "SESSDATA=y"
+
+    # 已迁移的配置不会再次迁移
+    writes = []
+    monkeypatch.setattr(config_module.util, "atomic_write_text", lambda path, text: writes.append(path))
+    cfg = config_module.Config()
+    assert cfg.accounts == {}
+    assert writes == []
+
+
+def test_failed_migration_keeps_accounts_and_retries_on_save(config_dir, monkeypatch):
+    write_legacy(config_dir)
+    real_write = config_module.util.atomic_write_text
+    calls = []
+
+    def flaky_write(path, text):
+        calls.append(path)
+        if len(calls) == 2:
+            raise OSError("disk full")
+        real_write(path, text)
+    monkeypatch.setattr(config_module.util, "atomic_write_text", flaky_write)
+
+    cfg = config_module.Config()
+    # 旧的 config.json 未被覆盖，完整数据仍在内存中
+    assert read_config(config_dir) == LEGACY
+    assert cfg.get_user("2")["cookie"] == "SESSDATA=y"
+    cfg.flush()
+    assert read_config(config_dir)["version"] == config_module.CONFIG_VERSION
+    assert read_config(config_dir, "accounts/2.json")["cookie"] == "SESSDATA=y"
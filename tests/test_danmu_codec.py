@@ -0,0 +1,125 @@
+"""弹幕数据包编解码：使用本地构造的数据包"""
+
+import json
+import zlib
+
+import brotli
+
+from backend import danmu_codec
+from backend.danmu_codec import HEADER, OP_AUTH_REPLY, OP_HEARTBEAT_REPLY, OP_MESSAGE, PROTO_BROTLI, PROTO_JSON, \
+    PROTO_ZLIB, pack_packet
+
+
+def message(cmd, **fields):
+    return pack_packet(OP_MESSAGE, json.dumps(dict(cmd=cmd, **fields)).encode(), PROTO_JSON)
+
+
+def decode(data):
+    errors = []
+    packets = [(op, bytes(body)) for op, body in danmu_codec.iter_packets(data, on_error=errors.append)]
+    return packets, errors
+
+
+def cmds(packets):
+    return [json.loads(body)["cmd"] for op, body in packets if op == OP_MESSAGE]
+
+
+def test_plain_packets_in_order():
+    data = message("A") + pack_packet(OP_HEARTBEAT_REPLY, (42).to_bytes(4, "big")) + message("B")
+    packets, errors = decode(data)
+    assert errors == []
+    assert [op for op, _ in packets] == [OP_MESSAGE, OP_HEARTBEAT_REPLY, OP_MESSAGE]
+    assert cmds(packets) == ["A", "B"]
+    assert danmu_codec.POPULARITY.unpack_from(packets[1][1])[0] == 42
+
+
+def test_nested_zlib_and_brotli_bodies_keep_order():
+    # brotli 帧中嵌套 zlib 帧，解出的子包按原始位置插入
+    inner_zlib = pack_packet(OP_MESSAGE, zlib.compress(message("B") + message("C")), PROTO_ZLIB)
+    outer = pack_packet(OP_MESSAGE, brotli.compress(message("A") + inner_zlib + message("D")), PROTO_BROTLI)
+    packets, errors = decode(message("first") + outer + message("last"))
+    assert errors == []
+    assert cmds(packets) == ["first", "A", "B", "C", "D", "last"]
+
+
+def test_body_views_do_not_copy_uncompressed_frames():
+    data = message("A")
+    (op, body), = danmu_codec.iter_packets(data)
+    assert isinstance(body, memoryview) and body.obj is data
+
+
+def test_truncated_header_is_reported():
+    packets, errors = decode(message("A") + b"\x00\x00\x00")
+    assert cmds(packets) == ["A"]
+    assert len(errors) == 1 and "Truncated" in errors[0]
+
+
+def test_bad_packet_len_skips_only_the_broken_header():
+    broken = bytearray(message("broken"))
+    HEADER.pack_into(broken, 0, 10 ** 6, 16, PROTO_JSON, OP_MESSAGE, 1)
+    packets, errors = decode(message("A") + bytes(broken) + message("B") + message("C"))
+    # 解析从下一个合法包头继续，同一帧中后续的包不会丢失
+    assert cmds(packets) == ["A", "B", "C"]
+    assert len(errors) == 1 and "Malformed packet length" in errors[0]
+
+
+def test_bad_packet_len_inside_compressed_body():
+    broken = bytearray(message("broken"))
+    HEADER.pack_into(broken, 0, 3, 16, PROTO_JSON, OP_MESSAGE, 1)
+    outer = pack_packet(OP_MESSAGE, zlib.compress(message("A") + bytes(broken) + message("B")), PROTO_ZLIB)
+    packets, errors = decode(outer + message("C"))
+    assert cmds(packets) == ["A", "B", "C"]
+    assert len(errors) == 1
+
+
+def test_bad_header_len_skips_one_packet():
+    broken = bytearray(message("broken"))
+    HEADER.pack_into(broken, 0, len(broken), 4, PROTO_JSON, OP_MESSAGE, 1)
+    packets, errors = decode(bytes(broken) + message("A"))
+    assert cmds(packets) == ["A"]
+    assert "Malformed header length" in errors[0]
+
+
+def test_decompress_error_skips_one_packet():
+    bad = pack_packet(OP_MESSAGE, b"not brotli", PROTO_BROTLI)
+    packets, errors = decode(bad + message("A"))
+    assert cmds(packets) == ["A"]
+    assert "Decompress error" in errors[0]
+
+
+def test_auth_reply_body():
+    packets, errors = decode(pack_packet(OP_AUTH_REPLY, b'{"code":0}', PROTO_JSON))
+    assert packets == [(OP_AUTH_REPLY, b'{"code":0}')]
+
+
+def test_extract_cmd():
+    assert danmu_codec.extract_cmd(b'{"cmd":"DANMU_MSG","info":[]}') == b"DANMU_MSG"
+    assert danmu_codec.extract_cmd(memoryview(b'{ "cmd" :\t"SEND_GIFT" }')) == b"SEND_GIFT"
+    # 含转义字符或没有 cmd 时返回 None，由调用方完整解析
+    assert danmu_codec.extract_cmd(b'{"cmd":"A\\u0042"}') is None
+    assert danmu_codec.extract_cmd(b'{"data":{}}') is None
+
+
+def test_extract_cmd_only_looks_at_the_head():
+    # cmd 位于前 64 字节之后，或其值被 64 字节边界截断时，都返回 None 而不是错误的命令
+    late = b'{"data":{"padding":"' + b"x" * 64 + b'"},"cmd":"DANMU_MSG"}'
+    assert danmu_codec.extract_cmd(late) is None
+    cut = b'{"padding":"' + b"x" * 40 + b'","cmd":"DANMU_MSG"}'
+    assert cut.find(b"DANMU_MSG") < 64 < cut.find(b"DANMU_MSG") + len(b"DANMU_MSG")
+    assert danmu_codec.extract_cmd(cut) is None
+
+
+def test_late_cmd_is_still_delivered_by_decode_frame():
+    late = pack_packet(OP_MESSAGE, b'{"data":{"padding":"' + b"x" * 64 + b'"},"cmd":"OTHER"}', PROTO_JSON)
+    events, _, skipped, _ = danmu_codec.decode_frame(late, danmu_codec.CommandFilter(["DANMU_MSG"]))
+    # 无法在字节层判断时退回完整解析，交给命令分发处理
+    assert [e[1]["cmd"] for e in events] == ["OTHER"] and skipped == 0
+
+
+def test_command_filter():
+    command_filter = danmu_codec.CommandFilter(["SEND_GIFT"], ["DANMU_MSG"])
+    assert command_filter.accepts(b"SEND_GIFT")
+    assert command_filter.accepts(b"DANMU_MSG:4:0:2:2:2:0")
+    assert not command_filter.accepts(b"SEND_GIFT_V2")
+    assert command_filter == danmu_codec.CommandFilter(["SEND_GIFT"], ["DANMU_MSG"])
+    assert command_filter != danmu_codec.CommandFilter(["SEND_GIFT"])
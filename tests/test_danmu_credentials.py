@@ -0,0 +1,33 @@
+"""弹幕连接凭据缓存：有效期与失效范围"""
+
+from backend import danmu_credentials
+from backend.danmu_credentials import CredentialCache
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(danmu_credentials.time, "monotonic", lambda: now)
+    cache = CredentialCache()
+    cache.set_danmu_info(1, 42, {"token": "t"})
+    cache.set_anonymous("")
+    assert cache.get_danmu_info("1", 42) == {"token": "t"} and cache.is_anonymous("")
+
+    now += CredentialCache.TOKEN_TTL
+    assert cache.get_danmu_info(1, 42) is None and cache.is_anonymous("")
+    now += CredentialCache.UID_TTL
+    assert not cache.is_anonymous("")
+
+
+def test_invalidate_one_room_keeps_the_others():
+    cache = CredentialCache()
+    cache.set_danmu_info(1, 42, {"token": "a"})
+    cache.set_danmu_info(2, 42, {"token": "b"})
+    cache.set_anonymous("")
+    cache.invalidate(1, 42)
+    assert cache.get_danmu_info(1, 42) is None
+    assert cache.get_danmu_info(2, 42) == {"token": "b"}
+    # 登录状态可能已变化，未登录标记一并清除
+    assert not cache.is_anonymous("")
+
+    cache.invalidate()
+    assert cache.get_danmu_info(2, 42) is None
@@ -0,0 +1,151 @@
+"""弹幕解码工作器：各模式下的解码结果与分发顺序"""
+
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from backend import danmu_codec
+from backend.danmu_codec import OP_AUTH_REPLY, OP_HEARTBEAT_REPLY, OP_MESSAGE, PROTO_JSON, pack_packet
+from backend.danmu_decoder import DECODE_INLINE, DECODE_MODES, DECODE_PROCESS, DECODE_THREAD, DanmuDecoder
+from backend.services.danmu_service import DanmuService
+from backend.state import SessionState
+
+
+def danmu(i):
+    body = {"cmd": "DANMU_MSG", "info": [[0], f"msg{i}", [i, f"user{i}"]]}
+    return pack_packet(OP_MESSAGE, json.dumps(body).encode(), PROTO_JSON)
+
+
+def test_decode_frame_parses_each_operation():
+    data = danmu(1) + pack_packet(OP_HEARTBEAT_REPLY, (7).to_bytes(4, "big")) + \
+        pack_packet(OP_AUTH_REPLY, b'{"code":0}', PROTO_JSON)
+    events, errors, skipped, _ = danmu_codec.decode_frame(data)
+    assert errors == [] and skipped == 0
+    assert events[0][0] == OP_MESSAGE and events[0][1]["info"][1] == "msg1"
+    assert events[1:] == [(OP_HEARTBEAT_REPLY, 7), (OP_AUTH_REPLY, {"code": 0})]
+
+
+def test_unparsable_auth_reply_still_produces_an_event():
+    events, errors, _, _ = danmu_codec.decode_frame(pack_packet(OP_AUTH_REPLY, b"not json", PROTO_JSON))
+    assert events == [(OP_AUTH_REPLY, None)]
+    assert len(errors) == 1
+
+
+def test_unparsable_message_is_reported_and_skipped():
+    bad = pack_packet(OP_MESSAGE, b"{", PROTO_JSON)
+    events, errors, _, _ = danmu_codec.decode_frame(bad + danmu(2))
+    assert [e[1]["info"][1] for e in events] == ["msg2"]
+    assert len(errors) == 1
+
+
+@pytest.mark.parametrize("mode", DECODE_MODES)
+def test_decoder_modes_return_the_same_result(mode):
+    frame = danmu(1) + danmu(2)
+    expected = danmu_codec.decode_frame(frame)
+
+    async def run():
+        decoder = DanmuDecoder(mode, max_workers=1)
+        try:
+            result = decoder.submit(frame)
+            return await result if asyncio.isfuture(result) else result
+        finally:
+            decoder.close()
+
+    assert asyncio.run(run()) == expected
+
+
+def other(i):
+    return pack_packet(OP_MESSAGE, json.dumps({"cmd": "ONLINE_RANK_COUNT", "data": {"count": i}}).encode(),
+                       PROTO_JSON)
+
+
+def test_decode_frame_skips_unsubscribed_commands():
+    frame = other(1) + danmu(1) + other(2)
+    events, errors, skipped, skipped_bytes = danmu_codec.decode_frame(
+        frame, danmu_codec.CommandFilter(prefixes=["DANMU_MSG"]))
+    assert [e[1]["cmd"] for e in events] == ["DANMU_MSG"]
+    assert errors == [] and skipped == 2
+    assert skipped_bytes == len(other(1)) + len(other(2)) - 2 * danmu_codec.HEADER_SIZE
+
+
+@pytest.mark.parametrize("mode", DECODE_MODES)
+def test_decoder_modes_apply_the_filter(mode):
+    command_filter = danmu_codec.CommandFilter(prefixes=["DANMU_MSG"])
+
+    async def run():
+        decoder = DanmuDecoder(mode, max_workers=1)
+        try:
+            results = []
+            # 进程模式下过滤器变化时重建进程池
+            for f in (command_filter, None):
+                result = decoder.submit(other(1) + danmu(1), f)
+                results.append(await result if asyncio.isfuture(result) else result)
+            return results
+        finally:
+            decoder.close()
+
+    filtered, unfiltered = asyncio.run(run())
+    assert [e[1]["cmd"] for e in filtered[0]] == ["DANMU_MSG"] and filtered[2] == 1
+    assert [e[1]["cmd"] for e in unfiltered[0]] == ["ONLINE_RANK_COUNT", "DANMU_MSG"] and unfiltered[2] == 0
+
+
+def test_process_pool_is_reused_while_the_filter_is_unchanged():
+    decoder = DanmuDecoder(DECODE_PROCESS, max_workers=1)
+    try:
+        executor = decoder._get_executor(danmu_codec.CommandFilter(["A"], ["B"]))
+        # 内容相同的过滤器视为未变化
+        assert decoder._get_executor(danmu_codec.CommandFilter(["A"], ["B"])) is executor
+        assert decoder._get_executor(danmu_codec.CommandFilter(["A"])) is not executor
+    finally:
+        decoder.close()
+
+
+def test_unknown_mode_falls_back_to_inline():
+    assert DanmuDecoder("gpu").mode == DECODE_INLINE
+
+
+def make_service(mode):
+    service = DanmuService(MagicMock(), SessionState(), mode)
+    received = []
+    service.set_callback(lambda data: received.append(data["msg"]))
+    return service, received
+
+
+@pytest.mark.parametrize("mode", [DECODE_THREAD, DECODE_PROCESS])
+def test_worker_results_are_dispatched_in_arrival_order(mode):
+    async def run():
+        service, received = make_service(mode)
+        service.decode_queue = asyncio.Queue()
+        service.dispatch_task = asyncio.create_task(service._dispatch_loop(service.decode_queue))
+        try:
+            # 第一帧较大，解码耗时更长，分发仍按接收顺序
+            service._decode_packet(b"".join(danmu(i) for i in range(200)))
+            for i in range(200, 205):
+                service._decode_packet(danmu(i))
+            while len(received) < 205:
+                await asyncio.sleep(0.01)
+        finally:
+            await service.stop()
+        return received
+
+    assert asyncio.run(run()) == [f"msg{i}" for i in range(205)]
+
+
+def test_service_prefilter_counts_skipped_messages():
+    service, received = make_service(DECODE_INLINE)
+    service._decode_packet(other(1) + danmu(1))
+    assert received == ["msg1"]
+    stats = service.get_filter_stats()
+    assert stats["parsed_messages"] == 1 and stats["skipped_messages"] == 1
+
+    service.prefilter_enabled = False
+    service._decode_packet(other(2))
+    assert service.get_filter_stats()["parsed_messages"] == 2
+
+
+def test_unparsable_auth_reply_is_dispatched_as_failure(caplog):
+    service, _ = make_service(DECODE_INLINE)
+    service._decode_packet(pack_packet(OP_AUTH_REPLY, b"not json", PROTO_JSON))
+    assert "Danmu authentication failed" in caplog.text
@@ -0,0 +1,140 @@
+"""弹幕服务器选择：延迟统计、并发建连与故障切换"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from backend import danmu_hosts
+from backend.danmu_hosts import HostSelector
+from backend.services import danmu_service
+from backend.services.danmu_service import DanmuService
+from backend.state import SessionState
+
+HOSTS = [{"host": name, "wss_port": 443} for name in ("a", "b", "c")]
+
+
+class FakeConnection:
+    def __init__(self, host):
+        self.host = host
+        self.closed = False
+        self.send_bytes = AsyncMock()
+
+    async def close(self):
+        self.closed = True
+
+
+def fake_open(delays, opened):
+    """delays: host -> 建连耗时，None 表示失败"""
+    async def open_connection(host):
+        delay = delays[host["host"]]
+        await asyncio.sleep(delay or 0)
+        if delay is None:
+            raise OSError(f"refused: {host['host']}")
+        conn = FakeConnection(host["host"])
+        opened.append(conn)
+        return conn
+    return open_connection
+
+
+def test_latency_is_an_ewma():
+    selector = HostSelector()
+    selector.record_success(HOSTS[0], 0.1)
+    selector.record_success(HOSTS[0], 0.2)
+    latency = selector.stats["a:443"]["latency"]
+    assert latency == pytest.approx(0.1 + HostSelector.EWMA_ALPHA * 0.1)
+
+
+def test_order_prefers_fewer_failures_then_latency():
+    selector = HostSelector()
+    selector.record_success(HOSTS[0], 0.05)
+    selector.record_failure(HOSTS[0])
+    selector.record_success(HOSTS[1], 0.3)
+    selector.record_success(HOSTS[2], 0.1)
+    assert [h["host"] for h in selector.order(HOSTS)] == ["c", "b", "a"]
+
+
+def test_stats_expire_after_ttl(monkeypatch):
+    selector = HostSelector()
+    now = 1000.0
+    monkeypatch.setattr(danmu_hosts.time, "time", lambda: now)
+    for host in HOSTS:
+        selector.record_success(host, 0.1)
+    assert selector.is_fresh(HOSTS)
+    now += HostSelector.STATS_TTL + 1
+    assert not selector.is_fresh(HOSTS)
+    # 新出现的 host 同样需要重新建连统计
+    assert not HostSelector().is_fresh(HOSTS)
+
+
+def test_race_uses_the_fastest_connection_and_closes_the_rest():
+    selector = HostSelector()
+    opened = []
+
+    async def run():
+        result = await selector.connect(HOSTS, fake_open({"a": 0.05, "b": 0.01, "c": None}, opened))
+        # 等待被取消的慢连接结束
+        await asyncio.sleep(0.1)
+        return result
+
+    host, conn, remaining = asyncio.run(run())
+    assert host["host"] == "b" and conn.host == "b" and not conn.closed
+    # 不做额外的探测握手，每个 host 只建连一次
+    assert all(c.closed for c in opened if c is not conn)
+    # 未完成的 a 没有统计，排在失败过的 c 之前
+    assert [h["host"] for h in remaining] == ["a", "c"]
+    assert selector.stats["c:443"]["failures"] == 1
+    assert selector.stats["b:443"]["latency"] is not None
+
+
+def test_fresh_stats_connect_in_ranked_order():
+    selector = HostSelector()
+    selector.record_success(HOSTS[0], 0.3)
+    selector.record_success(HOSTS[1], 0.2)
+    selector.record_success(HOSTS[2], 0.1)
+    opened = []
+    host, conn, remaining = asyncio.run(
+        selector.connect(HOSTS, fake_open({"a": 0, "b": 0, "c": None}, opened)))
+    # 最快的 c 失败后依次尝试下一个，不再同时建连
+    assert host["host"] == "b" and [c.host for c in opened] == ["b"]
+    assert [h["host"] for h in remaining] == ["a"]
+    assert selector.stats["c:443"]["failures"] == 1
+
+
+def test_all_hosts_failing_raises():
+    selector = HostSelector()
+    with pytest.raises(ConnectionError):
+        asyncio.run(selector.connect(HOSTS, fake_open({"a": None, "b": None, "c": None}, [])))
+
+
+def test_service_fails_over_to_the_next_host(monkeypatch):
+    selector = HostSelector()
+    monkeypatch.setattr(danmu_service, "host_selector", selector)
+    monkeypatch.setattr(DanmuService, "get_danmu_info", AsyncMock(return_value={"token": "t", "host_list": HOSTS}))
+    monkeypatch.setattr(DanmuService, "_heartbeat_loop", AsyncMock())
+    monkeypatch.setattr(DanmuService, "_receive_loop", AsyncMock())
+    opened = []
+    open_connection = fake_open({"a": 0.01, "b": 0.03, "c": 0.05}, opened)
+    session = MagicMock(closed=False)
+    session.ws_connect = lambda url, **kwargs: open_connection({"host": url[6:7]})
+
+    api = MagicMock(cookies={"buvid3": "x"})
+    state = SessionState()
+    state.uid = 1
+
+    async def run():
+        service = DanmuService(api, state, session=session)
+        await service.connect("100")
+        first = service.current_host["host"]
+        # 连接断开：立即切换到下一个 host，不进入退避，也不重新获取 token
+        service._schedule_reconnect("100")
+        await asyncio.sleep(0.1)
+        second = service.current_host["host"]
+        await service.stop()
+        return service, first, second
+
+    service, first, second = asyncio.run(run())
+    assert (first, second) == ("a", "b")
+    assert service.reconnect_attempts == 0
+    assert DanmuService.get_danmu_info.await_count == 1
+    assert selector.stats["a:443"]["failures"] == 1
@@ -0,0 +1,81 @@
+"""多房间弹幕监听：共享资源与房间独立的连接状态"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from backend.services.danmu_hub import DanmuHub
+from backend.services.danmu_service import DanmuService
+from backend.state import SessionState
+
+
+@pytest.fixture
+def account_state():
+    state = SessionState()
+    state.room_id = "100"
+    state.uid = 42
+    return state
+
+
+@pytest.fixture(autouse=True)
+def no_network(monkeypatch):
+    monkeypatch.setattr(DanmuService, "_connect_internal", AsyncMock())
+
+
+def test_rooms_share_session_and_decoder_but_not_state(account_state):
+    async def run():
+        hub = DanmuHub(MagicMock(), account_state)
+        await hub.watch_room(1)
+        await hub.watch_room("2")
+        assert not await hub.watch_room("1")
+        first, second = hub.rooms["1"], hub.rooms["2"]
+        shared = (first.shared_session, first.decoder)
+        assert shared == (second.shared_session, second.decoder) and not first.owns_decoder
+
+        # 房间的连接状态相互独立，也不会改写账户状态
+        assert first.state is not second.state and first.state is not account_state
+        assert (first.state.room_id, first.state.uid) == ("1", 42)
+        first.state.uid = 7
+        assert account_state.uid == 42 and second.state.uid == 42
+
+        session = hub.session
+        await hub.stop()
+        return session, hub
+
+    session, hub = asyncio.run(run())
+    assert session.closed and hub.rooms == {} and hub.decoder is None
+
+
+def test_events_carry_room_id(account_state):
+    received = []
+
+    async def run():
+        hub = DanmuHub(MagicMock(), account_state)
+        hub.set_callback(received.append)
+        for room_id in ("1", "2"):
+            await hub.watch_room(room_id)
+        for room_id, service in hub.rooms.items():
+            service._handle_command({"cmd": "DANMU_MSG", "info": [[0], f"hi {room_id}", [1, "u"]]})
+        await hub.stop()
+
+    asyncio.run(run())
+    assert [(m["room_id"], m["msg"]) for m in received] == [("1", "hi 1"), ("2", "hi 2")]
+
+
+def test_handlers_apply_to_later_rooms(account_state):
+    calls = []
+
+    async def run():
+        hub = DanmuHub(MagicMock(), account_state)
+        await hub.watch_room("1")
+        hub.register_handler("SUPER_CHAT_MESSAGE", calls.append)
+        await hub.watch_room("2")
+        for service in hub.rooms.values():
+            service._handle_command({"cmd": "SUPER_CHAT_MESSAGE"})
+        assert await hub.unwatch_room("1") and not await hub.unwatch_room("1")
+        assert [r["room_id"] for r in hub.get_rooms()] == ["2"]
+        await hub.stop()
+
+    asyncio.run(run())
+    assert len(calls) == 2
@@ -0,0 +1,168 @@
+"""弹幕连接流程：API 与 WebSocket 均为假实现，不访问网络"""
+
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from backend import danmu_codec
+from backend.danmu_credentials import credential_cache
+from backend.danmu_hosts import HostSelector
+from backend.services import danmu_service
+from backend.services.danmu_service import DanmuService
+from backend.state import SessionState
+
+ROOM_ID = 123
+HOSTS = [{"host": "h1.example", "wss_port": 443}, {"host": "h2.example", "wss_port": 443}]
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = asyncio.Event()
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def receive(self):
+        # 保持连接，直到被关闭或任务被取消
+        await self.closed.wait()
+        return MagicMock(type=None)
+
+    async def close(self):
+        self.closed.set()
+
+
+class FakeSession:
+    def __init__(self, fail_hosts=()):
+        self.fail_hosts = set(fail_hosts)
+        self.urls = []
+        self.sockets = []
+
+    async def ws_connect(self, url, **kwargs):
+        self.urls.append(url)
+        if any(h in url for h in self.fail_hosts):
+            raise ConnectionError("refused")
+        ws = FakeWebSocket()
+        self.sockets.append(ws)
+        return ws
+
+
+def make_service(session):
+    api = MagicMock()
+    api.cookies = {}
+    api.headers = {}
+    # 事件循环内只使用异步客户端
+    async_api = MagicMock()
+    async_api.get_buvid3 = AsyncMock(return_value="buvid3-value")
+    async_api.get_user_info = AsyncMock(return_value=(True, {"code": 0, "data": {"isLogin": True, "mid": 42}}))
+    async_api.get_danmu_info = AsyncMock(
+        return_value=(True, {"code": 0, "data": {"token": "tok", "host_list": HOSTS}}))
+    service = DanmuService(api, SessionState(), session=session, async_api=async_api)
+    return service, async_api
+
+
+@pytest.fixture(autouse=True)
+def isolate(monkeypatch):
+    credential_cache.invalidate()
+    monkeypatch.setattr(danmu_service, "host_selector", HostSelector())
+    yield
+    credential_cache.invalidate()
+
+
+def auth_body(ws):
+    packet = ws.sent[0]
+    assert int.from_bytes(packet[8:12], "big") == danmu_codec.OP_AUTH
+    return json.loads(packet[16:])
+
+
+def test_connect_authenticates():
+    async def run():
+        session = FakeSession()
+        service, async_api = make_service(session)
+        await service.connect(ROOM_ID)
+        try:
+            assert service.ws in session.sockets
+            assert service.api.cookies["buvid3"] == "buvid3-value"
+            async_api.get_buvid3.assert_awaited_once()
+            body = auth_body(service.ws)
+            assert body["uid"] == 42 and body["roomid"] == ROOM_ID and body["key"] == "tok"
+        finally:
+            await service.stop()
+        assert not service.running
+
+    asyncio.run(run())
+
+
+def test_token_cache_hit_and_miss():
+    async def run():
+        session = FakeSession()
+        service, async_api = make_service(session)
+        await service.connect(ROOM_ID)
+        try:
+            # 未命中：请求 getDanmuInfo 并写入缓存
+            assert async_api.get_danmu_info.await_count == 1
+            assert credential_cache.get_danmu_info(ROOM_ID, 42)["token"] == "tok"
+
+            # 命中：重连时不再发起任何 HTTP 请求
+            await service._connect_internal(ROOM_ID)
+            assert async_api.get_danmu_info.await_count == 1
+            assert async_api.get_user_info.await_count == 1
+            assert auth_body(service.ws)["key"] == "tok"
+
+            # 其他房间不共用 token
+            await service.connect(ROOM_ID + 1)
+            assert async_api.get_danmu_info.await_count == 2
+        finally:
+            await service.stop()
+
+    asyncio.run(run())
+
+
+def test_invalidate_forces_refetch():
+    async def run():
+        session = FakeSession()
+        service, async_api = make_service(session)
+        await service.connect(ROOM_ID)
+        try:
+            async_api.get_danmu_info.return_value = (True, {"code": 0, "data": {"token": "new", "host_list": HOSTS}})
+            credential_cache.invalidate(ROOM_ID, 42)
+            await service._connect_internal(ROOM_ID)
+            assert async_api.get_danmu_info.await_count == 2
+            assert auth_body(service.ws)["key"] == "new"
+        finally:
+            await service.stop()
+
+    asyncio.run(run())
+
+
+def test_connect_fails_over_to_next_host():
+    async def run():
+        session = FakeSession(fail_hosts=["h1.example"])
+        service, _ = make_service(session)
+        await service.connect(ROOM_ID)
+        try:
+            assert sorted(u.split("/")[2] for u in session.urls) == ["h1.example:443", "h2.example:443"]
+            assert service.current_host == HOSTS[1]
+        finally:
+            await service.stop()
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("body", [b'{"code":-101}', b"\xff garbage"])
+def test_auth_failure_invalidates_cached_credentials(body):
+    async def run():
+        session = FakeSession()
+        service, _ = make_service(session)
+        await service.connect(ROOM_ID)
+        try:
+            # 经过真实的编解码路径：认证回复体无法解析时同样按认证失败处理
+            service._decode_packet(danmu_codec.pack_packet(danmu_codec.OP_AUTH_REPLY, body, danmu_codec.PROTO_JSON))
+            assert credential_cache.get_danmu_info(ROOM_ID, 42) is None
+            assert service.danmu_info is None
+        finally:
+            await service.stop()
+
+    asyncio.run(run())
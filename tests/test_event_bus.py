@@ -0,0 +1,252 @@
+"""EventBus：按通道排队、合并推送，使用假的 WindowService"""
+
+import threading
+import time
+
+from backend.event_bus import EventBus
+from backend.wire_format import COMPACT_MIN_EVENTS, decode_columnar
+
+
+class FakeWindow:
+    def __init__(self):
+        self.calls = []
+
+    def send_to_frontend(self, function_name, data):
+        self.calls.append((function_name, data))
+
+
+def delivered(window):
+    """按到达顺序展开所有批次 (包括快照) 中的事件"""
+    batches = [data["batch"] if name == "onEventSnapshot" else data for name, data in window.calls]
+    return [event for batch in batches for _, events in batch for event in events]
+
+
+def make_bus(window, interval=EventBus.FLUSH_INTERVAL):
+    bus = EventBus(window, interval)
+    bus.register_channel("danmu", "onDanmuMessage")
+    bus.register_channel("low", "onDanmuMessage", max_size=2)
+    bus.register_channel("log", "onBackendLog")
+    return bus
+
+
+def test_flush_coalesces_channels_into_one_call():
+    window = FakeWindow()
+    bus = make_bus(window)
+    bus.publish("log", "l1")
+    bus.publish("danmu", {"msg": "a"})
+    bus.publish("danmu", {"msg": "b"})
+    assert bus.flush() == 3
+    # 按注册顺序排列通道，空通道不出现
+    assert window.calls == [("onEventBatch", [["onDanmuMessage", [{"msg": "a"}, {"msg": "b"}]],
+                                              ["onBackendLog", ["l1"]]])]
+    assert bus.flush() == 0 and len(window.calls) == 1
+
+
+def test_bounded_channel_drops_oldest():
+    window = FakeWindow()
+    bus = make_bus(window)
+    for i in range(5):
+        bus.publish("low", i)
+    bus.flush()
+    assert delivered(window) == [3, 4]
+    stats = bus.get_stats()
+    assert stats["channels"]["low"] == {"published": 5, "dropped": 3, "queued": 0}
+    assert stats["flushes"] == 1 and stats["max_events_per_flush"] == 2
+
+
+def test_background_thread_flushes_and_stop_drains():
+    window = FakeWindow()
+    bus = make_bus(window, interval=0.005)
+    bus.start()
+    bus.publish("danmu", 1)
+    for _ in range(100):
+        if window.calls:
+            break
+        time.sleep(0.01)
+    assert delivered(window) == [1]
+    bus.publish("danmu", 2)
+    bus.stop()
+    bus._thread.join(1)
+    assert delivered(window) == [1, 2]
+
+
+def test_concurrent_flushes_deliver_in_publish_order():
+    # 第一次推送阻塞期间，另一线程的 flush 必须等待，不能抢先推送后入队的事件
+    window = FakeWindow()
+    bus = make_bus(window)
+    sending = threading.Event()
+    release = threading.Event()
+    send = window.send_to_frontend
+
+    def slow_send(function_name, data):
+        if not window.calls:
+            sending.set()
+            release.wait(2)
+        send(function_name, data)
+    window.send_to_frontend = slow_send
+
+    bus.publish("danmu", 1)
+    first = threading.Thread(target=bus.flush)
+    first.start()
+    assert sending.wait(2)
+    bus.publish("danmu", 2)
+    second = threading.Thread(target=bus.flush)
+    second.start()
+    second.join(0.05)
+    assert window.calls == []
+    release.set()
+    first.join(2)
+    second.join(2)
+    assert delivered(window) == [1, 2]
+
+
+def test_hidden_events_are_pushed_as_one_snapshot():
+    window = FakeWindow()
+    bus = EventBus(window)
+    bus.register_channel("danmu", "onDanmuMessage", snapshot_size=2)
+    bus.register_channel("log", "onBackendLog")
+    bus.publish("danmu", {"type": "danmu", "i": 0})
+    bus.set_visible(False)
+    # 隐藏前已排队的事件照常推送
+    assert delivered(window) == [{"type": "danmu", "i": 0}]
+
+    for i in range(1, 4):
+        bus.publish("danmu", {"type": "danmu", "i": i})
+    bus.publish("danmu", {"type": "gift", "i": 4})
+    bus.publish("log", "l")
+    assert bus.flush() == 0 and len(window.calls) == 1
+
+    bus.set_visible(True)
+    name, snapshot = window.calls[-1]
+    assert name == "onEventSnapshot"
+    assert snapshot["counts"] == {"danmu": 3, "gift": 1, "log": 1}
+    assert snapshot["batch"] == [["onDanmuMessage", [{"type": "danmu", "i": 3}, {"type": "gift", "i": 4}]],
+                                 ["onBackendLog", ["l"]]]
+    # 重复调用不产生新的快照
+    bus.set_visible(True)
+    assert len(window.calls) == 2
+
+
+def test_visibility_changes_interleaved_with_the_bus_thread():
+    # 发布线程持续发布递增的序号，同时反复隐藏 / 显示；到达前端的序号必须保持递增，隐藏期间不能有批次推送
+    window = FakeWindow()
+    bus = EventBus(window, interval=0)
+    bus.register_channel("danmu", "onDanmuMessage", snapshot_size=5)
+    received = []
+    violations = []
+    hidden = threading.Event()
+
+    def send(function_name, data):
+        if function_name == "onEventBatch" and hidden.is_set():
+            violations.append(data)
+        batch = data["batch"] if function_name == "onEventSnapshot" else data
+        received.extend(event for _, events in batch for event in events)
+    window.send_to_frontend = send
+
+    stop = threading.Event()
+
+    def publisher():
+        i = 0
+        while not stop.is_set():
+            bus.publish("danmu", i)
+            i += 1
+
+    bus.start()
+    thread = threading.Thread(target=publisher)
+    thread.start()
+    for _ in range(50):
+        time.sleep(0.0005)
+        bus.set_visible(False)
+        hidden.set()
+        time.sleep(0.0005)
+        hidden.clear()
+        bus.set_visible(True)
+    stop.set()
+    thread.join()
+    bus.stop()
+    bus._thread.join(1)
+
+    assert violations == []
+    assert received and all(a < b for a, b in zip(received, received[1:]))
+
+
+def test_set_visible_is_atomic_with_respect_to_other_flushes():
+    # 在隐藏前的推送、显示时的快照推送过程中发布新事件并由另一线程 flush，模拟与后台线程交错
+    window = FakeWindow()
+    bus = make_bus(window)
+    send = window.send_to_frontend
+    hiding = threading.Event()
+    flushers = []
+
+    def racing_send(function_name, data):
+        send(function_name, data)
+        if hiding.is_set():
+            hiding.clear()
+            bus.publish("danmu", "during-hide")
+        elif function_name == "onEventSnapshot":
+            bus.publish("danmu", "after-show")
+            flusher = threading.Thread(target=bus.flush)
+            flusher.start()
+            flusher.join(0.05)
+            flushers.append(flusher)
+    window.send_to_frontend = racing_send
+
+    bus.publish("danmu", "before-hide")
+    hiding.set()
+    bus.set_visible(False)
+    # 隐藏过程中发布的事件进入快照，不会在隐藏期间推送
+    assert bus.flush() == 0
+    bus.set_visible(True)
+    flushers[0].join(2)
+    assert [name for name, _ in window.calls] == ["onEventBatch", "onEventSnapshot", "onEventBatch"]
+    assert delivered(window) == ["before-hide", "during-hide", "after-show"]
+
+
+def test_flush_hook_runs_while_idle(monkeypatch):
+    monkeypatch.setattr(EventBus, "IDLE_TICK", 0.01)
+    window = FakeWindow()
+    bus = make_bus(window)
+    ticked = threading.Event()
+
+    def hook():
+        # 没有任何 publish 时也会被调用
+        if not ticked.is_set():
+            bus.publish("log", "summary")
+            ticked.set()
+    bus.add_flush_hook(hook)
+    bus.start()
+    try:
+        assert ticked.wait(1)
+    finally:
+        bus.stop()
+    assert delivered(window) == ["summary"]
+
+
+def test_stop_runs_hooks_and_pushes_queued_events():
+    window = FakeWindow()
+    bus = make_bus(window)
+    bus.add_flush_hook(lambda: bus.publish("log", "from hook"))
+    bus.publish("log", "last")
+    bus.stop()
+    assert window.calls == [("onEventBatch", [["onBackendLog", ["last", "from hook"]]])]
+
+
+def test_compact_channels_send_columnar_batches():
+    window = FakeWindow()
+    bus = make_bus(window)
+    bus.register_channel("compact", "onDanmuMessage", compact=True)
+    events = [{"type": "danmu", "msg": str(i)} for i in range(COMPACT_MIN_EVENTS)]
+    for event in events:
+        bus.publish("compact", event)
+    bus.publish("log", "l")
+    bus.flush()
+    (_, [[_, logs], [_, columnar]]), = window.calls
+    assert columnar["$columnar"] == 1 and decode_columnar(columnar) == events
+    assert logs == ["l"]
+
+    bus.set_visible(False)
+    for event in events:
+        bus.publish("compact", event)
+    bus.set_visible(True)
+    _, snapshot = window.calls[-1]
+    assert decode_columnar(snapshot["batch"][0][1]) == events[-bus.channels["compact"].hidden.maxlen:]
@@ -0,0 +1,103 @@
+"""WBI 密钥缓存：过期时间、磁盘缓存与并发刷新"""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import pytest
+
+from backend import get_wbi
+from backend.get_wbi import WbiKeyProvider
+
+BEIJING = timezone(timedelta(hours=8))
+KEYS = ("a" * 32, "b" * 32)
+
+
+@pytest.fixture
+def nav(monkeypatch):
+    fetch = MagicMock(return_value=KEYS)
+    monkeypatch.setattr(get_wbi, "getWbiKeys", fetch)
+    return fetch
+
+
+def test_keys_expire_at_beijing_midnight():
+    fetched_at = datetime(2025, 3, 1, 23, 30, tzinfo=BEIJING).timestamp()
+    assert WbiKeyProvider._expire_time(fetched_at) == datetime(2025, 3, 2, tzinfo=BEIJING).timestamp()
+    # 北京时间 0 点刚过获取的密钥同样在次日 0 点过期
+    fetched_at = datetime(2025, 3, 1, 0, 1, tzinfo=BEIJING).timestamp()
+    assert WbiKeyProvider._expire_time(fetched_at) == datetime(2025, 3, 2, tzinfo=BEIJING).timestamp()
+
+
+def test_keys_are_cached_until_invalidated(nav):
+    provider = WbiKeyProvider()
+    session = object()
+    assert provider.get(session) == KEYS
+    assert provider.get() == KEYS
+    nav.assert_called_once_with(session)
+    provider.invalidate()
+    provider.get()
+    assert nav.call_count == 2
+
+
+def test_concurrent_refresh_requests_nav_once(nav):
+    started = threading.Event()
+
+    def slow_fetch(session=None):
+        started.set()
+        time.sleep(0.05)
+        return KEYS
+
+    nav.side_effect = slow_fetch
+    provider = WbiKeyProvider()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(provider.get())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [KEYS] * 8
+    assert nav.call_count == 1
+
+
+def test_refreshes_ahead_of_expiry_in_background(nav):
+    provider = WbiKeyProvider()
+    provider.keys = ("old", "old")
+    provider.expires_at = time.time() + WbiKeyProvider.REFRESH_AHEAD / 2
+    # 即将过期时仍返回旧密钥，同时在后台刷新
+    assert provider.get() == ("old", "old")
+    for _ in range(100):
+        if provider.keys == KEYS:
+            break
+        time.sleep(0.01)
+    assert provider.keys == KEYS and nav.call_count == 1
+
+
+def test_disk_cache_round_trip(nav, tmp_path):
+    cache_file = str(tmp_path / "wbi_keys.json")
+    provider = WbiKeyProvider()
+    provider.set_cache_file(cache_file)
+    provider.get()
+
+    restored = WbiKeyProvider()
+    restored.set_cache_file(cache_file)
+    assert restored.keys == KEYS and restored.expires_at == provider.expires_at
+    assert nav.call_count == 1
+
+
+def test_expired_disk_cache_is_ignored(tmp_path):
+    cache_file = tmp_path / "wbi_keys.json"
+    cache_file.write_text('{"img_key": "img", "sub_key": "sub", "fetched_at": 0}')
+    provider = WbiKeyProvider()
+    provider.set_cache_file(str(cache_file))
+    assert provider.keys is None
+
+
+def test_sign_error_invalidates_shared_keys(nav, monkeypatch):
+    provider = WbiKeyProvider()
+    monkeypatch.setattr(get_wbi, "wbi_keys", provider)
+    provider.get()
+    assert not get_wbi.is_sign_error({"code": 0})
+    assert provider.keys is not None
+    assert get_wbi.is_sign_error({"code": -352})
+    assert provider.keys is None
@@ -0,0 +1,87 @@
+"""LiveService：API 与配置均为假实现"""
+
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from backend.services.live_service import LiveService
+from backend.state import SessionState
+
+SAVED = {"last_title": "旧标题", "last_announcement": "旧公告", "last_area_name": ["网游", "英雄联盟"]}
+
+
+@pytest.fixture
+def service():
+    state = SessionState()
+    state.uid = 1
+    state.room_id = 10
+    config_manager = MagicMock()
+    config_manager.get_user.return_value = dict(SAVED)
+    partitions = MagicMock()
+    partitions.get.return_value.get_id.return_value = 86
+    service = LiveService(MagicMock(), config_manager, state, partitions=partitions)
+    yield service
+    service.executor.shutdown()
+
+
+@pytest.mark.parametrize("area", [["只有一个"], "ab", ["网游", ""], ["网游", 1], ("a", "b", "c")])
+def test_apply_room_profile_rejects_malformed_area(service, area):
+    res = service.apply_room_profile(area=area)
+    assert res == {"code": -1, "data": {"area": {"code": -1, "msg": "无效分区"}}}
+    service.api.update_area.assert_not_called()
+
+
+def test_apply_room_profile_skips_unchanged_fields(service):
+    res = service.apply_room_profile("旧标题", ["网游", "英雄联盟"], "旧公告")
+    assert res == {"code": 0, "data": {field: {"code": 0, "skipped": True}
+                                       for field in ("title", "area", "announcement")}}
+    service.api.update_title.assert_not_called()
+    service.config_manager.update_user.assert_not_called()
+
+
+def test_apply_room_profile_writes_in_parallel_and_saves_once(service):
+    # 两个写请求都到达后才返回，串行执行时会超时
+    barrier = threading.Barrier(2, timeout=2)
+
+    def write(*args):
+        barrier.wait()
+        return True, {"code": 0}
+    service.api.update_title.side_effect = write
+    service.api.update_announcement.side_effect = write
+
+    res = service.apply_room_profile("新标题", ["网游", "英雄联盟"], "新公告")
+    assert res["code"] == 0 and res["data"]["area"]["skipped"]
+    service.config_manager.update_user.assert_called_once_with(
+        "1", {"last_title": "新标题", "last_announcement": "新公告"})
+
+
+def test_apply_room_profile_reports_each_failure(service):
+    service.api.update_title.return_value = (True, {"code": 1, "msg": "标题违规"})
+    service.api.update_area.return_value = (True, {"code": 0})
+    res = service.apply_room_profile("新标题", ["手游", "王者荣耀"])
+    assert res["code"] == -1
+    assert res["data"] == {"title": {"code": -1, "msg": "标题违规"}, "area": {"code": 0}}
+    # 成功的字段仍然保存
+    service.config_manager.update_user.assert_called_once_with(
+        "1", {"last_area_id": 86, "last_area_name": ["手游", "王者荣耀"]})
+
+
+def test_sync_room_profile_fetches_concurrently(service):
+    barrier = threading.Barrier(2, timeout=2)
+
+    def room_info(room_id):
+        barrier.wait()
+        return True, {"code": 0, "data": {"title": "t", "area_id": 86, "parent_area_name": "网游",
+                                          "area_name": "英雄联盟"}}
+
+    def room_news(room_id, uid):
+        barrier.wait()
+        return True, {"code": 0, "data": {"content": "公告"}}
+    service.api.get_room_info.side_effect = room_info
+    service.api.get_room_news.side_effect = room_news
+
+    res = service.sync_room_profile()
+    assert res == {"code": 0, "data": {"last_title": "t", "last_area_id": "86",
+                                       "last_area_name": ["网游", "英雄联盟"], "last_announcement": "公告"}}
+    service.config_manager.update_user.assert_called_once_with("1", res["data"])
@@ -0,0 +1,73 @@
+"""日志管道：记录在调用线程入队，由后台线程交给输出处理器"""
+
+import logging
+import threading
+
+import pytest
+
+from backend import log_pipeline
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self.records = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.records.append(record.getMessage())
+        self.threads.add(threading.current_thread().name)
+
+
+@pytest.fixture
+def root():
+    root = logging.getLogger()
+    saved = root.handlers[:], root.level
+    yield root
+    log_pipeline.stop()
+    root.handlers[:], level = saved
+    root.setLevel(level)
+
+
+def test_records_are_handled_on_the_listener_thread(root):
+    handler = RecordingHandler()
+    listener = log_pipeline.start([handler], level=logging.DEBUG)
+    # 重复启动返回同一个管道
+    assert log_pipeline.start([RecordingHandler()]) is listener
+    assert len(root.handlers) == 1 and isinstance(root.handlers[0], logging.handlers.QueueHandler)
+
+    logging.getLogger("Test").debug("hello %s", "world")
+    log_pipeline.stop()
+    assert handler.records == ["hello world"]
+    assert threading.current_thread().name not in handler.threads
+
+
+def test_handler_levels_are_respected(root):
+    info_handler = RecordingHandler(logging.INFO)
+    debug_handler = RecordingHandler()
+    log_pipeline.start([info_handler, debug_handler])
+    log = logging.getLogger("Test")
+    log.debug("d")
+    log.info("i")
+    log_pipeline.stop()
+    assert info_handler.records == ["i"]
+    assert debug_handler.records == ["d", "i"]
+
+
+def test_add_handler_joins_the_running_pipeline(root):
+    first = RecordingHandler()
+    log_pipeline.start([first])
+    logging.getLogger("Test").info("before")
+    late = RecordingHandler()
+    log_pipeline.add_handler(late)
+    logging.getLogger("Test").info("after")
+    log_pipeline.stop()
+    assert first.records == ["before", "after"]
+    # 追加前已入队但尚未处理的记录也会交给新处理器
+    assert late.records[-1] == "after"
+
+
+def test_add_handler_without_pipeline_attaches_to_root(root):
+    handler = RecordingHandler()
+    log_pipeline.add_handler(handler)
+    assert handler in root.handlers
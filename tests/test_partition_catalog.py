@@ -0,0 +1,154 @@
+"""分区目录：索引、反查与搜索排序，以及磁盘缓存"""
+
+import time
+
+from backend.partition_catalog import PartitionCatalog, PartitionStore
+
+AREAS = [
+    {"name": "网游", "list": [
+        {"id": 86, "name": "英雄联盟", "pinyin": "yingxionglianmeng"},
+        {"id": 252, "name": "逃离塔科夫", "pinyin": "taolitakefu"},
+    ]},
+    {"name": "手游", "list": [
+        {"id": 35, "name": "王者荣耀", "pinyin": "wangzherongyao"},
+        {"id": 395, "name": "英雄联盟手游", "pinyin": "yingxionglianmengshouyou"},
+    ]},
+    {"name": "单机游戏", "list": [
+        {"id": 235, "name": "其他单机", "pinyin": "qitadanji"},
+    ]},
+    {"name": "娱乐", "list": [
+        {"id": 21, "name": "其他", "pinyin": "qita"},
+    ]},
+    {"name": "生活", "list": [
+        {"id": 646, "name": "其他", "pinyin": "qita"},
+    ]},
+]
+
+
+def names(results):
+    return [(r["parent"], r["name"]) for r in results]
+
+
+def test_forward_and_reverse_lookup():
+    catalog = PartitionCatalog(AREAS)
+    assert len(catalog) == 7
+    assert catalog.get_id("网游", "英雄联盟") == 86
+    assert catalog.get_id("网游", "王者荣耀") is None
+    assert catalog.get_names(395) == ["手游", "英雄联盟手游"]
+    assert catalog.get_names("252") == ["网游", "逃离塔科夫"]
+    assert catalog.get_names(1) == []
+    assert catalog.response == {"code": 0, "data": {
+        "网游": ["英雄联盟", "逃离塔科夫"], "手游": ["王者荣耀", "英雄联盟手游"], "单机游戏": ["其他单机"],
+        "娱乐": ["其他"], "生活": ["其他"]}}
+    assert not PartitionCatalog()
+
+
+def test_prefix_matches_rank_exact_name_first():
+    catalog = PartitionCatalog(AREAS)
+    assert names(catalog.search("英雄联盟")) == [("网游", "英雄联盟"), ("手游", "英雄联盟手游")]
+    assert names(catalog.search("Wang")) == [("手游", "王者荣耀")]
+    assert catalog.search("  ") == []
+
+
+def test_substring_fallback_uses_the_char_index():
+    catalog = PartitionCatalog(AREAS)
+    # 名称前缀先于包含匹配，包含匹配来自字符表的候选
+    assert names(catalog.search("塔科夫")) == [("网游", "逃离塔科夫")]
+    assert names(catalog.search("手游")) == [("手游", "英雄联盟手游")]
+    assert names(catalog.search("shouyou")) == [("手游", "英雄联盟手游")]
+    assert catalog._containing_chars("塔科夫") == {1}
+    assert catalog.search("夫塔") == []
+    assert catalog.search("没有") == []
+
+
+def test_duplicate_sub_names_under_different_parents():
+    catalog = PartitionCatalog(AREAS)
+    assert catalog.get_id("娱乐", "其他") == 21
+    assert catalog.get_id("生活", "其他") == 646
+    assert catalog.get_names(646) == ["生活", "其他"]
+    results = catalog.search("其他")
+    assert [(r["parent"], r["id"]) for r in results] == [("娱乐", 21), ("生活", 646), ("单机游戏", 235)]
+
+
+def test_results_are_cached_and_limited():
+    catalog = PartitionCatalog(AREAS)
+    first = catalog.search("qi", limit=2)
+    assert len(first) == 2
+    assert catalog.search("QI ", limit=2) is first
+    assert len(catalog.search("qi", limit=20)) == 3
+    for i in range(PartitionCatalog.SEARCH_CACHE_SIZE + 5):
+        catalog.search(f"k{i}")
+    assert len(catalog._search_cache) == PartitionCatalog.SEARCH_CACHE_SIZE
+
+
+class FakeApi:
+    def __init__(self, areas=AREAS, ok=True):
+        self.areas = areas
+        self.ok = ok
+        self.calls = 0
+        self.invalidated = []
+
+    def get_area_list(self):
+        self.calls += 1
+        if not self.ok:
+            return False, {"code": -1, "msg": "network"}
+        return True, {"code": 0, "data": self.areas}
+
+    def invalidate_cache(self, *names):
+        self.invalidated.extend(names)
+
+
+def test_store_loads_from_disk_without_a_request(tmp_path):
+    cache_file = str(tmp_path / "partitions.json")
+    api = FakeApi()
+    assert PartitionStore(api, cache_file).refresh()
+
+    api = FakeApi()
+    store = PartitionStore(api, cache_file)
+    assert not store.is_stale()
+    assert store.get().get_id("网游", "英雄联盟") == 86
+    assert api.calls == 0
+
+
+def test_store_fetches_synchronously_only_when_empty(tmp_path):
+    api = FakeApi()
+    store = PartitionStore(api, str(tmp_path / "partitions.json"))
+    assert store.get().get_names(35) == ["手游", "王者荣耀"]
+    store.get()
+    assert api.calls == 1
+
+
+def test_stale_store_returns_the_old_catalog_and_refreshes_in_background(tmp_path, monkeypatch):
+    cache_file = str(tmp_path / "partitions.json")
+    PartitionStore(FakeApi(), cache_file).refresh()
+    monkeypatch.setattr(PartitionStore, "MAX_AGE", -1)
+
+    new_areas = [{"name": "新分区", "list": [{"id": 1, "name": "新", "pinyin": "xin"}]}]
+    api = FakeApi(new_areas)
+    store = PartitionStore(api, cache_file)
+    old = store.get()
+    assert old.get_id("网游", "英雄联盟") == 86
+    for _ in range(100):
+        if store.catalog is not old:
+            break
+        time.sleep(0.01)
+    assert store.catalog.get_id("新分区", "新") == 1
+    assert api.calls == 1
+
+
+def test_failed_refresh_keeps_the_current_catalog(tmp_path):
+    cache_file = str(tmp_path / "partitions.json")
+    store = PartitionStore(FakeApi(), cache_file)
+    store.refresh()
+    catalog = store.catalog
+    store.api = FakeApi(ok=False)
+    assert not store.refresh(force=True)
+    assert store.catalog is catalog
+    assert store.api.invalidated == ["area_list"]
+
+
+def test_corrupt_cache_file_is_ignored(tmp_path):
+    cache_file = tmp_path / "partitions.json"
+    cache_file.write_text("{broken", encoding="utf-8")
+    store = PartitionStore(FakeApi(), str(cache_file))
+    assert store.is_stale() and not store.catalog
@@ -0,0 +1,99 @@
+"""SessionRegistry：每个账户独立的会话，使用临时目录中的 Config，不发起网络请求"""
+
+import threading
+
+import pytest
+
+from backend import config as config_module
+from backend.session_registry import SessionRegistry
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_module, "CONFIG_FILE", str(tmp_path / "config.json"))
+    monkeypatch.setattr(config_module, "ACCOUNTS_DIR", str(tmp_path / "accounts"))
+    cfg = config_module.Config()
+    for uid in ("1", "2"):
+        cfg.set_user(uid, {"uid": uid, "uname": f"user{uid}", "cookie": f"SESSDATA=s{uid}", "csrf": "x",
+                           "roomId": f"9{uid}"})
+    registry = SessionRegistry(cfg, None)
+    yield registry
+    for session in registry.all():
+        session.release()
+
+
+def test_sessions_are_isolated_per_account(registry):
+    one = registry.activate("1")
+    two = registry.get("2")
+    assert registry.active is one and one is not two
+    assert one.api is not two.api
+    assert one.api.session.cookies.get("SESSDATA") == "s1"
+    assert two.api.session.cookies.get("SESSDATA") == "s2"
+    assert (one.state.room_id, two.state.room_id) == ("91", "92")
+    # 分区目录所有会话共用
+    assert one.live_service.partitions is two.live_service.partitions is registry.partitions
+
+    # 切换不会重建会话
+    assert registry.activate(2) is two and registry.get("1") is one
+    # 未保存的账户使用匿名会话
+    assert registry.activate("3").uid is None
+
+
+def test_messages_are_tagged_with_the_account(registry):
+    received = []
+    registry.set_callback(received.append)
+    registry.get("1").danmu_service.message_callback({"type": "danmu", "uid": 42})
+    registry.get("2").danmu_hub.message_callback({"type": "danmu", "uid": 43})
+    # 发送者的 uid 保持不变
+    assert received == [{"type": "danmu", "uid": 42, "account_uid": "1"},
+                        {"type": "danmu", "uid": 43, "account_uid": "2"}]
+
+
+def test_concurrent_get_creates_one_session(registry, monkeypatch):
+    barrier = threading.Barrier(2, timeout=2)
+    create = registry.create
+    released = []
+
+    def slow_create(uid, cookies=None):
+        session = create(uid, cookies)
+        session.release = lambda: released.append(session)
+        barrier.wait()
+        return session
+    monkeypatch.setattr(registry, "create", slow_create)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("1"))) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results[0] is results[1] and len(registry.sessions) == 1
+    # 竞争失败的会话被释放
+    assert len(released) == 1 and released[0] is not results[0]
+
+
+def test_close_releases_the_session_and_falls_back_to_anonymous(registry, monkeypatch):
+    session = registry.activate("1")
+    released = []
+    monkeypatch.setattr(session, "release", lambda: released.append(session))
+    assert registry.close("1")
+    assert not registry.close("1")
+    assert released == [session]
+    assert registry.active.uid is None and "1" not in registry.sessions
+
+
+def test_add_replaces_the_old_session(registry, monkeypatch):
+    old = registry.activate("1")
+    released = []
+    monkeypatch.setattr(old, "release", lambda: released.append(old))
+    new = registry.add(registry.create("1", {"SESSDATA": "fresh"}))
+    assert registry.active is new and released == [old]
+
+
+def test_invalidate_cache_only_touches_open_sessions(registry):
+    one = registry.get("1")
+    one.api.cache.get_or_fetch(("user_info",), 60, lambda: (True, {"code": 0}))
+    registry.invalidate_cache(["1", "2"], "user_info")
+    assert one.api.get_cache_stats()["entries"] == 0
+    # 没有打开的账户不会为此创建会话
+    assert "2" not in registry.sessions
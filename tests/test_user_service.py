@@ -0,0 +1,88 @@
+"""UserService：刷新全部账户，使用临时目录中的 Config 和假的 BilibiliApi"""
+
+import pytest
+
+from backend import config as config_module
+from backend.services import user_service as user_service_module
+from backend.services.user_service import UserService
+from backend.state import SessionState
+
+NAV = {
+    "a": (True, {"code": 0, "data": {"uname": "A2", "face": "f", "level_info": {"current_level": 5}}}),
+    "b": (True, {"code": -101, "message": "账号未登录"}),
+    "c": (False, {"code": -1, "msg": "timeout"}),
+}
+
+
+class FakeApi:
+    closed = []
+
+    def __init__(self):
+        self.cookies = {}
+
+    def update_cookies(self, cookies):
+        self.cookies = cookies
+
+    def get_user_info(self):
+        return NAV[self.cookies["SESSDATA"]]
+
+    def get_user_stat(self):
+        return True, {"code": 0, "data": {"follower": 7}}
+
+    def close(self):
+        FakeApi.closed.append(self.cookies["SESSDATA"])
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_module, "CONFIG_FILE", str(tmp_path / "config.json"))
+    monkeypatch.setattr(config_module, "ACCOUNTS_DIR", str(tmp_path / "accounts"))
+    monkeypatch.setattr(user_service_module, "BilibiliApi", FakeApi)
+    FakeApi.closed = []
+    cfg = config_module.Config()
+    for uid, sess in (("1", "a"), ("2", "b"), ("3", "c")):
+        cfg.set_user(uid, {"uid": uid, "uname": f"user{uid}", "cookie": f"SESSDATA={sess}", "csrf": "x",
+                           "roomId": "9", "last_title": "t"})
+    cfg.set("current_uid", "1")
+    return UserService(FakeApi(), cfg, SessionState())
+
+
+def test_refresh_all_accounts_merges_profile_fields(service):
+    pushed = []
+    items = {item["uid"]: item for item in service.refresh_all_accounts(pushed.append)}
+    assert sorted(item["uid"] for item in pushed) == ["1", "2", "3"]
+    assert sorted(FakeApi.closed) == ["a", "b", "c"]
+
+    assert items["1"]["code"] == 0 and items["1"]["data"]["follower"] == 7
+    assert items["2"] == {"uid": "2", "code": -1, "expired": True, "msg": "登录已失效"}
+    assert items["3"]["code"] == -1 and not items["3"]["expired"]
+
+    cfg = service.config_manager
+    user = cfg.get_user("1")
+    assert (user["uname"], user["level"], user["cookie_expired"]) == ("A2", 5, False)
+    # 资料以外的字段保持不变
+    assert user["cookie"] == "SESSDATA=a" and user["last_title"] == "t"
+    assert cfg.get_user("2")["cookie_expired"] is True and cfg.get_user("2")["uname"] == "user2"
+    assert "cookie_expired" not in cfg.get_user("3")
+    # 索引中的摘要同步更新
+    assert cfg.data["users"]["2"]["cookie_expired"] is True
+
+
+def test_refresh_does_not_overwrite_concurrent_edits(service):
+    cfg = service.config_manager
+
+    def on_result(item):
+        # 刷新过程中其他操作修改了账户
+        cfg.update_user(item["uid"], {"last_title": f"new{item['uid']}"})
+
+    service.refresh_all_accounts(on_result)
+    assert cfg.get_user("1")["last_title"] == "new1"
+    assert cfg.get_user("2")["last_title"] == "new2"
+    assert cfg.get_user("1")["uname"] == "A2"
+
+
+def test_update_users_skips_removed_accounts(service):
+    cfg = service.config_manager
+    cfg.remove_user("3")
+    assert cfg.update_users({"1": {"level": 1}, "3": {"level": 1}, "4": {"level": 1}}) == ["1"]
+    assert not cfg.update_user("3", {"level": 1})
@@ -0,0 +1,74 @@
+"""列式编码：还原结果与原事件相同"""
+
+import random
+
+import pytest
+
+from backend import wire_format
+from backend.wire_format import COMPACT_MIN_EVENTS, MAX_FIELDS, decode_columnar, encode_columnar
+
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    """允许短批次使用列式编码，便于构造数据"""
+    monkeypatch.setattr(wire_format, "COMPACT_MIN_EVENTS", 1)
+
+
+def mixed_events(count):
+    rng = random.Random(0)
+    events = []
+    for i in range(count):
+        u = rng.randrange(5)
+        kind = rng.random()
+        if kind < 0.6:
+            event = {"type": "danmu", "uid": u, "uname": f"用户{u}", "face": f"face{u}", "msg": f"弹幕 {i}"}
+        elif kind < 0.8:
+            event = {"type": "interact", "uid": u, "uname": f"用户{u}", "msg": "进入直播间"}
+        else:
+            event = {"type": "gift", "uid": u, "uname": None, "gift_name": "小心心", "num": 1, "action": "投喂"}
+        event["account_uid"] = "1"
+        events.append(event)
+    return events
+
+
+def test_round_trip_mixed_events():
+    events = mixed_events(200)
+    data = encode_columnar(events)
+    assert data["$columnar"] == 1 and "masks" in data
+    assert decode_columnar(data) == events
+
+
+def test_dense_batch_has_no_masks():
+    events = [{"type": "danmu", "uname": "a", "msg": str(i)} for i in range(COMPACT_MIN_EVENTS)]
+    data = encode_columnar(events)
+    assert "masks" not in data
+    assert data["strings"] == ["danmu", "a"]
+    assert decode_columnar(data) == events
+
+
+def test_missing_fields_stay_missing(small_batches):
+    # 与 frontend/tests/columnar.test.js 中的数据一致
+    events = [{"type": "danmu", "face": "f", "msg": "a"}, {"type": "interact", "msg": "b"},
+              {"type": "danmu", "face": None, "msg": "c"}, {}]
+    data = encode_columnar(events)
+    assert data["masks"] == [7, 5, 7, 0]
+    assert data["columns"] == [[0, 1, 0], [2, None], ["a", "b", "c"]]
+    decoded = decode_columnar(data)
+    assert decoded == events and "face" not in decoded[1]
+
+
+def test_mixed_value_types_are_not_interned(small_batches):
+    events = [{"uname": "a"}, {"uname": 1}, {"uname": "a"}, {"uname": None}]
+    data = encode_columnar(events)
+    assert data["interned"] == [] and data["columns"] == [["a", 1, "a", None]]
+    assert decode_columnar(data) == events
+
+
+def test_unsuitable_batches_are_sent_unchanged():
+    small = [{"a": 1}] * (COMPACT_MIN_EVENTS - 1)
+    assert encode_columnar(small) is small
+    logs = ["line"] * 10
+    assert encode_columnar(logs) is logs
+    wide = [{f"f{i}": i for i in range(MAX_FIELDS + 1)}] * COMPACT_MIN_EVENTS
+    assert encode_columnar(wide) is wide
+    assert decode_columnar(logs) is logs